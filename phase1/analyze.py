@@ -1,59 +1,99 @@
 import os
 import json
-from dotenv import load_dotenv
-from azure.ai.formrecognizer import DocumentAnalysisClient
-from azure.core.credentials import AzureKeyCredential
-from openai import AsyncAzureOpenAI
 import logging
-import re
 import asyncio
+import time
 from celery import Celery
+from progress import publish_progress_in_background
+from worker_runtime import run_async, get_ocr_client, get_openai_client
+from language import detect_language_locally, LANGUAGE_CONFIDENCE_THRESHOLD
+from ocr_cache import create_ocr_cache, ocr_cache_key
+from layout import build_layout, DocumentLayout
+from field_rules import extract_fields_by_rules
+from form_schema import LANGUAGES, build_schema, invalid_fields, response_format, translate_path
+from azure.ai.formrecognizer import AnalysisFeature, AnalyzeResult
 
-# Load environment variables
-load_dotenv()
-
-# Retrieve credentials from .env file
-ENDPOINT_OCR = os.getenv("AZURE_OCR_AI_SERVICES_URL")
-API_KEY_OCR = os.getenv("AZURE_OCR_AI_SERVICES_KEY")
-
-ENDPOINT_OPENAI = os.getenv("AZURE_OPENAI_SERVICES_URL")
-API_KEY_OPENAI = os.getenv("AZURE_OPENAI_SERVICES_KEY")
+logging.basicConfig(level=logging.INFO)
 
 # Celery configuration
 celery_app = Celery('document_analysis', broker='redis://localhost:6379/0',backend='redis://localhost:6379/0'
 )
 celery_app.conf.broker_connection_retry_on_startup = True
+# Batch ingestion stages run on their own queues so each upstream service gets its own worker concurrency cap
+# (see batch.py and run_batch_workers.sh)
+OCR_QUEUE = os.getenv("OCR_QUEUE", "ocr")
+OPENAI_QUEUE = os.getenv("OPENAI_QUEUE", "openai")
+celery_app.conf.task_routes = {
+    "ocr_document_task": {"queue": OCR_QUEUE},
+    "extract_fields_task": {"queue": OPENAI_QUEUE}
+}
+# Workers take one task at a time, so a capped worker never holds documents it is not processing yet
+celery_app.conf.worker_prefetch_multiplier = 1
+
+OCR_MODEL_ID = "prebuilt-document"
+# Document Intelligence language hints used by local language detection (see language.py)
+OCR_LANGUAGE_HINTS = os.getenv("OCR_LANGUAGE_HINTS", "1") == "1"
+# Seconds between Document Intelligence status polls, unless the service asks for another delay with Retry-After
+OCR_POLLING_INTERVAL = float(os.getenv("OCR_POLLING_INTERVAL", "1"))
+# Documents in the OCR and in the extraction stage at once when analyze_documents pipelines a list of documents
+PIPELINE_OCR_CONCURRENCY = int(os.getenv("PIPELINE_OCR_CONCURRENCY", "1"))
+PIPELINE_EXTRACTION_CONCURRENCY = int(os.getenv("PIPELINE_EXTRACTION_CONCURRENCY", "1"))
+# Characters of OCR text sent to the LLM when local language detection is not confident enough
+LANGUAGE_FALLBACK_CHARS = int(os.getenv("LANGUAGE_FALLBACK_CHARS", "2000"))
+# Azure OpenAI deployment extracting the fields the rules could not read (see field_rules.py), and an optional smaller
+# deployment (e.g. gpt-4o-mini) used instead when at most EXTRACTION_SMALL_MODEL_MAX_FIELDS fields are left
+EXTRACTION_MODEL = os.getenv("EXTRACTION_MODEL", "gpt-4o")
+EXTRACTION_SMALL_MODEL = os.getenv("EXTRACTION_SMALL_MODEL", "")
+EXTRACTION_SMALL_MODEL_MAX_FIELDS = int(os.getenv("EXTRACTION_SMALL_MODEL_MAX_FIELDS", "8"))
+# Completion budget of the extraction: a fixed part plus a share per requested field, capped at the previous 1500
+EXTRACTION_TOKENS_PER_FIELD = int(os.getenv("EXTRACTION_TOKENS_PER_FIELD", "60"))
+# "json_schema" requests structured outputs (deployments from gpt-4o 2024-08-06 on); "json_object" requests JSON mode
+# with the schema in the prompt, for older deployments
+EXTRACTION_RESPONSE_FORMAT = os.getenv("EXTRACTION_RESPONSE_FORMAT", "json_schema")
+# Follow-up requests for the fields of an answer that fail validation, asking for those fields only
+EXTRACTION_REPAIR_ATTEMPTS = int(os.getenv("EXTRACTION_REPAIR_ATTEMPTS", "1"))
+
+# Document Intelligence results by file content, so a file is only sent for OCR once (see ocr_cache.py)
+ocr_cache = create_ocr_cache()
+
+# Form fields answered by a single-choice group of checkboxes, read from the selection marks instead of the LLM:
+# field path in the English schema -> printed labels of the options in each document language
+CHECKBOX_FIELDS = {
+    ("gender",): {"Hebrew": ("זכר", "נקבה"), "English": ("Male", "Female")},
+    ("medicalInstitutionFields", "healthFundMember"): {
+        "Hebrew": ("כללית", "מאוחדת", "מכבי", "לאומית"),
+        "English": ("Clalit", "Meuhedet", "Maccabi", "Leumit")
+    }
+}
 
-# Initialize Document Analysis Client
-client = DocumentAnalysisClient(endpoint=ENDPOINT_OCR, credential=AzureKeyCredential(API_KEY_OCR))
+# Extraction result shape of each document language, generated from the single definition in form_schema.py
+EXTRACTION_SCHEMAS = {language: build_schema(language) for language in LANGUAGES}
 
-# Initialize Azure OpenAI Client
-openai_client = AsyncAzureOpenAI(
-    api_key=API_KEY_OPENAI,
-    azure_endpoint=ENDPOINT_OPENAI,
-    api_version="2024-02-01"
-)
+def language_prompt(text, max_chars=LANGUAGE_FALLBACK_CHARS):
+    return f"""
+    Detect the primary language of the following text. 
+    Respond with only "Hebrew" or "English".
 
-async def detect_language(text):
+    Text:
+    {text[:max_chars]}
     """
-    Detects the primary language of the provided text using Azure OpenAI.
+
+async def detect_language(text, max_chars=LANGUAGE_FALLBACK_CHARS):
+    """
+    Detects the primary language of the provided text using Azure OpenAI. Only used when local detection is not
+    confident (see detect_document_language).
 
     Args:
         text (str): The text whose language is to be detected.
+        max_chars (int): Characters of the text included in the prompt.
 
     Returns:
         str: Detected language ('Hebrew' or 'English'). Defaults to 'English' if detection is ambiguous.
     """
 
-    prompt = f"""
-    Detect the primary language of the following text. 
-    Respond with only "Hebrew" or "English".
+    prompt = language_prompt(text, max_chars)
 
-    Text:
-    {text}
-    """
-
-    response = await openai_client.chat.completions.create(
+    response = await get_openai_client().chat.completions.create(
         model="gpt-4o",
         messages=[{"role": "user", "content": prompt}],
         max_tokens=5,
@@ -63,191 +103,284 @@ async def detect_language(text):
     language = response.choices[0].message.content.strip()
     return language if language in ["Hebrew", "English"] else "English"
 
-async def extract_fields_with_openai(extracted_text):
+async def detect_document_language(layout):
     """
-    Uses Azure OpenAI to extract structured information from raw extracted text based on a predefined JSON schema.
+    Detects the document language locally from the OCR words and language hints, falling back to Azure OpenAI only
+    when the local confidence is below LANGUAGE_CONFIDENCE_THRESHOLD.
 
     Args:
-        extracted_text (str): The raw text extracted from the document.
+        layout (DocumentLayout): OCR output returned by run_ocr.
 
     Returns:
-        dict: Structured JSON matching the provided schema or an error message if parsing fails.
+        dict: {"language": 'Hebrew' or 'English', "confidence": float, "method": 'local' or 'llm'}
     """
-    
-    language = await detect_language(extracted_text)
-
-    if language == "Hebrew":
-        json_structure = {
-            "שם משפחה": "",
-            "שם פרטי": "",
-            "מספר זהות": "",
-            "מין": "",
-            "תאריך לידה": {"יום": "", "חודש": "", "שנה": ""},
-            "כתובת": {
-                "רחוב": "",
-                "מספר בית": "",
-                "כניסה": "",
-                "דירה": "",
-                "עיר": "",
-                "מיקוד": "",
-                "תא דואר": ""
-            },
-            "טלפון קווי": "",
-            "טלפון נייד": "",
-            "סוג העבודה": "",
-            "תאריך הפגיעה": {"יום": "", "חודש": "", "שנה": ""},
-            "שעת הפגיעה": "",
-            "מיקום התאונה": "",
-            "תיאור התאונה": "",
-            "האיבר שנפגע": "",
-            "חתימה": "",
-            "תאריך מילוי הטופס": {"יום": "", "חודש": "", "שנה": ""},
-            "תאריך קבלת הטופס בקופה": {"יום": "", "חודש": "", "שנה": ""},
-            "למילוי ע\"י המוסד הרפואי": {
-                "חבר בקופת חולים": "",
-                "מהות התאונה": "",
-                "אבחנות רפואיות": ""
-            }
-        }
-    else:
-        json_structure = {
-            "lastName": "",
-            "firstName": "",
-            "idNumber": "",
-            "gender": "",
-            "dateOfBirth": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "address": {
-                "street": "",
-                "houseNumber": "",
-                "entrance": "",
-                "apartment": "",
-                "city": "",
-                "postalCode": "",
-                "poBox": ""
-            },
-            "landlinePhone": "",
-            "mobilePhone": "",
-            "jobType": "",
-            "dateOfInjury": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "timeOfInjury": "",
-            "accidentLocation": "",
-            "accidentAddress": "",
-            "accidentDescription": "",
-            "injuredBodyPart": "",
-            "signature": "",
-            "formFillingDate": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "formReceiptDateAtClinic": {
-                "day": "",
-                "month": "",
-                "year": ""
-            },
-            "medicalInstitutionFields": {
-                "healthFundMember": "",
-                "natureOfAccident": "",
-                "medicalDiagnoses": ""
-            }
-        }
-
-    prompt = f"""
-    Extract the following information strictly into this JSON structure.  
-    Respond with ONLY valid JSON matching exactly this schema—no additional text, explanations, or markdown formatting:
-
-    {json.dumps(json_structure, ensure_ascii=False, indent=2)}
-
-    Text to extract from:
-    {extracted_text}
-    """
-
-    response = await openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=1500,
-        temperature=0
-    )
+    language, confidence = detect_language_locally(layout.words, layout.languages)
+    if language is not None and confidence >= LANGUAGE_CONFIDENCE_THRESHOLD:
+        return {"language": language, "confidence": confidence, "method": "local"}
+
+    logging.info(f"Local language detection is not confident ({confidence}), asking Azure OpenAI.")
+    return {"language": await detect_language(layout.text), "confidence": confidence, "method": "llm"}
+
+def schema_fields(schema, prefix=()):
+    """
+    Returns:
+        list[tuple]: Paths of the leaf fields of a schema.
+    """
+    fields = []
+    for key, value in schema.items():
+        fields += schema_fields(value, prefix + (key,)) if isinstance(value, dict) else [prefix + (key,)]
+    return fields
 
-    content = response.choices[0].message.content.strip()
+def remaining_schema(schema, prefilled, prefix=()):
+    """
+    Args:
+        schema (dict): Extraction schema.
+        prefilled (dict): Schema path -> value of the fields already read from the layout.
 
-    def extract_json_from_response(text):
-        """
-        Attempts to robustly extract and parse JSON from OpenAI response, handling extraneous text or markdown fences gracefully.
+    Returns:
+        dict: The schema without the prefilled fields; groups with no field left are dropped.
+    """
+    remaining = {}
+    for key, value in schema.items():
+        path = prefix + (key,)
+        if path in prefilled:
+            continue
+        if isinstance(value, dict):
+            value = remaining_schema(value, prefilled, path)
+            if not value:
+                continue
+        remaining[key] = value
+    return remaining
+
+def merge_fields(schema, extracted, prefilled):
+    """
+    Builds the complete result from the LLM answer and the prefilled fields, which take precedence.
 
-        Args:
-            text (str): The raw response text from OpenAI.
+    Args:
+        schema (dict): Extraction schema, giving the shape of the result.
+        extracted (dict): Fields returned by the LLM.
+        prefilled (dict): Schema path -> value read from the layout; dates are (day, month, year) tuples.
 
-        Returns:
-            dict or None: Parsed JSON dictionary or None if parsing fails.
-        """
-        try:
-            json_match = re.search(r'```json(.*?)```', text, re.DOTALL)
-            if json_match:
-                json_content = json_match.group(1).strip()
-                return json.loads(json_content)
+    Returns:
+        dict: Every field of the schema, empty where neither source has a value.
+    """
+    def merge(node, answer, prefix):
+        result = {}
+        for key, value in node.items():
+            path = prefix + (key,)
+            answered = answer.get(key, "") if isinstance(answer, dict) else ""
+            if path in prefilled and isinstance(value, dict):
+                result[key] = dict(zip(value, prefilled[path]))
+            elif path in prefilled:
+                result[key] = prefilled[path]
+            elif isinstance(value, dict):
+                result[key] = merge(value, answered, path)
             else:
-                json_match = re.search(r'({.*})', text, re.DOTALL)
-                if json_match:
-                    return json.loads(json_match.group(1).strip())
-        except json.JSONDecodeError as e:
-            logging.error(f"JSON parsing error: {e}")
-        return None
+                result[key] = answered if isinstance(answered, str) else "" if answered is None else json.dumps(answered, ensure_ascii=False)
+        return result
 
-    structured_json = extract_json_from_response(content)
+    return merge(schema, extracted, ())
 
-    if structured_json is None:
-        structured_json = {"error": "Invalid JSON", "raw_response": content}
+def select_fields(schema, paths):
+    """
+    Returns:
+        dict: The part of a schema made of the given leaf field paths.
+    """
+    return remaining_schema(schema, dict.fromkeys(set(schema_fields(schema)) - set(paths)))
+
+def update_fields(fields, update):
+    # Nested update, so a repair answer only replaces the fields it carries
+    for key, value in update.items():
+        if isinstance(value, dict) and isinstance(fields.get(key), dict):
+            update_fields(fields[key], value)
+        else:
+            fields[key] = value
+    return fields
+
+def extraction_prompt(form_text, schema, repairs=None):
+    """
+    Args:
+        form_text (str): The document layout rendered by DocumentLayout.prompt_text.
+        schema (dict): Fields to extract.
+        repairs (dict, optional): Field path -> reason its previous value was rejected.
 
-    return structured_json
+    Returns:
+        str: The extraction prompt. The schema itself is only included in JSON mode; structured outputs carry it in
+        the response format.
+    """
+    prompt = """
+    Extract the fields of this form from its content below. Use the value written on the form for each field, or an
+    empty string if the field is not filled in.
+    """
+    if EXTRACTION_RESPONSE_FORMAT == "json_object":
+        prompt += f"""
+    Respond with a JSON object with exactly this structure:
+    {json.dumps(schema, ensure_ascii=False)}
+    """
+    if repairs:
+        rejected = "\n".join(f"    - {'.'.join(path)}: {reason}" for path, reason in repairs.items())
+        prompt += f"""
+    Your previous answer for these fields was rejected, extract them again:
+{rejected}
+    """
+    return prompt + f"""
+    Form content (key-value pairs and checkboxes detected on the form, then its remaining text lines):
+    {form_text}
+    """
 
-async def analyze_document(file_bytes):
+async def request_fields(form_text, schema, language, model, repairs=None):
     """
-    Analyzes an uploaded document by performing OCR and structured data extraction via Azure OpenAI.
+    Requests the fields of a schema from Azure OpenAI in JSON mode and validates the answer.
+
+    Returns:
+        tuple: (answer dict, {field path: reason} of the fields that are missing or malformed)
+    """
+    field_count = len(schema_fields(schema))
+    response = await get_openai_client().chat.completions.create(
+        model=model,
+        messages=[{"role": "user", "content": extraction_prompt(form_text, schema, repairs)}],
+        max_tokens=min(1500, 100 + EXTRACTION_TOKENS_PER_FIELD * field_count),
+        temperature=0,
+        response_format=response_format(schema, language) if EXTRACTION_RESPONSE_FORMAT == "json_schema"
+        else {"type": "json_object"}
+    )
+
+    try:
+        answer = json.loads(response.choices[0].message.content)
+    except (json.JSONDecodeError, TypeError) as e:
+        # JSON mode still yields partial JSON when the answer is cut at max_tokens
+        logging.error(f"JSON parsing error ({response.choices[0].finish_reason}): {e}")
+        return {}, dict.fromkeys(schema_fields(schema), "no valid JSON answer")
+    if not isinstance(answer, dict):
+        return {}, dict.fromkeys(schema_fields(schema), "no JSON object answer")
+    invalid = invalid_fields(answer, schema, language)
+    if EXTRACTION_RESPONSE_FORMAT == "json_object":
+        # Without a response schema, fields left out of the answer are taken as not filled in rather than re-asked
+        invalid = {path: reason for path, reason in invalid.items() if reason != "missing"}
+    return answer, invalid
+
+async def extract_fields_with_openai(form_text, language, prefilled=None):
+    """
+    Uses Azure OpenAI to extract structured information from the document layout, in structured-output (or JSON)
+    mode. Fields already read from the layout are left out of the requested schema and merged into the answer. The
+    answer is validated against the schema, and the invalid fields alone are asked for again, up to
+    EXTRACTION_REPAIR_ATTEMPTS times; fields that stay invalid are left empty.
 
     Args:
-        file_bytes (bytes): Byte content of the uploaded document.
+        form_text (str): The document layout rendered by DocumentLayout.prompt_text.
+        language (str): Document language, 'Hebrew' or 'English'; selects the schema's key language.
+        prefilled (dict, optional): Schema path -> value of the fields read by prefill_fields.
 
     Returns:
-        dict: Extracted structured data along with validation results, including accuracy scores and missing fields.
+        dict: Every field of the language's schema.
     """
-    
-    logging.basicConfig(level=logging.INFO)
-    logging.info("Starting document analysis.")
-    
-    poller = client.begin_analyze_document("prebuilt-document", file_bytes)
-    result = poller.result()
+    schema = EXTRACTION_SCHEMAS[language]
+    prefilled = prefilled or {}
+    json_structure = remaining_schema(schema, prefilled)
+    field_count = len(schema_fields(json_structure))
+    if field_count == 0:
+        logging.info("All fields were read from the layout, skipping Azure OpenAI.")
+        return merge_fields(schema, {}, prefilled)
+
+    use_small_model = EXTRACTION_SMALL_MODEL and field_count <= EXTRACTION_SMALL_MODEL_MAX_FIELDS
+    model = EXTRACTION_SMALL_MODEL if use_small_model else EXTRACTION_MODEL
+    logging.info(f"Asking {model} for {field_count} fields, {len(prefilled)} were read from the layout.")
+
+    answer, invalid = await request_fields(form_text, json_structure, language, model)
+    for _ in range(EXTRACTION_REPAIR_ATTEMPTS):
+        if not invalid:
+            break
+        logging.info(f"Asking {model} again for {len(invalid)} invalid fields.")
+        repaired, still_invalid = await request_fields(
+            form_text, select_fields(json_structure, invalid), language, model, repairs=invalid
+        )
+        # Only the fields that are now valid replace the previous answer
+        valid_paths = set(invalid) - set(still_invalid)
+        update_fields(answer, merge_fields(select_fields(json_structure, valid_paths), repaired, {}))
+        invalid = still_invalid
 
-    extracted_data = {"pages": []}
+    if invalid:
+        logging.warning(f"Leaving invalid fields empty: {', '.join('.'.join(path) for path in invalid)}")
+    return merge_fields(schema, answer, {**dict.fromkeys(invalid, ""), **prefilled})
 
-    for page in result.pages:
-        page_data = {"page_number": page.page_number, "words": []}
-        for word in page.words:
-            page_data["words"].append({"text": word.content, "confidence": word.confidence})
-        extracted_data["pages"].append(page_data)
+async def run_ocr(file_bytes):
+    """
+    Runs Azure Document Intelligence OCR on a document, or reads its result from the OCR cache. The status polls are
+    awaited, so the event loop keeps serving other documents while the service works.
 
-    logging.info(f"Extracted {sum(len(page['words']) for page in extracted_data['pages'])} words from document.")
-    
-    # Combine extracted text into a single string
-    extracted_text = " ".join(word["text"] for page in extracted_data["pages"] for word in page["words"])
+    Args:
+        file_bytes (bytes): Byte content of the document.
+
+    Returns:
+        DocumentLayout: Words, lines, key-value pairs, checkboxes and language hints of the document (see layout.py).
+    """
+    features = [AnalysisFeature.LANGUAGES] if OCR_LANGUAGE_HINTS else None
+    cache_key = ocr_cache_key(file_bytes, OCR_MODEL_ID, features)
+    # Cache reads and writes touch disk or Redis and (de)compress the result, so they run off the loop
+    cached = await asyncio.to_thread(ocr_cache.get, cache_key) if ocr_cache is not None else None
+
+    if cached is not None:
+        logging.info("Using cached OCR result.")
+        result = AnalyzeResult.from_dict(cached)
+    else:
+        poller = await get_ocr_client().begin_analyze_document(
+            OCR_MODEL_ID, file_bytes, features=features, polling_interval=OCR_POLLING_INTERVAL
+        )
+        result = await poller.result()
+        if ocr_cache is not None:
+            await asyncio.to_thread(ocr_cache.put, cache_key, result.to_dict())
+
+    layout = build_layout(result)
+    logging.info(f"Extracted {len(layout)} words, {len(layout.key_value_pairs)} key-value pairs and "
+                 f"{len(layout.mark_labels)} checkboxes from document.")
+    return layout
 
+def prefill_fields(layout, language):
+    """
+    Reads the fields that need no LLM from the layout: the well-formed values found by the rules of field_rules.py
+    and the checkbox fields with exactly one option selected.
+
+    Args:
+        layout (DocumentLayout): OCR output returned by run_ocr.
+        language (str): Document language, selects the field paths and option labels.
+
+    Returns:
+        dict: Schema path (tuple of keys) -> value.
+    """
+    prefilled = extract_fields_by_rules(layout, language)
+    for path, options in CHECKBOX_FIELDS.items():
+        option = layout.selected_option(options[language])
+        if option is not None:
+            prefilled[translate_path(path, language)] = option
+    return prefilled
+
+async def extract_structured_data(layout, on_progress=None):
+    """
+    Extracts the form fields from OCR output via Azure OpenAI and validates them.
+
+    Args:
+        layout (DocumentLayout): OCR output returned by run_ocr.
+        on_progress (callable, optional): Called as on_progress(stage, **data) after the language, extraction and
+            validation stages.
+
+    Returns:
+        dict: Extracted structured data along with validation results, including accuracy scores and missing fields.
+    """
     logging.info("Sending extracted text to OpenAI for field extraction.")
     
-    # Extract structured fields using Azure OpenAI
-    structured_data = await extract_fields_with_openai(extracted_text)
+    detection = await detect_document_language(layout)
+    if on_progress:
+        on_progress("language", **detection)
+
+    # Well-formed fields and checkboxes are read from the layout; Azure OpenAI only extracts the others
+    prefilled = prefill_fields(layout, detection["language"])
+    structured_data = await extract_fields_with_openai(layout.prompt_text(), detection["language"], prefilled)
 
     logging.info("Successfully received structured data from OpenAI.")
+    if on_progress:
+        on_progress("extraction", fields=len(structured_data), prefilled=len(prefilled))
 
-    ocr_confidence_data = [word["confidence"] for page in extracted_data["pages"] for word in page["words"]]
-    validation_result = validate_extracted_data(structured_data, ocr_confidence_data)
+    validation_result = validate_extracted_data(structured_data, layout.word_confidence)
 
     if validation_result["is_complete"]:
         logging.info(f"Extracted data is complete with accuracy score: {validation_result['accuracy_score']}")
@@ -256,17 +389,71 @@ async def analyze_document(file_bytes):
             f"Extracted data incomplete. Missing fields: {validation_result['missing_fields']}, "
             f"Accuracy score: {validation_result['accuracy_score']}"
         )
+    if on_progress:
+        on_progress("validation", **validation_result)
     structured_data["validation"] = validation_result
     
     return structured_data
 
+async def analyze_document(file_bytes, on_progress=None):
+    """
+    Analyzes an uploaded document by performing OCR and structured data extraction via Azure OpenAI.
+
+    Args:
+        file_bytes (bytes): Byte content of the uploaded document.
+        on_progress (callable, optional): Called as on_progress(stage, **data) after each stage (ocr, language,
+            extraction, validation).
+
+    Returns:
+        dict: Extracted structured data along with validation results, including accuracy scores and missing fields.
+    """
+
+    logging.info("Starting document analysis.")
+    
+    layout = await run_ocr(file_bytes)
+    if on_progress:
+        on_progress("ocr", pages=layout.page_count, words=len(layout))
+
+    return await extract_structured_data(layout, on_progress)
+
+async def analyze_documents(documents, ocr_concurrency=PIPELINE_OCR_CONCURRENCY,
+                            extraction_concurrency=PIPELINE_EXTRACTION_CONCURRENCY, on_progress=None):
+    """
+    Analyzes several documents as a two-stage pipeline: while one document is in field extraction, the OCR of the
+    next one is already running.
+
+    Args:
+        documents (list[bytes]): Byte content of the documents.
+        ocr_concurrency (int): Documents in OCR at once.
+        extraction_concurrency (int): Documents in field extraction at once.
+        on_progress (callable, optional): Called as on_progress(index, stage, **data) after each stage of a document.
+
+    Returns:
+        list: The analyze_document result of each document, in input order; an exception instance where the
+        analysis of a document failed.
+    """
+    ocr_slots = asyncio.Semaphore(ocr_concurrency)
+    extraction_slots = asyncio.Semaphore(extraction_concurrency)
+
+    async def analyze(index, file_bytes):
+        report = (lambda stage, **data: on_progress(index, stage, **data)) if on_progress else None
+        async with ocr_slots:
+            layout = await run_ocr(file_bytes)
+        if report:
+            report("ocr", pages=layout.page_count, words=len(layout))
+        async with extraction_slots:
+            return await extract_structured_data(layout, report)
+
+    return await asyncio.gather(*(analyze(index, file_bytes) for index, file_bytes in enumerate(documents)),
+                                return_exceptions=True)
+
 def validate_extracted_data(extracted_json, ocr_confidence_data, required_fields=None):
     """
     Validates the completeness and accuracy of extracted JSON data based on OCR confidence levels.
 
     Args:
         extracted_json (dict): JSON data extracted from the document.
-        ocr_confidence_data (list): List of OCR confidence scores.
+        ocr_confidence_data (list or np.ndarray): OCR confidence scores of the words.
         required_fields (list, optional): List of fields required for completeness validation. Defaults to all fields in extracted_json.
 
     Returns:
@@ -287,7 +474,7 @@ def validate_extracted_data(extracted_json, ocr_confidence_data, required_fields
 
     is_complete = len(missing_fields) == 0
 
-    avg_confidence = sum(ocr_confidence_data) / len(ocr_confidence_data) if ocr_confidence_data else 0
+    avg_confidence = float(sum(ocr_confidence_data) / len(ocr_confidence_data)) if len(ocr_confidence_data) else 0
 
     validation_result = {
         "is_complete": is_complete,
@@ -297,8 +484,54 @@ def validate_extracted_data(extracted_json, ocr_confidence_data, required_fields
 
     return validation_result
 
-@celery_app.task(name="analyze_document_task")
-def analyze_document_task(file_bytes):
-    loop = asyncio.get_event_loop()
-    result = loop.run_until_complete(analyze_document(file_bytes))
-    return result
\ No newline at end of file
+@celery_app.task(name="analyze_document_task", bind=True)
+def analyze_document_task(self, file_bytes):
+    # Stage events go to the task's progress stream, which the app reads instead of polling the task (see progress.py)
+    task_id = self.request.id
+
+    # Stage events are reported from the worker's event loop, so Redis is written from a background thread
+    def report(stage, **data):
+        return publish_progress_in_background(task_id, stage, **data)
+
+    report("uploaded", size_bytes=len(file_bytes))
+    try:
+        result = run_async(analyze_document(file_bytes, on_progress=report))
+    except Exception as e:
+        # Final events are published before the task finishes, after every earlier event
+        report("error", message=str(e)).result()
+        raise
+    report("done", result=result).result()
+    return result
+
+@celery_app.task(name="ocr_document_task", acks_late=True)
+def ocr_document_task(file_bytes):
+    """
+    OCR stage of batch ingestion; its result is passed on to extract_fields_task.
+
+    Returns:
+        dict: {"layout": dict (DocumentLayout.to_dict), "ocr_seconds": float}
+    """
+    start = time.perf_counter()
+    layout = run_async(run_ocr(file_bytes))
+    return {"layout": layout.to_dict(), "ocr_seconds": round(time.perf_counter() - start, 3)}
+
+@celery_app.task(name="extract_fields_task", acks_late=True)
+def extract_fields_task(ocr_output):
+    """
+    Field extraction and validation stage of batch ingestion.
+
+    Args:
+        ocr_output (dict): Result of ocr_document_task.
+
+    Returns:
+        dict: {"result": dict, "validation": dict, "ocr_seconds": float, "extraction_seconds": float}
+    """
+    start = time.perf_counter()
+    result = run_async(extract_structured_data(DocumentLayout.from_dict(ocr_output["layout"])))
+    validation = result.pop("validation")
+    return {
+        "result": result,
+        "validation": validation,
+        "ocr_seconds": ocr_output["ocr_seconds"],
+        "extraction_seconds": round(time.perf_counter() - start, 3)
+    }
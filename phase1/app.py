@@ -2,11 +2,12 @@
 Streamlit application for uploading documents and asynchronously analyzing their content using OCR and structured data extraction through Celery and Azure OpenAI.
 
 The app allows users to upload documents (PDF, PNG, JPG), processes these documents asynchronously, and presents structured extracted data along with accuracy and completeness validation.
+Progress of each stage (OCR, language detection, field extraction, validation) is pushed by the worker over a Redis stream and shown as it arrives, and the result is rendered as soon as the final event lands (see progress.py).
 
 Dependencies:
     - Streamlit: Frontend interface for document upload and result display.
     - Celery: Task queue for asynchronous document analysis.
-    - Redis: Message broker and backend for Celery.
+    - Redis: Message broker and backend for Celery, and carrier of the progress events.
 
 Usage:
     Run the Streamlit app and upload supported file types (PDF, PNG, JPG). The app asynchronously processes uploaded files, displaying extraction results and validation scores upon completion.
@@ -14,32 +15,62 @@ Usage:
 
 import streamlit as st
 from analyze import analyze_document_task
-import time
+from progress import iter_progress, STAGES
+
+STAGE_LABELS = {
+    "uploaded": "Document received by the worker",
+    "ocr": "OCR done",
+    "language": "Language detected",
+    "extraction": "Fields extracted",
+    "validation": "Fields validated"
+}
+
+def describe_event(event):
+    data = event["data"]
+    if event["stage"] == "ocr":
+        return f"{data['pages']} pages, {data['words']} words"
+    if event["stage"] == "language":
+        return f"{data['language']} ({'detected locally' if data['method'] == 'local' else 'asked Azure OpenAI'})"
+    if event["stage"] == "extraction":
+        return f"{data['fields']} fields, {data.get('prefilled', 0)} read without the LLM"
+    if event["stage"] == "validation":
+        return f"accuracy score {data['accuracy_score']*100:.0f}%"
+    return f"{data.get('size_bytes', 0) / 1024:.0f} KB"
 
 st.title("Document Analysis and Extraction")
 
 uploaded_file = st.file_uploader("Upload your document", type=["pdf", "png", "jpg"])
 
 if uploaded_file:
-    with st.spinner("Analyzing document..."):
-        task = analyze_document_task.delay(uploaded_file.getvalue())
+    task = analyze_document_task.delay(uploaded_file.getvalue())
+    structured_data = None
+    validation = {}
 
-        while not task.ready():
-            time.sleep(1)
+    progress_bar = st.progress(0.0)
+    with st.status("Analyzing document...", expanded=True) as status:
+        try:
+            for event in iter_progress(task.id):
+                if event["stage"] == "done":
+                    structured_data = event["data"]["result"]
+                    validation = structured_data.pop("validation", {})
+                    progress_bar.progress(1.0)
+                    status.update(label="Analysis complete", state="complete", expanded=False)
+                elif event["stage"] == "error":
+                    status.update(label="Analysis failed", state="error")
+                    st.error(f"Task failed: {event['data']['message']}")
+                else:
+                    st.write(f"{STAGE_LABELS[event['stage']]}: {describe_event(event)}")
+                    progress_bar.progress((STAGES.index(event["stage"]) + 1) / (len(STAGES) + 1))
+        except TimeoutError as e:
+            status.update(label="Analysis timed out", state="error")
+            st.error(str(e))
 
-        if task.successful():
-            structured_data = task.result
-            validation = structured_data.pop("validation", {})
+    if structured_data is not None:
+        if validation.get("is_complete"):
+            st.success(f"Extraction complete! Accuracy Score: {validation['accuracy_score']*100}%")
         else:
-            st.error(f"Task failed: {task.result}")
-            structured_data = {}
-            validation = {}
-
-    if validation.get("is_complete"):
-        st.success(f"Extraction complete! Accuracy Score: {validation['accuracy_score']*100}%")
-    else:
-        st.warning(
-            f"Missing or incomplete fields: {', '.join(validation.get('missing_fields', []))}. "
-            f"Accuracy Score: {validation['accuracy_score']*100}%"
-        )
-    st.json(structured_data, expanded=False)
\ No newline at end of file
+            st.warning(
+                f"Missing or incomplete fields: {', '.join(validation.get('missing_fields', []))}. "
+                f"Accuracy Score: {validation['accuracy_score']*100}%"
+            )
+        st.json(structured_data, expanded=False)
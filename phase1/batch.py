@@ -0,0 +1,211 @@
+"""
+Module: batch.py
+
+Purpose:
+Batch ingestion of National Insurance forms. Takes a directory or a zip archive of documents (PDF, PNG, JPG), fans
+out one Celery chain per document, OCR (ocr_document_task) followed by field extraction and validation
+(extract_fields_task), and appends one JSON line per document to the output file as soon as its chain finishes:
+
+    {"document", "sha256", "status": "ok" | "error", "ocr_seconds", "extraction_seconds", "total_seconds",
+     "validation", "result", "error_type", "error_message"}
+
+Concurrency caps per upstream service: the OCR and extraction tasks are routed to the `ocr` and `openai` queues
+(see analyze.py), and each queue is consumed by its own worker whose --concurrency is the cap for that service
+(OCR_CONCURRENCY and OPENAI_CONCURRENCY in run_batch_workers.sh). With workers on several hosts the caps add up.
+
+Resuming: documents that already have an "ok" line in the output file with the same content hash are skipped, so
+rerunning the same command after a crash only processes what is left; failed documents are retried. Task ids are
+derived from the document name and content, so a document whose chain finished after the previous run stopped is
+picked up from the result backend instead of being processed again.
+
+Usage:
+    cd phase1
+    ./run_batch_workers.sh
+    python batch.py path/to/forms/ --output results.jsonl
+    python batch.py path/to/forms.zip --output results.jsonl
+"""
+
+import os
+import argparse
+import hashlib
+import json
+import logging
+import time
+import zipfile
+from celery import chain, group
+from celery.result import AsyncResult, ResultSet
+from analyze import celery_app, ocr_document_task, extract_fields_task
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SUPPORTED_EXTENSIONS = (".pdf", ".png", ".jpg", ".jpeg")
+# Documents per submitted group; bounds the file bytes held in memory while submitting
+BATCH_GROUP_SIZE = int(os.getenv("BATCH_GROUP_SIZE", "50"))
+
+def is_supported(name):
+    return name.lower().endswith(SUPPORTED_EXTENSIONS) and not os.path.basename(name).startswith(".")
+
+def iter_documents(source):
+    """
+    Yields the supported documents of a directory (recursively) or a zip archive, in name order.
+
+    Args:
+        source (str): Directory or .zip file path.
+
+    Yields:
+        tuple: (name relative to the source, file bytes)
+    """
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in sorted(archive.namelist()):
+                if not name.endswith("/") and not name.startswith("__MACOSX/") and is_supported(name):
+                    yield name, archive.read(name)
+    elif os.path.isdir(source):
+        paths = []
+        for root, _, files in os.walk(source):
+            paths.extend(os.path.join(root, file) for file in files if is_supported(file))
+        for path in sorted(paths):
+            with open(path, "rb") as file:
+                yield os.path.relpath(path, source).replace(os.sep, "/"), file.read()
+    else:
+        raise ValueError(f"{source} is neither a directory nor a zip archive.")
+
+def load_finished(output_path):
+    """
+    Returns:
+        dict: document name -> content hash of every document with an "ok" line in the output file.
+    """
+    finished = {}
+    if not os.path.exists(output_path):
+        return finished
+
+    with open(output_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A line cut short by a crash; the document is processed again
+                continue
+            if record.get("status") == "ok":
+                finished[record["document"]] = record["sha256"]
+    return finished
+
+def task_ids(name, sha256):
+    prefix = "batch-" + hashlib.sha256(f"{name}:{sha256}".encode("utf-8")).hexdigest()[:32]
+    return f"{prefix}-ocr", f"{prefix}-extract"
+
+def make_record(name, sha256, status, value, total_seconds):
+    """
+    Args:
+        value: The task result for "ok"; for "error", the exception, or the exception meta of the result backend
+            ({"exc_type", "exc_message", ...}) as returned by `ResultSet.iter_native`.
+
+    Returns:
+        dict: The JSON line of the document.
+    """
+    record = {"document": name, "sha256": sha256, "status": status, "total_seconds": total_seconds}
+    if status == "ok":
+        record.update(value)
+    elif isinstance(value, dict) and "exc_type" in value:
+        message = value.get("exc_message")
+        record["error_type"] = value["exc_type"]
+        record["error_message"] = ", ".join(map(str, message)) if isinstance(message, (list, tuple)) else str(message or "")
+    else:
+        record["error_type"] = type(value).__name__
+        record["error_message"] = str(value)
+    return record
+
+def run_batch(source, output_path, timeout=None):
+    """
+    Processes every document of a directory or zip archive that is not finished yet, appending a JSON line per
+    document to the output file.
+
+    Args:
+        source (str): Directory or .zip file path.
+        output_path (str): JSONL results file; created if missing, appended to otherwise.
+        timeout (float, optional): Seconds to wait for the whole batch.
+
+    Returns:
+        dict: Summary with the number of processed, skipped and failed documents and the batch throughput.
+    """
+    finished = load_finished(output_path)
+    start = time.perf_counter()
+    documents = {}
+    submitted = []
+    reused = []
+    skipped = 0
+    pending = []
+
+    def submit(pending):
+        group(chain(
+            ocr_document_task.signature((file_bytes,), task_id=ocr_id),
+            extract_fields_task.signature(task_id=extract_id)
+        ) for file_bytes, ocr_id, extract_id in pending).apply_async()
+
+    for name, file_bytes in iter_documents(source):
+        sha256 = hashlib.sha256(file_bytes).hexdigest()
+        if finished.get(name) == sha256:
+            skipped += 1
+            continue
+
+        ocr_id, extract_id = task_ids(name, sha256)
+        documents[extract_id] = (name, sha256, time.perf_counter())
+        previous = AsyncResult(extract_id, app=celery_app)
+        if previous.successful():
+            reused.append(extract_id)
+            continue
+        # Stale results of a failed or interrupted run would otherwise be read as this run's outcome
+        previous.forget()
+        AsyncResult(ocr_id, app=celery_app).forget()
+
+        submitted.append(extract_id)
+        pending.append((file_bytes, ocr_id, extract_id))
+        if len(pending) >= BATCH_GROUP_SIZE:
+            submit(pending)
+            pending = []
+    if pending:
+        submit(pending)
+    # Built once everything is submitted; the Redis backend only follows results created after their task was sent
+    results = ResultSet([AsyncResult(extract_id, app=celery_app) for extract_id in submitted])
+
+    logger.info(f"Submitted {len(results)} documents, {len(reused)} finished earlier, {skipped} already in {output_path}.")
+    counts = {"ok": 0, "error": 0}
+
+    with open(output_path, "a", encoding="utf-8") as output:
+        def write(extract_id, status, value, total_seconds):
+            name, sha256, _ = documents[extract_id]
+            output.write(json.dumps(make_record(name, sha256, status, value, total_seconds), ensure_ascii=False) + "\n")
+            # Each line is flushed as it is written so a crash loses at most the documents still in flight
+            output.flush()
+            counts[status] += 1
+            logger.info(f"[{sum(counts.values())}/{len(documents)}] {name}: {status}")
+
+        for extract_id in reused:
+            write(extract_id, "ok", AsyncResult(extract_id, app=celery_app).result, None)
+
+        if len(results):
+            # Results are pushed by the Redis result backend in completion order
+            for extract_id, meta in results.iter_native(timeout=timeout):
+                status = "ok" if meta["status"] == "SUCCESS" else "error"
+                total_seconds = round(time.perf_counter() - documents[extract_id][2], 3)
+                write(extract_id, status, meta["result"], total_seconds)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": counts["ok"],
+        "failed": counts["error"],
+        "skipped": skipped,
+        "seconds": round(elapsed, 1),
+        "documents_per_second": round(sum(counts.values()) / elapsed, 2) if elapsed else None
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extract fields from every form in a directory or zip archive.")
+    parser.add_argument("source", help="Directory or .zip archive of PDF, PNG and JPG documents.")
+    parser.add_argument("--output", default="batch_results.jsonl", help="JSONL results file; rerun with the same file to resume.")
+    parser.add_argument("--timeout", type=float, default=None, help="Seconds to wait for the whole batch.")
+    args = parser.parse_args()
+
+    summary = run_batch(args.source, args.output, timeout=args.timeout)
+    print(json.dumps(summary, indent=2))
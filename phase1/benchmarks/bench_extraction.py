@@ -0,0 +1,118 @@
+"""
+Script: bench_extraction.py
+
+Purpose:
+Measures what rule-based pre-extraction (field_rules.py and the checkbox fields) saves on field extraction, over
+the documents in phase1_data (or any directory of forms). For each document the OCR layout is produced once (and
+cached like in bench_language.py), then the fields are extracted twice:
+- before: every field of the schema requested from EXTRACTION_MODEL, as before pre-extraction;
+- after: the fields read from the layout are filled in directly, and only the remaining ones are requested (from
+  EXTRACTION_SMALL_MODEL if it is set and few enough fields are left).
+
+Token counts are the usage reported by Azure OpenAI, latencies are the wall time of the requests. The agreement
+column compares the prefilled values with the answer of the full request. Needs the Azure credentials in .env.
+
+Usage:
+    cd phase1
+    python benchmarks/bench_extraction.py --ocr-cache /tmp/phase1_ocr
+    EXTRACTION_SMALL_MODEL=gpt-4o-mini python benchmarks/bench_extraction.py --ocr-cache /tmp/phase1_ocr
+"""
+
+import os
+import sys
+import argparse
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analyze
+from analyze import detect_document_language, extract_fields_with_openai, prefill_fields, merge_fields, EXTRACTION_SCHEMAS
+from bench_language import load_ocr, DATA_DIR
+from worker_runtime import get_openai_client, run_async, shutdown_runtime
+
+class UsageRecorder:
+    """
+    Stands in for the Azure OpenAI client in analyze.py, forwarding chat completions and adding up their usage.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.chat = self
+        self.completions = self
+        self.reset()
+
+    def reset(self):
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.seconds = 0.0
+
+    async def create(self, **kwargs):
+        start = time.perf_counter()
+        response = await self.client.chat.completions.create(**kwargs)
+        self.seconds += time.perf_counter() - start
+        self.requests += 1
+        self.prompt_tokens += response.usage.prompt_tokens
+        self.completion_tokens += response.usage.completion_tokens
+        return response
+
+def flatten(fields, prefix=()):
+    flat = {}
+    for key, value in fields.items():
+        flat.update(flatten(value, prefix + (key,)) if isinstance(value, dict) else {prefix + (key,): value})
+    return flat
+
+async def bench_document(layout, recorder):
+    language = (await detect_document_language(layout))["language"]
+    form_text = layout.prompt_text()
+
+    recorder.reset()
+    before = await extract_fields_with_openai(form_text, language)
+    usage_before = (recorder.prompt_tokens, recorder.completion_tokens, recorder.seconds)
+
+    recorder.reset()
+    prefilled = prefill_fields(layout, language)
+    await extract_fields_with_openai(form_text, language, prefilled)
+    usage_after = (recorder.prompt_tokens, recorder.completion_tokens, recorder.seconds, recorder.requests)
+
+    # Dates are compared as their day, month and year fields
+    expected = flatten(before)
+    filled = flatten(merge_fields(EXTRACTION_SCHEMAS[language], {}, prefilled))
+    compared = [path for path in filled if filled[path] and path in expected]
+    agreement = sum(filled[path] == expected[path] for path in compared) / len(compared) if compared else 1.0
+    return {"prefilled": len(prefilled), "agreement": agreement, "before": usage_before, "after": usage_after}
+
+def run_benchmark(data_dir, cache_dir):
+    recorder = UsageRecorder(get_openai_client())
+    analyze.get_openai_client = lambda: recorder
+
+    paths = sorted(
+        os.path.join(data_dir, name) for name in os.listdir(data_dir) if name.lower().endswith((".pdf", ".png", ".jpg", ".jpeg"))
+    )
+    print(f"{'document':<16} {'prefilled':>9} {'agree':>6} {'tokens before':>14} {'after':>6} {'ms before':>10} {'after':>6} {'requests':>9}")
+    rows = []
+    for path in paths:
+        row = run_async(bench_document(load_ocr(path, cache_dir), recorder))
+        rows.append(row)
+        before, after = row["before"], row["after"]
+        print(f"{os.path.basename(path):<16} {row['prefilled']:>9} {row['agreement']:>6.0%} {before[0] + before[1]:>14} "
+              f"{after[0] + after[1]:>6} {before[2] * 1000:>10.0f} {after[2] * 1000:>6.0f} {after[3]:>9}")
+
+    tokens_before = sum(row["before"][0] + row["before"][1] for row in rows)
+    tokens_after = sum(row["after"][0] + row["after"][1] for row in rows)
+    seconds_before = sum(row["before"][2] for row in rows)
+    seconds_after = sum(row["after"][2] for row in rows)
+    print(f"\nextraction tokens: {tokens_before} before, {tokens_after} after ({tokens_before / max(tokens_after, 1):.1f}x fewer)")
+    print(f"extraction latency: {seconds_before / len(rows) * 1000:.0f} ms before, {seconds_after / len(rows) * 1000:.0f} ms after per document")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark rule-based pre-extraction against full LLM extraction.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory of forms.")
+    parser.add_argument("--ocr-cache", default=None, help="Directory caching Document Intelligence output between runs.")
+    args = parser.parse_args()
+
+    try:
+        run_benchmark(args.data_dir, args.ocr_cache)
+    finally:
+        shutdown_runtime()
@@ -0,0 +1,114 @@
+"""
+Script: bench_language.py
+
+Purpose:
+Compares local language detection (language.py) with the Azure OpenAI classification it replaces, over the documents
+in phase1_data (or any directory of forms). For each document the OCR output is produced once by Document Intelligence
+and cached as JSON, then:
+- local: detect_language_locally on the OCR words and language hints, timed over many repetitions;
+- llm: detect_language on the full OCR text, as every document did before, timed once;
+- tokens: input tokens of the previous prompt, and those still sent after the change (zero unless the document falls
+  back to the LLM, whose prompt is capped at LANGUAGE_FALLBACK_CHARS).
+
+The LLM answer serves as the reference: the agreement column shows whether local detection keeps the previous
+decision. Needs the Azure credentials in .env.
+
+Usage:
+    cd phase1
+    python benchmarks/bench_language.py --ocr-cache /tmp/phase1_ocr
+"""
+
+import os
+import sys
+import argparse
+import json
+import time
+import tiktoken
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from analyze import run_ocr, detect_language, language_prompt
+from language import detect_language_locally, LANGUAGE_CONFIDENCE_THRESHOLD
+from layout import DocumentLayout
+from worker_runtime import run_async, shutdown_runtime
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phase1_data'))
+LOCAL_REPETITIONS = 200
+
+def load_ocr(path, cache_dir):
+    cache_path = os.path.join(cache_dir, os.path.basename(path) + ".json") if cache_dir else None
+    if cache_path and os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as file:
+            return DocumentLayout.from_dict(json.load(file))
+
+    with open(path, "rb") as file:
+        layout = run_async(run_ocr(file.read()))
+    if cache_path:
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as file:
+            json.dump(layout.to_dict(), file, ensure_ascii=False)
+    return layout
+
+def bench_document(layout, encoding):
+    words = layout.words
+    text = " ".join(words)
+
+    start = time.perf_counter()
+    for _ in range(LOCAL_REPETITIONS):
+        local_language, confidence = detect_language_locally(words, layout.languages)
+    local_ms = (time.perf_counter() - start) / LOCAL_REPETITIONS * 1000
+
+    start = time.perf_counter()
+    llm_language = run_async(detect_language(text, max_chars=len(text)))
+    llm_ms = (time.perf_counter() - start) * 1000
+
+    # The previous prompt carried the whole OCR text; the fallback prompt is capped
+    tokens_before = len(encoding.encode(language_prompt(text, max_chars=len(text))))
+    falls_back = local_language is None or confidence < LANGUAGE_CONFIDENCE_THRESHOLD
+    tokens_after = len(encoding.encode(language_prompt(text))) if falls_back else 0
+    return {
+        "local": local_language,
+        "confidence": confidence,
+        "llm": llm_language,
+        "fallback": falls_back,
+        "local_ms": local_ms,
+        "llm_ms": llm_ms,
+        "tokens_before": tokens_before,
+        "tokens_after": tokens_after
+    }
+
+def run_benchmark(data_dir, cache_dir):
+    encoding = tiktoken.encoding_for_model("gpt-4o")
+    paths = sorted(
+        os.path.join(data_dir, name) for name in os.listdir(data_dir) if name.lower().endswith((".pdf", ".png", ".jpg", ".jpeg"))
+    )
+
+    print(f"{'document':<16} {'local':>8} {'conf':>6} {'llm':>8} {'agree':>6} {'local ms':>9} {'llm ms':>8} {'tokens before':>14} {'after':>6}")
+    rows = []
+    for path in paths:
+        row = bench_document(load_ocr(path, cache_dir), encoding)
+        rows.append(row)
+        # A fallback document uses the LLM answer, so it always agrees
+        agrees = row["fallback"] or row["local"] == row["llm"]
+        print(f"{os.path.basename(path):<16} {str(row['local']):>8} {row['confidence']:>6.2f} {row['llm']:>8} {str(agrees):>6} "
+              f"{row['local_ms']:>9.3f} {row['llm_ms']:>8.0f} {row['tokens_before']:>14} {row['tokens_after']:>6}")
+
+    agreement = sum(row["fallback"] or row["local"] == row["llm"] for row in rows) / len(rows)
+    fallbacks = sum(row["fallback"] for row in rows)
+    mean_saved_ms = sum(row["llm_ms"] * (not row["fallback"]) for row in rows) / len(rows)
+    tokens_before = sum(row["tokens_before"] for row in rows)
+    tokens_after = sum(row["tokens_after"] for row in rows)
+    print(f"\nagreement with the LLM: {agreement:.0%}, LLM fallbacks: {fallbacks}/{len(rows)}")
+    print(f"mean serial latency removed per document: {mean_saved_ms:.0f} ms")
+    print(f"language detection input tokens: {tokens_before} before, {tokens_after} after")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark local language detection against the LLM classification.")
+    parser.add_argument("--data-dir", default=DATA_DIR, help="Directory of forms.")
+    parser.add_argument("--ocr-cache", default=None, help="Directory caching Document Intelligence output between runs.")
+    args = parser.parse_args()
+
+    try:
+        run_benchmark(args.data_dir, args.ocr_cache)
+    finally:
+        shutdown_runtime()
@@ -0,0 +1,146 @@
+"""
+Script: bench_pipeline.py
+
+Purpose:
+Measures the per-stage latency and throughput of document analysis against the local stub services
+(mock_services.py), comparing:
+- sequential: analyze_document awaited for one document after the other, as a single task does;
+- pipelined: analyze_documents, where the OCR of document N runs while document N-1 is in field extraction.
+
+Each mode runs for every polling interval given, since the OCR stage completes on the first poll after the service
+has finished and so rounds the service time up to the polling interval. The event loop lag column is the largest delay
+of a 10 ms timer on the runtime loop during the run: polling with the async client should keep it near zero.
+
+The workers' credentials are replaced by the stub's address and the OCR cache is disabled, so every document goes
+through Document Intelligence.
+
+Usage:
+    cd phase1
+    python benchmarks/bench_pipeline.py --documents 8 --ocr-latency 2.2 --openai-latency 1.5 --polling-intervals 1 0.25
+"""
+
+import os
+import sys
+import argparse
+import asyncio
+import logging
+import time
+
+PORT = 8200
+
+os.environ["AZURE_OCR_AI_SERVICES_URL"] = os.environ["AZURE_OPENAI_SERVICES_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ["AZURE_OCR_AI_SERVICES_KEY"] = os.environ["AZURE_OPENAI_SERVICES_KEY"] = "mock"
+os.environ["OCR_CACHE_BACKEND"] = "none"
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import analyze
+from analyze import analyze_document, analyze_documents, run_ocr
+from mock_services import start_mock_server
+from worker_runtime import run_async, shutdown_runtime
+
+STAGES = ("ocr", "language", "extraction", "validation")
+LAG_INTERVAL = 0.01
+
+async def measure_loop_lag(stop):
+    """
+    Returns:
+        float: Largest delay, in seconds, of a LAG_INTERVAL timer until `stop` is set.
+    """
+    max_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        max_lag = max(max_lag, time.perf_counter() - start - LAG_INTERVAL)
+    return max_lag
+
+async def run_mode(mode, documents):
+    """
+    Analyzes the documents in one mode.
+
+    Returns:
+        tuple: (wall seconds, max event loop lag in seconds, {document index: {stage: seconds since the start}})
+    """
+    events = {index: {} for index in range(len(documents))}
+    ocr_seconds = []
+    stop = asyncio.Event()
+    lag = asyncio.ensure_future(measure_loop_lag(stop))
+    start = time.perf_counter()
+
+    def record(index, stage, **data):
+        events[index][stage] = time.perf_counter() - start
+
+    async def timed_ocr(file_bytes):
+        ocr_start = time.perf_counter()
+        try:
+            return await run_ocr(file_bytes)
+        finally:
+            ocr_seconds.append(time.perf_counter() - ocr_start)
+
+    # Both modes call analyze.run_ocr, so the OCR call itself is timed apart from the wait for a pipeline slot
+    analyze.run_ocr = timed_ocr
+    try:
+        if mode == "sequential":
+            for index, file_bytes in enumerate(documents):
+                events[index]["start"] = time.perf_counter() - start
+                await analyze_document(file_bytes, lambda stage, index=index, **data: record(index, stage, **data))
+        else:
+            for index in events:
+                events[index]["start"] = 0.0
+            results = await analyze_documents(documents, on_progress=record)
+            failures = [result for result in results if isinstance(result, Exception)]
+            if failures:
+                raise failures[0]
+    finally:
+        analyze.run_ocr = run_ocr
+
+    wall = time.perf_counter() - start
+    stop.set()
+    return wall, await lag, events, ocr_seconds
+
+def stage_latencies(events, ocr_seconds):
+    """
+    Returns:
+        dict: Stage -> mean seconds spent in that stage. OCR is the duration of the run_ocr calls; the other stages
+        are the time since the previous stage's progress event, which in pipelined mode includes waiting for a free
+        extraction slot in the language stage.
+    """
+    latencies = {"ocr": sum(ocr_seconds) / len(ocr_seconds)}
+    for stage, previous in zip(STAGES[1:], STAGES):
+        spans = [document[stage] - document[previous] for document in events.values()]
+        latencies[stage] = sum(spans) / len(spans)
+    return latencies
+
+def run_benchmark(count, polling_intervals):
+    # Distinct bytes per document, as the stub does not look at the content
+    documents = [f"%PDF-1.7 mock document {index}".encode() for index in range(count)]
+
+    print(f"{'mode':<11} {'poll s':>6} {'wall s':>7} {'docs/min':>9} {'ocr s':>6} {'lang s':>7} {'extract s':>10} "
+          f"{'valid s':>8} {'loop lag ms':>12}")
+    for polling_interval in polling_intervals:
+        analyze.OCR_POLLING_INTERVAL = polling_interval
+        for mode in ("sequential", "pipelined"):
+            wall, lag, events, ocr_seconds = run_async(run_mode(mode, documents))
+            latencies = stage_latencies(events, ocr_seconds)
+            print(f"{mode:<11} {polling_interval:>6.2f} {wall:>7.2f} {count / wall * 60:>9.1f} {latencies['ocr']:>6.2f} "
+                  f"{latencies['language']:>7.3f} {latencies['extraction']:>10.2f} {latencies['validation']:>8.3f} "
+                  f"{lag * 1000:>12.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark sequential and pipelined document analysis on stub services.")
+    parser.add_argument("--documents", type=int, default=8, help="Documents analyzed per run.")
+    parser.add_argument("--ocr-latency", type=float, default=2.2, help="Seconds the stub OCR operation runs.")
+    parser.add_argument("--openai-latency", type=float, default=1.5, help="Seconds the stub chat completion takes.")
+    parser.add_argument("--polling-intervals", type=float, nargs="+", default=[1.0, 0.25],
+                        help="Document Intelligence polling intervals to compare.")
+    args = parser.parse_args()
+
+    # Per-document and per-request logs would drown the table
+    logging.getLogger().setLevel(logging.ERROR)
+    server = start_mock_server(PORT, ocr_latency=args.ocr_latency, openai_latency=args.openai_latency)
+    try:
+        run_benchmark(args.documents, args.polling_intervals)
+    finally:
+        shutdown_runtime()
+        server.should_exit = True
@@ -0,0 +1,245 @@
+"""
+Script: mock_services.py
+
+Purpose:
+A local stand-in for the two services behind document analysis, used to benchmark the phase 1 pipeline offline:
+- Document Intelligence: the analyze operation answers 202 with an Operation-Location, and the operation reports
+  "running" until --ocr-latency seconds have passed, then returns a one-page Hebrew form with its lines, checkboxes
+  and key-value pairs. No Retry-After header is sent, so the client polls at its own polling interval
+  (OCR_POLLING_INTERVAL).
+- Azure OpenAI: chat completions answer after --openai-latency seconds with the fields of that form as JSON (only the
+  requested ones with structured outputs), or with "Hebrew" for language detection prompts. With --malformed, the
+  first answer for the time of injury is badly formatted, to exercise the repair requests.
+
+Usage:
+    python mock_services.py --port 8200 --ocr-latency 2 --openai-latency 1.5
+
+Then point the workers at it:
+    AZURE_OCR_AI_SERVICES_URL=http://127.0.0.1:8200
+    AZURE_OCR_AI_SERVICES_KEY=mock
+    AZURE_OPENAI_SERVICES_URL=http://127.0.0.1:8200
+    AZURE_OPENAI_SERVICES_KEY=mock
+"""
+
+import argparse
+import asyncio
+import json
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+API_VERSION = "2023-07-31"
+
+app = FastAPI(title="Mock Document Intelligence and Azure OpenAI")
+app.state.ocr_latency = 0.0
+app.state.openai_latency = 0.0
+app.state.malformed = False
+app.state.operations = {}
+app.state.request_counts = {"analyze": 0, "poll": 0, "chat": 0}
+
+# Rows of the mock form in reading order; laid out right to left like the Hebrew original
+FORM_ROWS = [
+    "בקשה למתן טיפול רפואי לנפגע עבודה",
+    "שם משפחה כהן שם פרטי ישראל",
+    "ת.ז. 031220015",
+    "מין זכר נקבה",
+    "תאריך לידה 12 05 1980",
+    "כתובת רחוב הרצל מספר בית 15 עיר חיפה מיקוד 3303915",
+    "טלפון נייד 0502345678"
+]
+# Words preceded by a checkbox, and its state
+FORM_CHECKBOXES = {"זכר": "selected", "נקבה": "unselected"}
+FORM_KEY_VALUES = [("שם משפחה", "כהן"), ("שם פרטי", "ישראל"), ("ת.ז.", "031220015"), ("טלפון נייד", "0502345678")]
+
+FORM_FIELDS = {
+    "שם משפחה": "כהן",
+    "שם פרטי": "ישראל",
+    "מספר זהות": "031220015",
+    "מין": "זכר",
+    "תאריך לידה": {"יום": "12", "חודש": "05", "שנה": "1980"},
+    "כתובת": {"רחוב": "הרצל", "מספר בית": "15", "כניסה": "", "דירה": "", "עיר": "חיפה", "מיקוד": "3303915", "תא דואר": ""},
+    "טלפון נייד": "0502345678",
+    "שעת הפגיעה": "09:30"
+}
+
+def fill_schema(schema, values, malformed=False):
+    """
+    Answers a structured-output schema with the values of the mock form.
+
+    Args:
+        schema (dict): JSON schema of the requested object.
+        values (dict): Values of the form by key.
+        malformed (bool): With --malformed, the time of injury is answered as H.MM, so that it fails validation.
+
+    Returns:
+        dict: Every property of the schema, empty where the form has no value.
+    """
+    answer = {}
+    for key, property_schema in schema["properties"].items():
+        value = values.get(key, {} if property_schema["type"] == "object" else "")
+        if property_schema["type"] == "object":
+            answer[key] = fill_schema(property_schema, value if isinstance(value, dict) else {}, malformed)
+        elif malformed and app.state.malformed and key == "שעת הפגיעה":
+            answer[key] = value.replace(":", ".").lstrip("0")
+        else:
+            answer[key] = value
+    return answer
+
+def box_polygon(x0, y0, x1, y1):
+    return [x0, y0, x1, y0, x1, y1, x0, y1]
+
+def analyze_result(model_id):
+    """
+    Returns:
+        dict: A Document Intelligence analyzeResult of a one-page form made of FORM_ROWS, with its lines, checkboxes
+        and key-value pairs.
+    """
+    words, lines, marks = [], [], []
+    offset = 0
+    for row, text in enumerate(FORM_ROWS):
+        y0, y1 = 1.0 + row * 0.4, 1.25 + row * 0.4
+        x = 8.0
+        row_start = offset
+        for word in text.split():
+            if word in FORM_CHECKBOXES:
+                marks.append({"state": FORM_CHECKBOXES[word], "polygon": box_polygon(x - 0.2, y0, x, y1), "confidence": 0.99,
+                              "span": {"offset": offset, "length": 0}})
+                x -= 0.25
+            width = 0.12 * len(word) + 0.1
+            words.append({"content": word, "polygon": box_polygon(x - width, y0, x, y1), "confidence": 0.98,
+                          "span": {"offset": offset, "length": len(word)}})
+            x -= width + 0.15
+            offset += len(word) + 1
+        lines.append({"content": text, "polygon": box_polygon(x, y0, 8.0, y1),
+                      "spans": [{"offset": row_start, "length": len(text)}]})
+    content = "\n".join(FORM_ROWS)
+
+    def element(text):
+        return {"content": text, "spans": [{"offset": content.index(text), "length": len(text)}],
+                "boundingRegions": [{"pageNumber": 1, "polygon": box_polygon(0, 0, 0, 0)}]}
+
+    return {
+        "apiVersion": API_VERSION,
+        "modelId": model_id,
+        "stringIndexType": "textElements",
+        "content": content,
+        "pages": [{
+            "pageNumber": 1,
+            "angle": 0,
+            "width": 8.5,
+            "height": 11,
+            "unit": "inch",
+            "words": words,
+            "lines": lines,
+            "selectionMarks": marks,
+            "spans": [{"offset": 0, "length": len(content)}]
+        }],
+        "keyValuePairs": [
+            {"key": element(key), "value": element(value), "confidence": 0.9} for key, value in FORM_KEY_VALUES
+        ],
+        "languages": [{"locale": "he", "confidence": 0.95, "spans": [{"offset": 0, "length": len(content)}]}]
+    }
+
+@app.post("/formrecognizer/documentModels/{model_id}:analyze")
+async def begin_analyze(model_id: str, request: Request):
+    app.state.request_counts["analyze"] += 1
+    await request.body()
+
+    operation_id = str(uuid.uuid4())
+    app.state.operations[operation_id] = (model_id, time.monotonic())
+    location = f"{request.base_url}formrecognizer/documentModels/{model_id}/analyzeResults/{operation_id}?api-version={API_VERSION}"
+    return Response(status_code=202, headers={"Operation-Location": location, "apim-request-id": operation_id})
+
+@app.get("/formrecognizer/documentModels/{model_id}/analyzeResults/{operation_id}")
+async def analyze_status(model_id: str, operation_id: str):
+    app.state.request_counts["poll"] += 1
+    if operation_id not in app.state.operations:
+        return JSONResponse(status_code=404, content={"error": {"code": "NotFound", "message": "Unknown operation."}})
+
+    _, started = app.state.operations[operation_id]
+    now = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    if time.monotonic() - started < app.state.ocr_latency:
+        return {"status": "running", "createdDateTime": now, "lastUpdatedDateTime": now}
+
+    return {
+        "status": "succeeded",
+        "createdDateTime": now,
+        "lastUpdatedDateTime": now,
+        "analyzeResult": analyze_result(model_id)
+    }
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    app.state.request_counts["chat"] += 1
+    body = await request.json()
+
+    await asyncio.sleep(app.state.openai_latency)
+
+    prompt = body["messages"][-1]["content"]
+    response_format = body.get("response_format") or {}
+    if "Detect the primary language" in prompt:
+        answer = "Hebrew"
+    elif response_format.get("type") == "json_schema":
+        # Fill exactly the requested fields, like structured outputs
+        schema = response_format["json_schema"]["schema"]
+        answer = json.dumps(fill_schema(schema, FORM_FIELDS, malformed="rejected" not in prompt), ensure_ascii=False)
+    else:
+        answer = json.dumps(FORM_FIELDS, ensure_ascii=False)
+
+    prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+    completion_tokens = len(answer) // 4
+    return {
+        "id": f"chatcmpl-mock-{app.state.request_counts['chat']}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": answer}}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens
+        }
+    }
+
+def start_mock_server(port=8200, ocr_latency=0.0, openai_latency=0.0, malformed=False):
+    """
+    Starts the mock server on a background thread and waits until it accepts requests.
+
+    Args:
+        port (int): Local port to listen on.
+        ocr_latency (float): Seconds an analyze operation stays running.
+        openai_latency (float): Seconds of artificial delay added to every chat completion.
+        malformed (bool): Whether first answers carry a badly formatted time of injury.
+
+    Returns:
+        uvicorn.Server: The running server; set `should_exit = True` to stop it.
+    """
+    app.state.ocr_latency = ocr_latency
+    app.state.openai_latency = openai_latency
+    app.state.malformed = malformed
+    app.state.operations = {}
+    app.state.request_counts = {"analyze": 0, "poll": 0, "chat": 0}
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock Document Intelligence and Azure OpenAI for offline benchmarks.")
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--ocr-latency", type=float, default=0.0, help="Seconds an analyze operation stays running.")
+    parser.add_argument("--openai-latency", type=float, default=0.0, help="Seconds added to every chat completion.")
+    parser.add_argument("--malformed", action="store_true", help="Answer the time of injury badly formatted at first.")
+    args = parser.parse_args()
+
+    app.state.ocr_latency = args.ocr_latency
+    app.state.openai_latency = args.openai_latency
+    app.state.malformed = args.malformed
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
@@ -0,0 +1,185 @@
+"""
+Module: field_rules.py
+
+Purpose:
+Deterministic extraction of the structured fields of the National Insurance (ביטוח לאומי) form 283 from the OCR
+layout, run before the LLM so that only the remaining free-text fields are sent to Azure OpenAI.
+
+Each rule names the printed labels of a field and a parser that accepts a value only if it is well formed:
+- ID number: 9 digits with a valid check digit;
+- mobile and landline phones: Israeli numbers, +972 prefixes normalized;
+- dates: day, month and year (separated, or 8 digits written in boxes) forming a real date;
+- time of injury: HH:MM;
+- postal code: 7 digits;
+- names: letters only, and only from a key-value pair found by Document Intelligence.
+
+Values are looked up first in the key-value pairs whose key contains a label, then in the text following a label on
+the same OCR line. A value is only used if its key-value pair, or the words of its line, have an OCR confidence of at
+least RULE_MIN_CONFIDENCE.
+
+Configuration (environment variables):
+- RULE_MIN_CONFIDENCE: minimum OCR confidence of a value read by the rules (default 0.8)
+"""
+
+import os
+import re
+from datetime import date
+
+import numpy as np
+from form_schema import translate_path
+
+RULE_MIN_CONFIDENCE = float(os.getenv("RULE_MIN_CONFIDENCE", "0.8"))
+
+# Numbers, possibly split by spaces, hyphens, dots or slashes
+DIGIT_SEGMENT = re.compile(r"\d[\d\s\-./]*\d|\d")
+MAX_GROUPS = 10
+
+def normalize_label(text):
+    return re.sub(r"\s+", " ", text.replace(":", " ")).strip()
+
+def digit_runs(text):
+    """
+    Candidate numbers of a text. Separators inside a group of digits ("050-2345678") are dropped; groups separated
+    by spaces are also joined, since forms are often filled in digit by digit in boxes ("0 3 1 2 ...").
+
+    Returns:
+        list[str]: Every run of up to MAX_GROUPS adjacent digit groups, joined, in order of position.
+    """
+    runs = []
+    for match in DIGIT_SEGMENT.finditer(text):
+        groups = [re.sub(r"\D", "", group) for group in match.group().split()]
+        for start in range(len(groups)):
+            for end in range(min(len(groups), start + MAX_GROUPS), start, -1):
+                runs.append("".join(groups[start:end]))
+    return list(dict.fromkeys(runs))
+
+def valid_id_number(number):
+    """
+    Args:
+        number (str): 9 digits.
+
+    Returns:
+        bool: Whether the last digit is the check digit of an Israeli ID number.
+    """
+    total = 0
+    for index, digit in enumerate(number):
+        product = int(digit) * (1 if index % 2 == 0 else 2)
+        total += product - 9 if product > 9 else product
+    return total % 10 == 0
+
+def parse_id_number(text):
+    for run in digit_runs(text):
+        if len(run) == 9 and valid_id_number(run):
+            return run
+    return None
+
+def parse_phone(text, pattern):
+    for number in digit_runs(text):
+        if number.startswith("972"):
+            number = "0" + number[3:]
+        if re.fullmatch(pattern, number):
+            return number
+    return None
+
+def parse_mobile_phone(text):
+    return parse_phone(text, r"05\d{8}")
+
+def parse_landline_phone(text):
+    return parse_phone(text, r"0(?:[23489]\d{7}|7\d{8})")
+
+def parse_date(text):
+    """
+    Returns:
+        tuple or None: (day, month, year) as zero-padded strings, or None if the text holds no valid date.
+    """
+    candidates = [match.groups() for match in re.finditer(r"(?<!\d)(\d{1,2})\s*[./\-\s]\s*(\d{1,2})\s*[./\-\s]\s*(\d{4})(?!\d)", text)]
+    # Dates written digit by digit in boxes
+    candidates += [(run[:2], run[2:4], run[4:]) for run in digit_runs(text) if len(run) == 8]
+
+    for day, month, year in candidates:
+        try:
+            date(int(year), int(month), int(day))
+        except ValueError:
+            continue
+        if 1900 <= int(year) <= 2100:
+            return (day.zfill(2), month.zfill(2), year)
+    return None
+
+def parse_time(text):
+    match = re.search(r"(?<!\d)([01]?\d|2[0-3])\s*:\s*([0-5]\d)(?!\d)", text)
+    return f"{int(match.group(1)):02d}:{match.group(2)}" if match else None
+
+def parse_postal_code(text):
+    return next((run for run in digit_runs(text) if len(run) == 7), None)
+
+def parse_name(text):
+    name = normalize_label(text)
+    return name if name and len(name) <= 30 and re.fullmatch(r"[^\W\d_]+(?:[ '\-][^\W\d_]+)*", name) else None
+
+# (field path in the English schema of form_schema.py, printed labels, parser, whether the value may be read from a
+# text line)
+FIELD_RULES = [
+    (("idNumber",), ("מספר זהות", "ת.ז.", "ת.ז", "תעודת זהות", "ID number", "Identity number"), parse_id_number, True),
+    (("lastName",), ("שם משפחה", "Last name", "Family name"), parse_name, False),
+    (("firstName",), ("שם פרטי", "First name"), parse_name, False),
+    (("dateOfBirth",), ("תאריך לידה", "Date of birth"), parse_date, True),
+    (("mobilePhone",), ("טלפון נייד", "Mobile phone", "Mobile"), parse_mobile_phone, True),
+    (("landlinePhone",), ("טלפון קווי", "Landline phone", "Landline"), parse_landline_phone, True),
+    (("address", "postalCode"), ("מיקוד", "Postal code", "Zip code"), parse_postal_code, True),
+    (("dateOfInjury",), ("תאריך הפגיעה", "Date of injury"), parse_date, True),
+    (("timeOfInjury",), ("שעת הפגיעה", "Time of injury"), parse_time, True),
+    (("formFillingDate",), ("תאריך מילוי הטופס", "Date of filling"), parse_date, True),
+    (("formReceiptDateAtClinic",), ("תאריך קבלת הטופס בקופה", "Date received at clinic"), parse_date, True)
+]
+
+def line_confidences(layout):
+    """
+    Returns:
+        np.ndarray: Mean OCR confidence of the words of each line (0 for lines without words).
+    """
+    valid = layout.word_line >= 0
+    counts = np.bincount(layout.word_line[valid], minlength=len(layout.lines))
+    sums = np.bincount(layout.word_line[valid], weights=layout.word_confidence[valid], minlength=len(layout.lines))
+    return np.divide(sums, counts, out=np.zeros(len(layout.lines)), where=counts > 0)
+
+def find_in_pairs(layout, labels, parser):
+    for pair in layout.key_value_pairs:
+        key = normalize_label(pair["key"])
+        if pair["confidence"] >= RULE_MIN_CONFIDENCE and any(label in key for label in labels):
+            value = parser(pair["value"])
+            if value is not None:
+                return value
+    return None
+
+def find_in_lines(layout, labels, parser, confidences):
+    for line, confidence in zip(layout.lines, confidences):
+        if confidence < RULE_MIN_CONFIDENCE:
+            continue
+        for label in labels:
+            position = line.find(label)
+            if position >= 0:
+                value = parser(line[position + len(label):])
+                if value is not None:
+                    return value
+    return None
+
+def extract_fields_by_rules(layout, language):
+    """
+    Reads the well-formed fields of the form from its layout.
+
+    Args:
+        layout (DocumentLayout): OCR output returned by run_ocr.
+        language (str): Document language, 'Hebrew' or 'English'; selects the schema paths of the result.
+
+    Returns:
+        dict: Schema path (tuple of keys) -> value; a str, or a (day, month, year) tuple for dates.
+    """
+    confidences = line_confidences(layout)
+    fields = {}
+    for path, labels, parser, from_lines in FIELD_RULES:
+        value = find_in_pairs(layout, labels, parser)
+        if value is None and from_lines:
+            value = find_in_lines(layout, labels, parser, confidences)
+        if value is not None:
+            fields[translate_path(path, language)] = value
+    return fields
@@ -0,0 +1,155 @@
+"""
+Module: form_schema.py
+
+Purpose:
+Single definition of the fields extracted from form 283, from which everything language-specific is generated:
+- `build_schema(language)`: the nested dict of empty strings with the Hebrew or English keys, i.e. the shape of the
+  extraction result;
+- `response_format(schema, language)`: the structured-output JSON schema sent with the Azure OpenAI request, with a
+  description of the expected format of each constrained field;
+- `invalid_fields(answer, schema, language)`: the fields of a model answer that are missing or malformed, which are
+  then re-asked on their own;
+- `translate_path(path, language)`: the key path of a field in the schema of a language, from its English path.
+
+Each field has an English key, a Hebrew key and optionally a pattern its (non-empty) value must match in full, or
+nested fields.
+"""
+
+import re
+
+LANGUAGES = ("Hebrew", "English")
+
+DATE_FIELDS = [
+    {"en": "day", "he": "יום", "pattern": r"\d{2}", "description": "Two digits, e.g. 05"},
+    {"en": "month", "he": "חודש", "pattern": r"\d{2}", "description": "Two digits, e.g. 09"},
+    {"en": "year", "he": "שנה", "pattern": r"\d{4}", "description": "Four digits"}
+]
+
+FORM_FIELDS = [
+    {"en": "lastName", "he": "שם משפחה"},
+    {"en": "firstName", "he": "שם פרטי"},
+    {"en": "idNumber", "he": "מספר זהות", "pattern": r"\d{9}", "description": "9 digits, no separators"},
+    {"en": "gender", "he": "מין"},
+    {"en": "dateOfBirth", "he": "תאריך לידה", "fields": DATE_FIELDS},
+    {"en": "address", "he": "כתובת", "fields": [
+        {"en": "street", "he": "רחוב"},
+        {"en": "houseNumber", "he": "מספר בית"},
+        {"en": "entrance", "he": "כניסה"},
+        {"en": "apartment", "he": "דירה"},
+        {"en": "city", "he": "עיר"},
+        {"en": "postalCode", "he": "מיקוד", "pattern": r"\d{7}", "description": "7 digits"},
+        {"en": "poBox", "he": "תא דואר"}
+    ]},
+    {"en": "landlinePhone", "he": "טלפון קווי", "pattern": r"0\d{8,9}", "description": "Digits only, starting with 0"},
+    {"en": "mobilePhone", "he": "טלפון נייד", "pattern": r"05\d{8}", "description": "10 digits starting with 05"},
+    {"en": "jobType", "he": "סוג העבודה"},
+    {"en": "dateOfInjury", "he": "תאריך הפגיעה", "fields": DATE_FIELDS},
+    {"en": "timeOfInjury", "he": "שעת הפגיעה", "pattern": r"\d{2}:\d{2}", "description": "HH:MM, 24-hour clock"},
+    {"en": "accidentLocation", "he": "מיקום התאונה"},
+    {"en": "accidentAddress", "he": "כתובת מקום התאונה"},
+    {"en": "accidentDescription", "he": "תיאור התאונה"},
+    {"en": "injuredBodyPart", "he": "האיבר שנפגע"},
+    {"en": "signature", "he": "חתימה"},
+    {"en": "formFillingDate", "he": "תאריך מילוי הטופס", "fields": DATE_FIELDS},
+    {"en": "formReceiptDateAtClinic", "he": "תאריך קבלת הטופס בקופה", "fields": DATE_FIELDS},
+    {"en": "medicalInstitutionFields", "he": "למילוי ע\"י המוסד הרפואי", "fields": [
+        {"en": "healthFundMember", "he": "חבר בקופת חולים"},
+        {"en": "natureOfAccident", "he": "מהות התאונה"},
+        {"en": "medicalDiagnoses", "he": "אבחנות רפואיות"}
+    ]}
+]
+
+def key_of(field, language):
+    return field["he"] if language == "Hebrew" else field["en"]
+
+def build_schema(language, fields=FORM_FIELDS):
+    """
+    Returns:
+        dict: The extraction schema of the language: field key -> "" or a nested schema.
+    """
+    return {key_of(field, language): build_schema(language, field["fields"]) if "fields" in field else "" for field in fields}
+
+def field_specs(language, fields=FORM_FIELDS, prefix=()):
+    """
+    Returns:
+        dict: Key path in the language's schema -> definition of each leaf field.
+    """
+    specs = {}
+    for field in fields:
+        path = prefix + (key_of(field, language),)
+        specs.update(field_specs(language, field["fields"], path) if "fields" in field else {path: field})
+    return specs
+
+def translate_path(path, language):
+    """
+    Args:
+        path (tuple): Key path of a field in the English schema.
+        language (str): 'Hebrew' or 'English'.
+
+    Returns:
+        tuple: Key path of the same field in the language's schema.
+    """
+    translated, fields = (), FORM_FIELDS
+    for key in path:
+        field = next(field for field in fields if field["en"] == key)
+        translated += (key_of(field, language),)
+        fields = field.get("fields", [])
+    return translated
+
+def response_format(schema, language):
+    """
+    Builds the structured-output response format requesting exactly the fields of a schema.
+
+    Args:
+        schema (dict): Extraction schema, or the part of it still to be extracted.
+        language (str): Language of the schema's keys.
+
+    Returns:
+        dict: `response_format` argument of a chat completion.
+    """
+    specs = field_specs(language)
+
+    def object_schema(node, prefix):
+        properties = {}
+        for key, value in node.items():
+            path = prefix + (key,)
+            if isinstance(value, dict):
+                properties[key] = object_schema(value, path)
+            else:
+                description = specs.get(path, {}).get("description")
+                properties[key] = {"type": "string", **({"description": f"{description}, or empty"} if description else {})}
+        return {"type": "object", "properties": properties, "required": list(node), "additionalProperties": False}
+
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": "form_fields", "strict": True, "schema": object_schema(schema, ())}
+    }
+
+def invalid_fields(answer, schema, language):
+    """
+    Validates a model answer against the schema it was asked to fill.
+
+    Args:
+        answer (dict): Parsed model answer.
+        schema (dict): Schema of the request.
+        language (str): Language of the schema's keys.
+
+    Returns:
+        dict: Key path -> reason, for every leaf field that is missing, not a string or does not match its pattern.
+    """
+    specs = field_specs(language)
+    invalid = {}
+
+    def check(node, value, prefix):
+        for key, expected in node.items():
+            path = prefix + (key,)
+            given = value.get(key) if isinstance(value, dict) else None
+            if isinstance(expected, dict):
+                check(expected, given, path)
+            elif not isinstance(given, str):
+                invalid[path] = "missing" if given is None else "not a string"
+            elif given.strip() and specs.get(path, {}).get("pattern") and not re.fullmatch(specs[path]["pattern"], given.strip()):
+                invalid[path] = f"'{given}' is not in the expected format ({specs[path]['description']})"
+
+    check(schema, answer, ())
+    return invalid
@@ -0,0 +1,85 @@
+"""
+Module: language.py
+
+Purpose:
+Local language detection of OCR output, replacing the Azure OpenAI round trip that used to classify every document.
+
+The language is decided from two signals:
+- the share of Hebrew letters among the Hebrew and Latin letters of the OCR words (digits and punctuation are ignored);
+- when Document Intelligence returns language hints (the `languages` analysis feature), the share of text it
+  attributes to Hebrew or English locales, weighted by span length and confidence.
+
+The detection confidence is the winning language's share, averaged over the available signals. Documents whose
+confidence is below LANGUAGE_CONFIDENCE_THRESHOLD, typically Hebrew forms filled in with English, or documents with
+no letters at all, are left to the LLM fallback in analyze.py.
+
+Configuration (environment variables):
+- LANGUAGE_CONFIDENCE_THRESHOLD: minimum confidence to accept the local decision (default 0.75)
+"""
+
+import os
+
+LANGUAGE_CONFIDENCE_THRESHOLD = float(os.getenv("LANGUAGE_CONFIDENCE_THRESHOLD", "0.75"))
+
+LANGUAGES = ("Hebrew", "English")
+HEBREW_LETTERS = ("א", "ת")
+LOCALE_LANGUAGES = {"he": "Hebrew", "iw": "Hebrew", "en": "English"}
+
+def script_shares(words):
+    """
+    Args:
+        words (iterable[str]): OCR words.
+
+    Returns:
+        dict or None: Language -> share of its letters among Hebrew and Latin letters, or None if there are none.
+    """
+    hebrew = latin = 0
+    for word in words:
+        for char in word:
+            if HEBREW_LETTERS[0] <= char <= HEBREW_LETTERS[1]:
+                hebrew += 1
+            elif char.isascii() and char.isalpha():
+                latin += 1
+
+    total = hebrew + latin
+    if total == 0:
+        return None
+    return {"Hebrew": hebrew / total, "English": latin / total}
+
+def hint_shares(language_hints):
+    """
+    Args:
+        language_hints (list[dict]): Document Intelligence languages as {"locale", "confidence", "length"}.
+
+    Returns:
+        dict or None: Language -> confidence-weighted share of the hinted text, or None without Hebrew or English hints.
+    """
+    weights = {language: 0.0 for language in LANGUAGES}
+    for hint in language_hints or []:
+        language = LOCALE_LANGUAGES.get(hint["locale"].split("-")[0].lower())
+        if language is not None:
+            weights[language] += hint["length"] * hint["confidence"]
+
+    total = sum(weights.values())
+    if total == 0:
+        return None
+    return {language: weight / total for language, weight in weights.items()}
+
+def detect_language_locally(words, language_hints=None):
+    """
+    Detects whether OCR output is Hebrew or English without calling a model.
+
+    Args:
+        words (iterable[str]): OCR words.
+        language_hints (list[dict], optional): Document Intelligence language hints, see hint_shares.
+
+    Returns:
+        tuple: (language, confidence), where language is "Hebrew", "English" or None when there is no signal.
+    """
+    signals = [shares for shares in (script_shares(words), hint_shares(language_hints)) if shares is not None]
+    if not signals:
+        return None, 0.0
+
+    combined = {language: sum(shares[language] for shares in signals) / len(signals) for language in LANGUAGES}
+    language = max(LANGUAGES, key=combined.get)
+    return language, round(combined[language], 3)
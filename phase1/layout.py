@@ -0,0 +1,309 @@
+"""
+Module: layout.py
+
+Purpose:
+Compact, layout-aware representation of Document Intelligence output, used by field extraction instead of per-word
+dict lists and one space-joined string.
+
+`build_layout` reads an AnalyzeResult in a single pass over its pages and keeps:
+- words: texts in a list, with confidences, pages, bounding boxes (x0, y0, x1, y1 in page units) and line indices in
+  NumPy arrays;
+- lines: texts, pages and bounding boxes;
+- key-value pairs found by the `prebuilt-document` model;
+- checkboxes: the selection marks with their state and a label read from the words next to them on the same row
+  (to the left of the mark in right-to-left documents). Checkboxes the model reported as the value of a key-value pair
+  take that key as their label instead.
+
+`prompt_text` renders the layout for the LLM: key-value pairs, checkboxes, then only the lines that are not already
+covered by a key-value pair, so the prompt is shorter than the full OCR text. `selected_option` answers checkbox
+fields such as gender or health fund directly from the selection marks.
+
+Layouts are passed between Celery tasks and cached as JSON with `to_dict` / `DocumentLayout.from_dict`, which store
+each array as one list.
+"""
+
+import re
+import numpy as np
+from language import script_shares
+
+SELECTION_TOKENS = (":selected:", ":unselected:")
+# Words further from a checkbox (or from the previous label word) than this many checkbox heights end its label
+LABEL_MAX_GAP = 2.0
+LABEL_MAX_WORDS = 6
+
+def polygon_box(polygon):
+    """
+    Args:
+        polygon (list[Point]): Document Intelligence polygon.
+
+    Returns:
+        tuple: (x0, y0, x1, y1) bounding box of the polygon, zeros when there is none.
+    """
+    if not polygon:
+        return (0.0, 0.0, 0.0, 0.0)
+    xs = [point.x for point in polygon]
+    ys = [point.y for point in polygon]
+    return (min(xs), min(ys), max(xs), max(ys))
+
+def span_index(offsets, starts, ends):
+    """
+    Args:
+        offsets (np.ndarray): Content offsets to locate.
+        starts (np.ndarray): Sorted start offsets of non-overlapping spans.
+        ends (np.ndarray): End offsets (exclusive) of the same spans.
+
+    Returns:
+        np.ndarray: Index of the span containing each offset, -1 where none does.
+    """
+    if len(starts) == 0:
+        return np.full(len(offsets), -1, dtype=np.int32)
+    index = np.searchsorted(starts, offsets, side="right") - 1
+    inside = (index >= 0) & (offsets < ends[np.maximum(index, 0)])
+    return np.where(inside, index, -1).astype(np.int32)
+
+def label_selection_marks(layout, right_to_left):
+    """
+    Labels each selection mark with the words following it on its row, in reading direction.
+
+    Args:
+        layout (DocumentLayout): Layout whose words and marks are already set.
+        right_to_left (bool): Whether labels are read leftwards from the marks (Hebrew forms).
+
+    Returns:
+        list[str]: One label per selection mark, empty when no word is close enough.
+    """
+    word_boxes, mark_boxes = layout.word_boxes, layout.mark_boxes
+    word_middle = (word_boxes[:, 1] + word_boxes[:, 3]) / 2
+    labels = []
+
+    for page, box in zip(layout.mark_page, mark_boxes):
+        height = max(box[3] - box[1], 1e-6)
+        same_row = (layout.word_page == page) & (word_middle >= box[1] - height / 2) & (word_middle <= box[3] + height / 2)
+        other_marks = (layout.mark_page == page) & (np.abs((mark_boxes[:, 1] + mark_boxes[:, 3]) / 2 - (box[1] + box[3]) / 2) < height)
+
+        if right_to_left:
+            candidates = np.flatnonzero(same_row & (word_boxes[:, 2] <= box[0] + height / 2))
+            candidates = candidates[np.argsort(-word_boxes[candidates, 2], kind="stable")]
+            # The next checkbox on the row starts the next option's label
+            bounds = mark_boxes[other_marks & (mark_boxes[:, 2] < box[0]), 2]
+            limit = bounds.max() if len(bounds) else -np.inf
+        else:
+            candidates = np.flatnonzero(same_row & (word_boxes[:, 0] >= box[2] - height / 2))
+            candidates = candidates[np.argsort(word_boxes[candidates, 0], kind="stable")]
+            bounds = mark_boxes[other_marks & (mark_boxes[:, 0] > box[2]), 0]
+            limit = bounds.min() if len(bounds) else np.inf
+
+        label, edge = [], box[0] if right_to_left else box[2]
+        for index in candidates[:LABEL_MAX_WORDS]:
+            near, far = (word_boxes[index, 2], word_boxes[index, 0]) if right_to_left else (word_boxes[index, 0], word_boxes[index, 2])
+            beyond_limit = far < limit if right_to_left else far > limit
+            if abs(edge - near) > LABEL_MAX_GAP * height or beyond_limit:
+                break
+            label.append(layout.words[index])
+            edge = far
+        labels.append(" ".join(label))
+
+    return labels
+
+class DocumentLayout:
+    """
+    Pages, lines, words, key-value pairs and checkboxes of one analyzed document. Word and line i are described by
+    row i of the arrays of the same prefix.
+    """
+
+    def __init__(self, page_count=0, words=None, word_confidence=None, word_page=None, word_boxes=None,
+                 word_line=None, word_in_pair=None, lines=None, line_page=None, line_boxes=None, marks_selected=None,
+                 mark_confidence=None, mark_page=None, mark_boxes=None, mark_labels=None, key_value_pairs=None,
+                 languages=None):
+        self.page_count = page_count
+        self.words = words or []
+        self.word_confidence = np.asarray(word_confidence if word_confidence is not None else [], dtype=np.float32)
+        self.word_page = np.asarray(word_page if word_page is not None else [], dtype=np.int16)
+        self.word_boxes = np.asarray(word_boxes if word_boxes is not None else [], dtype=np.float32).reshape(-1, 4)
+        self.word_line = np.asarray(word_line if word_line is not None else [], dtype=np.int32)
+        self.word_in_pair = np.asarray(word_in_pair if word_in_pair is not None else [], dtype=bool)
+        self.lines = lines or []
+        self.line_page = np.asarray(line_page if line_page is not None else [], dtype=np.int16)
+        self.line_boxes = np.asarray(line_boxes if line_boxes is not None else [], dtype=np.float32).reshape(-1, 4)
+        self.marks_selected = np.asarray(marks_selected if marks_selected is not None else [], dtype=bool)
+        self.mark_confidence = np.asarray(mark_confidence if mark_confidence is not None else [], dtype=np.float32)
+        self.mark_page = np.asarray(mark_page if mark_page is not None else [], dtype=np.int16)
+        self.mark_boxes = np.asarray(mark_boxes if mark_boxes is not None else [], dtype=np.float32).reshape(-1, 4)
+        self.mark_labels = mark_labels or []
+        self.key_value_pairs = key_value_pairs or []
+        self.languages = languages or []
+
+    def __len__(self):
+        return len(self.words)
+
+    @property
+    def text(self):
+        """
+        Returns:
+            str: The document text, one OCR line per line (the words joined by spaces if there are no lines).
+        """
+        return "\n".join(self.lines) if self.lines else " ".join(self.words)
+
+    @property
+    def checkboxes(self):
+        """
+        Returns:
+            list[dict]: {"label": str, "selected": bool, "confidence": float} for each selection mark.
+        """
+        return [
+            {"label": label, "selected": bool(selected), "confidence": round(float(confidence), 3)}
+            for label, selected, confidence in zip(self.mark_labels, self.marks_selected, self.mark_confidence)
+        ]
+
+    def selected_option(self, options):
+        """
+        Reads a single-choice checkbox field.
+
+        Args:
+            options (iterable[str]): Printed labels of the field's options.
+
+        Returns:
+            str or None: The option whose checkbox is selected, or None if none or several of them are.
+        """
+        selected = {
+            option for option in options
+            for label, is_selected in zip(self.mark_labels, self.marks_selected)
+            if is_selected and option in label
+        }
+        return selected.pop() if len(selected) == 1 else None
+
+    def prompt_text(self):
+        """
+        Returns:
+            str: The layout rendered for the LLM: key-value pairs, checkboxes, then the lines not covered by a pair.
+        """
+        # A line is left out when every one of its words belongs to a key-value pair
+        words_per_line = np.bincount(self.word_line[self.word_line >= 0], minlength=len(self.lines))
+        paired_per_line = np.bincount(
+            self.word_line[(self.word_line >= 0) & self.word_in_pair], minlength=len(self.lines)
+        )
+        covered = (words_per_line > 0) & (paired_per_line == words_per_line)
+
+        sections = []
+        if self.key_value_pairs:
+            sections.append("Key-value pairs:\n" + "\n".join(f"{pair['key']}: {pair['value']}" for pair in self.key_value_pairs))
+        if self.mark_labels:
+            sections.append("Checkboxes:\n" + "\n".join(
+                f"[{'x' if box['selected'] else ' '}] {box['label']}" for box in self.checkboxes if box["label"]
+            ))
+
+        lines = [re.sub(r":(un)?selected:", "", line).strip() for line, skip in zip(self.lines, covered) if not skip]
+        if not self.lines:
+            lines = [" ".join(self.words)]
+        sections.append("Text:\n" + "\n".join(line for line in lines if line))
+        return "\n\n".join(sections)
+
+    def to_dict(self):
+        return {
+            "page_count": self.page_count,
+            "words": self.words,
+            "word_confidence": np.round(self.word_confidence.astype(np.float64), 3).tolist(),
+            "word_page": self.word_page.tolist(),
+            "word_boxes": np.round(self.word_boxes.astype(np.float64), 4).tolist(),
+            "word_line": self.word_line.tolist(),
+            "word_in_pair": self.word_in_pair.tolist(),
+            "lines": self.lines,
+            "line_page": self.line_page.tolist(),
+            "line_boxes": np.round(self.line_boxes.astype(np.float64), 4).tolist(),
+            "marks_selected": self.marks_selected.tolist(),
+            "mark_confidence": np.round(self.mark_confidence.astype(np.float64), 3).tolist(),
+            "mark_page": self.mark_page.tolist(),
+            "mark_boxes": np.round(self.mark_boxes.astype(np.float64), 4).tolist(),
+            "mark_labels": self.mark_labels,
+            "key_value_pairs": self.key_value_pairs,
+            "languages": self.languages
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+def build_layout(result):
+    """
+    Builds the layout of a document from its Document Intelligence result, in a single pass over its pages.
+
+    Args:
+        result (AnalyzeResult): Result of the `prebuilt-document` model (or any model returning pages).
+
+    Returns:
+        DocumentLayout: The document layout.
+    """
+    words, word_confidence, word_page, word_boxes, word_offsets = [], [], [], [], []
+    lines, line_page, line_boxes, line_spans = [], [], [], []
+    marks_selected, mark_confidence, mark_page, mark_boxes = [], [], [], []
+
+    for page in result.pages:
+        for word in page.words or []:
+            words.append(word.content)
+            word_confidence.append(word.confidence)
+            word_page.append(page.page_number)
+            word_boxes.append(polygon_box(word.polygon))
+            word_offsets.append(word.span.offset)
+        for line in page.lines or []:
+            line_spans.extend((span.offset, span.offset + span.length, len(lines)) for span in line.spans)
+            lines.append(line.content)
+            line_page.append(page.page_number)
+            line_boxes.append(polygon_box(line.polygon))
+        for mark in page.selection_marks or []:
+            marks_selected.append(mark.state == "selected")
+            mark_confidence.append(mark.confidence)
+            mark_page.append(page.page_number)
+            mark_boxes.append(polygon_box(mark.polygon))
+
+    word_offsets = np.asarray(word_offsets, dtype=np.int64)
+    line_spans = np.asarray(sorted(line_spans), dtype=np.int64).reshape(-1, 3)
+    word_line = span_index(word_offsets, line_spans[:, 0], line_spans[:, 1])
+    word_line = np.where(word_line >= 0, line_spans[np.maximum(word_line, 0), 2], -1)
+
+    pairs, pair_spans, checkbox_keys = [], [], []
+    for pair in result.key_value_pairs or []:
+        value = pair.value.content if pair.value is not None else ""
+        if value in SELECTION_TOKENS:
+            # A checkbox whose label the model already read; matched to its selection mark below
+            region = pair.value.bounding_regions[0] if pair.value.bounding_regions else None
+            if region is not None:
+                checkbox_keys.append((region.page_number, polygon_box(region.polygon), pair.key.content))
+            continue
+        pairs.append({"key": pair.key.content, "value": value, "confidence": round(pair.confidence or 0.0, 3)})
+        for element in (pair.key, pair.value):
+            if element is not None:
+                pair_spans.extend((span.offset, span.offset + span.length) for span in element.spans)
+    pair_spans = np.asarray(sorted(pair_spans), dtype=np.int64).reshape(-1, 2)
+
+    layout = DocumentLayout(
+        page_count=len(result.pages),
+        words=words,
+        word_confidence=word_confidence,
+        word_page=word_page,
+        word_boxes=word_boxes,
+        word_line=word_line,
+        word_in_pair=span_index(word_offsets, pair_spans[:, 0], pair_spans[:, 1]) >= 0,
+        lines=lines,
+        line_page=line_page,
+        line_boxes=line_boxes,
+        marks_selected=marks_selected,
+        mark_confidence=mark_confidence,
+        mark_page=mark_page,
+        mark_boxes=mark_boxes,
+        key_value_pairs=pairs,
+        languages=[
+            {"locale": language.locale, "confidence": language.confidence,
+             "length": sum(span.length for span in language.spans)}
+            for language in result.languages or []
+        ]
+    )
+
+    shares = script_shares(words)
+    layout.mark_labels = label_selection_marks(layout, right_to_left=shares is not None and shares["Hebrew"] >= 0.5)
+    for page_number, box, key in checkbox_keys:
+        centre = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+        on_page = np.flatnonzero(layout.mark_page == page_number)
+        if len(on_page):
+            centres = (layout.mark_boxes[on_page, :2] + layout.mark_boxes[on_page, 2:]) / 2
+            layout.mark_labels[on_page[np.argmin(np.linalg.norm(centres - centre, axis=1))]] = key
+    return layout
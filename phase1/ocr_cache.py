@@ -0,0 +1,222 @@
+"""
+Module: ocr_cache.py
+
+Purpose:
+Content-addressed cache of Document Intelligence results. OCR is the slowest and most expensive stage of the
+analysis, and the same file is often analyzed again: re-uploads, retries after an Azure OpenAI failure, re-validation
+and prompt iterations. Results are keyed by the OCR model (including its analysis features) and the SHA-256 of the
+file bytes, so a file is only sent to Document Intelligence once while its result stays cached.
+
+Entries are the AnalyzeResult as a dict (`AnalyzeResult.to_dict()`), so everything the service returned is
+available when the result is read back with `AnalyzeResult.from_dict()`.
+
+Two stores are available, both bounded by total size and evicting the least recently used results:
+- DiskOCRCache: gzip-compressed JSON files under OCR_CACHE_DIR, with file modification times as the LRU order.
+  Shared by the worker processes of one host.
+- RedisOCRCache: compressed entries in Redis, with a sorted set of last access times and a hash of entry sizes.
+  Shared by all workers.
+
+Configuration (environment variables):
+- OCR_CACHE_BACKEND: "disk" (default), "redis" or "none"
+- OCR_CACHE_DIR: directory of the disk store (default phase1/ocr_cache)
+- OCR_CACHE_REDIS_URL: connection URL for the Redis store (default redis://localhost:6379/3)
+- OCR_CACHE_MAX_MB: total size of the cached results, compressed (default 512)
+"""
+
+import os
+import gzip
+import hashlib
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+OCR_CACHE_BACKEND = os.getenv("OCR_CACHE_BACKEND", "disk")
+OCR_CACHE_DIR = os.getenv("OCR_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "ocr_cache"))
+OCR_CACHE_REDIS_URL = os.getenv("OCR_CACHE_REDIS_URL", "redis://localhost:6379/3")
+OCR_CACHE_MAX_MB = float(os.getenv("OCR_CACHE_MAX_MB", "512"))
+
+def ocr_cache_key(file_bytes, model_id, features=None):
+    """
+    Args:
+        file_bytes (bytes): Byte content of the document.
+        model_id (str): Document Intelligence model id.
+        features (list, optional): Analysis features requested with the model.
+
+    Returns:
+        str: Cache key, a SHA-256 hex digest of the model, its features and the file content.
+    """
+    model = "+".join([model_id, *sorted(str(getattr(feature, "value", feature)) for feature in features or [])])
+    digest = hashlib.sha256(file_bytes).hexdigest()
+    return hashlib.sha256(f"{model}:{digest}".encode("utf-8")).hexdigest()
+
+def encode_entry(result):
+    return gzip.compress(json.dumps(result, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+
+def decode_entry(data):
+    return json.loads(gzip.decompress(data).decode("utf-8"))
+
+class DiskOCRCache:
+    """
+    One `<key>.json.gz` file per result. Reading a result touches its file, and writes evict the oldest files until
+    the directory fits in `max_bytes`.
+    """
+
+    def __init__(self, directory=OCR_CACHE_DIR, max_bytes=int(OCR_CACHE_MAX_MB * 2**20)):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(entry.stat().st_size for entry in os.scandir(directory) if entry.name.endswith(".json.gz"))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json.gz")
+
+    def get(self, key):
+        """
+        Returns:
+            dict or None: The cached AnalyzeResult dict, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return decode_entry(data)
+
+    def put(self, key, result):
+        data = encode_entry(result)
+        if len(data) > self.max_bytes:
+            return
+
+        path = self._path(key)
+        # Written under a temporary name first so other processes never read a partial file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as file:
+            file.write(data)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(temp_path, path)
+            self._bytes += len(data) - previous
+            if self._bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(
+            (entry for entry in os.scandir(self.directory) if entry.name.endswith(".json.gz")),
+            key=lambda entry: entry.stat().st_mtime
+        )
+        # Other processes share the directory, so the total is recounted before evicting
+        self._bytes = sum(entry.stat().st_size for entry in entries)
+        for entry in entries:
+            if self._bytes <= self.max_bytes:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+            self._bytes -= size
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes": self._bytes,
+            "evictions": self.evictions
+        }
+
+class RedisOCRCache:
+    """
+    Store shared across workers. Each result is a compressed value under its own key; a sorted set orders keys by last
+    access and a hash holds their sizes, so writes can evict the least recently used results until the total fits.
+    """
+
+    KEY_PREFIX = "ocr_cache"
+
+    def __init__(self, url=OCR_CACHE_REDIS_URL, max_bytes=int(OCR_CACHE_MAX_MB * 2**20), key_prefix=KEY_PREFIX):
+        import redis
+
+        self.redis = redis.Redis.from_url(url)
+        self.max_bytes = max_bytes
+        self.key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._access_key = f"{key_prefix}:access"
+        self._sizes_key = f"{key_prefix}:sizes"
+
+    def _entry_key(self, key):
+        return f"{self.key_prefix}:entry:{key}"
+
+    def get(self, key):
+        data = self.redis.get(self._entry_key(key))
+        if data is None:
+            self.misses += 1
+            return None
+        self.redis.zadd(self._access_key, {key: time.time()})
+        self.hits += 1
+        return decode_entry(data)
+
+    def put(self, key, result):
+        data = encode_entry(result)
+        if len(data) > self.max_bytes:
+            return
+
+        with self.redis.pipeline() as pipe:
+            pipe.set(self._entry_key(key), data)
+            pipe.zadd(self._access_key, {key: time.time()})
+            pipe.hset(self._sizes_key, key, len(data))
+            pipe.execute()
+
+        total = sum(int(size) for size in self.redis.hvals(self._sizes_key))
+        while total > self.max_bytes:
+            oldest = self.redis.zpopmin(self._access_key)
+            if not oldest:
+                break
+            evicted = oldest[0][0].decode()
+            total -= int(self.redis.hget(self._sizes_key, evicted) or 0)
+            with self.redis.pipeline() as pipe:
+                pipe.delete(self._entry_key(evicted))
+                pipe.hdel(self._sizes_key, evicted)
+                pipe.execute()
+            self.evictions += 1
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "bytes": None,
+            "evictions": self.evictions
+        }
+
+def create_ocr_cache(backend=OCR_CACHE_BACKEND):
+    """
+    Creates the OCR cache configured by OCR_CACHE_BACKEND.
+
+    Returns:
+        DiskOCRCache, RedisOCRCache or None: The cache, or None when caching is disabled.
+    """
+    if backend == "none":
+        return None
+    if backend == "disk":
+        return DiskOCRCache()
+    if backend == "redis":
+        return RedisOCRCache()
+    raise ValueError(f"Unknown OCR cache backend '{backend}'. Expected disk, redis or none.")
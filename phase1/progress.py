@@ -0,0 +1,129 @@
+"""
+Module: progress.py
+
+Purpose:
+Stage-level progress events of a document analysis, pushed by the Celery worker and read by the Streamlit app
+instead of polling the task state.
+
+Every task has a Redis stream, `progress:<task id>`, to which the worker appends one entry per finished stage:
+uploaded (the worker received the document), ocr, language, extraction and validation, then a final `done` entry
+carrying the analysis result or an `error` entry. The app blocks on XREAD for new entries, so each stage is shown as
+soon as it lands, without a fixed polling interval and without round trips to the result backend.
+
+A stream is used rather than pub/sub because entries stay readable after they are published: the app can start
+reading after the worker already finished some stages (or the whole task) and still receive every event.
+Streams expire PROGRESS_TTL seconds after their last entry.
+
+The worker publishes through `publish_progress_in_background`. Stage events are reported from coroutines on the
+worker's shared event loop (see worker_runtime.py), where a blocking Redis round trip would stall every other document
+in flight, so events are queued to a single background thread that publishes them in order.
+
+Configuration (environment variables):
+- PROGRESS_REDIS_URL: Redis holding the progress streams (default redis://localhost:6379/0, the Celery broker)
+- PROGRESS_TTL: seconds a stream is kept after its last event (default 3600)
+- PROGRESS_TIMEOUT: seconds the app waits for the next event before giving up (default 300)
+"""
+
+import os
+import json
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+import redis
+
+logger = logging.getLogger(__name__)
+
+PROGRESS_REDIS_URL = os.getenv("PROGRESS_REDIS_URL", "redis://localhost:6379/0")
+PROGRESS_TTL = int(os.getenv("PROGRESS_TTL", "3600"))
+PROGRESS_TIMEOUT = float(os.getenv("PROGRESS_TIMEOUT", "300"))
+
+STAGES = ("uploaded", "ocr", "language", "extraction", "validation")
+FINAL_STAGES = ("done", "error")
+# A stream only ever holds the events of one task, this just bounds a misbehaving producer
+MAX_EVENTS = 100
+
+_redis_client = None
+_publisher = None
+
+def get_redis_client():
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis.from_url(PROGRESS_REDIS_URL, decode_responses=True)
+    return _redis_client
+
+def progress_key(task_id):
+    return f"progress:{task_id}"
+
+def publish_progress(task_id, stage, redis_client=None, event_time=None, **data):
+    """
+    Appends a progress event to the stream of a task. Progress is best effort: a Redis failure is logged and does not
+    fail the analysis.
+
+    Args:
+        task_id (str): Celery task id.
+        stage (str): One of STAGES or FINAL_STAGES.
+        redis_client (redis.Redis, optional): Client to use. Defaults to the module client.
+        event_time (float, optional): When the stage finished. Defaults to now.
+        **data: JSON-serializable details of the stage.
+    """
+    redis_client = redis_client or get_redis_client()
+    key = progress_key(task_id)
+    fields = {"stage": stage, "time": event_time or time.time(), "data": json.dumps(data, ensure_ascii=False)}
+    try:
+        with redis_client.pipeline() as pipe:
+            pipe.xadd(key, fields, maxlen=MAX_EVENTS, approximate=True)
+            pipe.expire(key, PROGRESS_TTL)
+            pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Could not publish progress '{stage}' of task {task_id}: {e}")
+
+def publish_progress_in_background(task_id, stage, **data):
+    """
+    Queues a progress event to be published by a background thread, without waiting for Redis. Events are published
+    one at a time in the order they were queued.
+
+    Args:
+        task_id (str): Celery task id.
+        stage (str): One of STAGES or FINAL_STAGES.
+        **data: JSON-serializable details of the stage.
+
+    Returns:
+        concurrent.futures.Future: Completes once the event is published; wait on it before the task returns.
+    """
+    global _publisher
+    if _publisher is None:
+        _publisher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="progress")
+    return _publisher.submit(publish_progress, task_id, stage, event_time=time.time(), **data)
+
+def iter_progress(task_id, timeout=PROGRESS_TIMEOUT, redis_client=None):
+    """
+    Yields the progress events of a task from the first one on, blocking until each arrives, and stops after the
+    final `done` or `error` event.
+
+    Args:
+        task_id (str): Celery task id.
+        timeout (float): Seconds to wait for the next event.
+        redis_client (redis.Redis, optional): Client to use. Defaults to the module client.
+
+    Yields:
+        dict: {"stage": str, "time": float, "data": dict}
+
+    Raises:
+        TimeoutError: If no event arrives within `timeout` seconds.
+    """
+    redis_client = redis_client or get_redis_client()
+    key = progress_key(task_id)
+    last_id = "0-0"
+
+    while True:
+        response = redis_client.xread({key: last_id}, block=int(timeout * 1000))
+        if not response:
+            raise TimeoutError(f"No progress from task {task_id} for {timeout:.0f} seconds.")
+
+        for _, entries in response:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                event = {"stage": fields["stage"], "time": float(fields["time"]), "data": json.loads(fields["data"])}
+                yield event
+                if event["stage"] in FINAL_STAGES:
+                    return
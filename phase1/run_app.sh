@@ -3,8 +3,9 @@
 # Activate your Python virtual environment
 source ../venv/bin/activate
 
-# Start Celery in the background
-celery -A analyze.celery_app worker --loglevel=info &
+# Start Celery in the background; with the thread pool one worker process keeps WORKER_CONCURRENCY documents in
+# flight on its shared event loop and connection pools (see worker_runtime.py)
+celery -A analyze.celery_app worker --pool=${WORKER_POOL:-threads} --concurrency=${WORKER_CONCURRENCY:-16} --loglevel=info &
 
 # Start the Streamlit app
 streamlit run app.py
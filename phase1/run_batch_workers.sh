@@ -0,0 +1,13 @@
+#!/bin/bash
+
+# Activate your Python virtual environment
+source ../venv/bin/activate
+
+# Batch ingestion workers (see batch.py): one per upstream service, each concurrency is that service's cap
+OCR_CONCURRENCY=${OCR_CONCURRENCY:-4}
+OPENAI_CONCURRENCY=${OPENAI_CONCURRENCY:-8}
+
+celery -A analyze.celery_app worker -Q ocr --pool=threads --concurrency=$OCR_CONCURRENCY -n ocr@%h --loglevel=info &
+celery -A analyze.celery_app worker -Q openai --pool=threads --concurrency=$OPENAI_CONCURRENCY -n openai@%h --loglevel=info &
+
+wait
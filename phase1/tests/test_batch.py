@@ -0,0 +1,59 @@
+import os
+import sys
+import json
+import zipfile
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from batch import iter_documents, load_finished, make_record, task_ids
+
+def write_forms(directory):
+    os.makedirs(directory / "nested")
+    (directory / "a.pdf").write_bytes(b"a")
+    (directory / "nested" / "b.JPG").write_bytes(b"b")
+    (directory / "notes.txt").write_bytes(b"skip")
+    (directory / ".hidden.pdf").write_bytes(b"skip")
+
+def test_iter_documents_from_directory(tmp_path):
+    write_forms(tmp_path / "forms")
+
+    documents = list(iter_documents(str(tmp_path / "forms")))
+
+    assert documents == [("a.pdf", b"a"), ("nested/b.JPG", b"b")]
+
+def test_iter_documents_from_zip(tmp_path):
+    archive_path = tmp_path / "forms.zip"
+    with zipfile.ZipFile(archive_path, "w") as archive:
+        archive.writestr("nested/b.png", b"b")
+        archive.writestr("a.pdf", b"a")
+        archive.writestr("__MACOSX/._a.pdf", b"skip")
+
+    documents = list(iter_documents(str(archive_path)))
+
+    assert documents == [("a.pdf", b"a"), ("nested/b.png", b"b")]
+
+def test_load_finished_keeps_only_successful_documents(tmp_path):
+    output_path = tmp_path / "results.jsonl"
+    lines = [
+        json.dumps({"document": "a.pdf", "sha256": "1", "status": "ok"}),
+        json.dumps({"document": "b.pdf", "sha256": "2", "status": "error"}),
+        '{"document": "c.pdf", "sha'
+    ]
+    output_path.write_text("\n".join(lines), encoding="utf-8")
+
+    assert load_finished(str(output_path)) == {"a.pdf": "1"}, "Failed and truncated lines must be processed again."
+    assert load_finished(str(tmp_path / "missing.jsonl")) == {}
+
+def test_task_ids_depend_on_name_and_content():
+    assert task_ids("a.pdf", "1") == task_ids("a.pdf", "1")
+    assert task_ids("a.pdf", "1") != task_ids("copy/a.pdf", "1")
+    assert task_ids("a.pdf", "1") != task_ids("a.pdf", "2")
+
+def test_error_records_name_the_exception():
+    meta = {"exc_type": "HttpResponseError", "exc_message": ["(InvalidRequest) Invalid request."], "exc_module": "azure.core.exceptions"}
+
+    record = make_record("a.pdf", "1", "error", meta, 1.5)
+
+    assert record["error_type"] == "HttpResponseError"
+    assert record["error_message"] == "(InvalidRequest) Invalid request."
+    assert make_record("a.pdf", "1", "error", TimeoutError("OCR timed out"), None)["error_type"] == "TimeoutError"
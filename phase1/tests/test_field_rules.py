@@ -0,0 +1,77 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from field_rules import (
+    extract_fields_by_rules, parse_date, parse_id_number, parse_landline_phone, parse_mobile_phone, parse_time
+)
+from layout import DocumentLayout
+from analyze import EXTRACTION_SCHEMAS, merge_fields, remaining_schema, schema_fields
+
+def make_layout(lines, key_value_pairs=(), confidence=0.95):
+    words, word_line = [], []
+    for index, line in enumerate(lines):
+        words += line.split()
+        word_line += [index] * len(line.split())
+    return DocumentLayout(
+        page_count=1, words=words, word_confidence=[confidence] * len(words), word_line=word_line,
+        word_in_pair=[False] * len(words), lines=list(lines),
+        key_value_pairs=[{"key": key, "value": value, "confidence": 0.9} for key, value in key_value_pairs]
+    )
+
+def test_id_number_needs_a_valid_check_digit():
+    assert parse_id_number("0 3 1 2 2 0 0 1 5") == "031220015", "IDs written digit by digit in boxes should be read."
+    assert parse_id_number("031220019") is None
+    assert parse_id_number("12345678") is None
+
+def test_phone_numbers_dates_and_times_are_normalized():
+    assert parse_mobile_phone("050-234-5678 3303915") == "0502345678"
+    assert parse_mobile_phone("+972 50 2345678") == "0502345678"
+    assert parse_landline_phone("04-8123456") == "048123456"
+    assert parse_mobile_phone("04-8123456") is None
+
+    assert parse_date("1 2 0 5 1 9 8 0") == ("12", "05", "1980")
+    assert parse_date("3/4/2024") == ("03", "04", "2024")
+    assert parse_date("31.02.2020") is None
+    assert parse_time("בשעה 9:30") == "09:30"
+
+def test_fields_are_read_from_pairs_and_labelled_lines():
+    layout = make_layout(
+        ["שם משפחה כהן", "ת.ז. 0 3 1 2 2 0 0 1 5", "תאריך לידה 12 05 1980 מיקוד 3303915", "תיאור התאונה נפלתי במדרגות"],
+        key_value_pairs=[("שם משפחה:", "כהן"), ("טלפון נייד", "050-2345678")]
+    )
+
+    fields = extract_fields_by_rules(layout, "Hebrew")
+
+    assert fields == {
+        ("מספר זהות",): "031220015",
+        ("שם משפחה",): "כהן",
+        ("תאריך לידה",): ("12", "05", "1980"),
+        ("טלפון נייד",): "0502345678",
+        ("כתובת", "מיקוד"): "3303915"
+    }
+    assert extract_fields_by_rules(layout, "English")[("address", "postalCode")] == "3303915"
+
+def test_low_confidence_lines_are_left_to_the_llm():
+    layout = make_layout(["ת.ז. 031220015"], confidence=0.5)
+
+    assert extract_fields_by_rules(layout, "Hebrew") == {}
+
+def test_only_the_remaining_fields_are_requested_and_merged_back():
+    schema = EXTRACTION_SCHEMAS["English"]
+    prefilled = {("idNumber",): "031220015", ("dateOfBirth",): ("12", "05", "1980"), ("address", "postalCode"): "3303915"}
+
+    remaining = remaining_schema(schema, prefilled)
+
+    assert "idNumber" not in remaining and "dateOfBirth" not in remaining
+    assert "postalCode" not in remaining["address"] and "city" in remaining["address"]
+    assert len(schema_fields(remaining)) == len(schema_fields(schema)) - 5
+
+    merged = merge_fields(schema, {"address": {"city": "Haifa"}, "accidentDescription": None, "idNumber": "1"}, prefilled)
+
+    assert merged["idNumber"] == "031220015", "Prefilled fields take precedence over the LLM."
+    assert merged["dateOfBirth"] == {"day": "12", "month": "05", "year": "1980"}
+    assert merged["address"]["city"] == "Haifa" and merged["address"]["postalCode"] == "3303915"
+    assert merged["accidentDescription"] == ""
+    assert list(merged) == list(schema)
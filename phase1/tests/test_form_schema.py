@@ -0,0 +1,91 @@
+import os
+import sys
+import json
+from types import SimpleNamespace
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import analyze
+from analyze import extract_fields_with_openai, schema_fields
+from form_schema import build_schema, invalid_fields, response_format, translate_path
+
+def test_hebrew_and_english_schemas_have_the_same_fields():
+    hebrew, english = build_schema("Hebrew"), build_schema("English")
+
+    assert len(schema_fields(hebrew)) == len(schema_fields(english)) == 35
+    assert english["dateOfBirth"] == {"day": "", "month": "", "year": ""}
+    assert hebrew["תאריך לידה"] == {"יום": "", "חודש": "", "שנה": ""}
+    assert translate_path(("address", "postalCode"), "Hebrew") == ("כתובת", "מיקוד")
+
+def test_response_format_requires_every_requested_field():
+    schema = {"idNumber": "", "address": {"city": ""}}
+
+    json_schema = response_format(schema, "English")["json_schema"]
+
+    assert json_schema["strict"] is True
+    root = json_schema["schema"]
+    assert root["required"] == ["idNumber", "address"] and root["additionalProperties"] is False
+    assert root["properties"]["address"]["required"] == ["city"]
+    assert "9 digits" in root["properties"]["idNumber"]["description"]
+
+def test_invalid_fields_reports_missing_and_malformed_values():
+    schema = {"idNumber": "", "timeOfInjury": "", "firstName": "", "address": {"postalCode": ""}}
+    answer = {"idNumber": "03-1220015", "timeOfInjury": "", "firstName": 7, "address": {}}
+
+    invalid = invalid_fields(answer, schema, "English")
+
+    assert set(invalid) == {("idNumber",), ("firstName",), ("address", "postalCode")}
+    assert invalid[("address", "postalCode")] == "missing"
+
+class FakeCompletions:
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.requests = []
+
+    async def create(self, **kwargs):
+        self.requests.append(kwargs)
+        content = self.answers.pop(0)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content), finish_reason="stop")])
+
+@pytest.fixture
+def fake_openai(monkeypatch):
+    def install(*answers):
+        completions = FakeCompletions(answers)
+        client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+        monkeypatch.setattr(analyze, "get_openai_client", lambda: client)
+        monkeypatch.setattr(analyze, "EXTRACTION_RESPONSE_FORMAT", "json_schema")
+        return completions
+    return install
+
+def english_answer(**values):
+    answer = build_schema("English")
+    answer.update(values)
+    return json.dumps(answer)
+
+@pytest.mark.asyncio
+async def test_only_invalid_fields_are_asked_again(fake_openai):
+    completions = fake_openai(
+        english_answer(idNumber="03-1220015", timeOfInjury="9.30", lastName="Cohen"),
+        json.dumps({"idNumber": "031220015", "timeOfInjury": "9.30"})
+    )
+
+    result = await extract_fields_with_openai("form", "English")
+
+    assert len(completions.requests) == 2
+    repair_schema = completions.requests[1]["response_format"]["json_schema"]["schema"]
+    assert set(repair_schema["properties"]) == {"idNumber", "timeOfInjury"}
+    assert "rejected" in completions.requests[1]["messages"][0]["content"]
+    assert result["idNumber"] == "031220015"
+    assert result["timeOfInjury"] == "", "A field still invalid after the repair should be left empty."
+    assert result["lastName"] == "Cohen"
+
+@pytest.mark.asyncio
+async def test_unparsable_answer_is_asked_again_in_full(fake_openai):
+    completions = fake_openai('{"lastName": "Coh', english_answer(lastName="Cohen"))
+
+    result = await extract_fields_with_openai("form", "English", prefilled={("idNumber",): "031220015"})
+
+    assert len(completions.requests) == 2
+    assert result["lastName"] == "Cohen" and result["idNumber"] == "031220015"
+    assert "idNumber" not in completions.requests[0]["response_format"]["json_schema"]["schema"]["properties"]
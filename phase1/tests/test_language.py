@@ -0,0 +1,36 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from language import detect_language_locally, LANGUAGE_CONFIDENCE_THRESHOLD
+
+HEBREW_FORM = "בקשה למתן טיפול רפואי לנפגע עבודה שם משפחה שם פרטי ת.ז. 0 3 1 2 2 0 0 1 9 כהן ישראל".split()
+ENGLISH_FORM = "Request for medical treatment for a work injury Last name Cohen First name Israel".split()
+
+def test_hebrew_and_english_forms_are_detected_confidently():
+    language, confidence = detect_language_locally(HEBREW_FORM)
+    assert language == "Hebrew"
+    assert confidence >= LANGUAGE_CONFIDENCE_THRESHOLD
+
+    language, confidence = detect_language_locally(ENGLISH_FORM)
+    assert language == "English"
+    assert confidence >= LANGUAGE_CONFIDENCE_THRESHOLD
+
+def test_mixed_form_is_left_to_the_fallback():
+    _, confidence = detect_language_locally(HEBREW_FORM[:8] + ENGLISH_FORM[:8])
+
+    assert confidence < LANGUAGE_CONFIDENCE_THRESHOLD, "A half Hebrew, half English form should not be decided locally."
+
+def test_document_intelligence_hints_are_combined_with_the_script_ratio():
+    hints = [{"locale": "en", "confidence": 0.9, "length": 300}, {"locale": "he-IL", "confidence": 0.8, "length": 100}]
+
+    language, confidence = detect_language_locally(HEBREW_FORM[:8] + ENGLISH_FORM[:8], hints)
+
+    assert language == "English"
+    # Unknown locales are ignored
+    assert detect_language_locally(ENGLISH_FORM, [{"locale": "fr", "confidence": 1.0, "length": 500}])[1] == 1.0
+
+def test_no_letters_gives_no_decision():
+    assert detect_language_locally(["0", "3", "12/05/2024", "-"]) == (None, 0.0)
+    assert detect_language_locally([]) == (None, 0.0)
@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from azure.ai.formrecognizer import (
+    AnalyzeResult, BoundingRegion, DocumentKeyValueElement, DocumentKeyValuePair, DocumentLine, DocumentPage,
+    DocumentSelectionMark, DocumentSpan, DocumentWord, Point
+)
+from layout import build_layout, DocumentLayout
+
+def box(x0, y0, x1, y1):
+    return [Point(x=x0, y=y0), Point(x=x1, y=y0), Point(x=x1, y=y1), Point(x=x0, y=y1)]
+
+def make_result(rows, marks=(), key_values=()):
+    """
+    Lays out rows of words right to left, one line per row. `marks` are (row, word, state) checkboxes placed to the
+    right of a word, `key_values` are (key, value) texts found in the content.
+    """
+    words, lines, selection_marks, offset = [], [], [], 0
+    for row, text in enumerate(rows):
+        y0, y1, x, start = row * 1.0, row * 1.0 + 0.5, 20.0, offset
+        for word in text.split():
+            for mark_row, mark_word, state in marks:
+                if (mark_row, mark_word) == (row, word):
+                    selection_marks.append(DocumentSelectionMark(state=state, polygon=box(x - 0.5, y0, x, y1), confidence=0.9))
+                    x -= 0.7
+            width = len(word) * 0.3
+            words.append(DocumentWord(content=word, polygon=box(x - width, y0, x, y1), confidence=0.9,
+                                      span=DocumentSpan(offset=offset, length=len(word))))
+            x -= width + 0.3
+            offset += len(word) + 1
+        lines.append(DocumentLine(content=text, polygon=box(x, y0, 20.0, y1), spans=[DocumentSpan(offset=start, length=len(text))]))
+
+    content = "\n".join(rows)
+    pairs = []
+    for key, value in key_values:
+        if value in (":selected:", ":unselected:"):
+            mark = selection_marks[0]
+            value_element = DocumentKeyValueElement(
+                content=value, spans=[], bounding_regions=[BoundingRegion(page_number=1, polygon=mark.polygon)]
+            )
+        else:
+            value_element = DocumentKeyValueElement(content=value, spans=[DocumentSpan(offset=content.index(value), length=len(value))])
+        pairs.append(DocumentKeyValuePair(
+            key=DocumentKeyValueElement(content=key, spans=[DocumentSpan(offset=content.index(key), length=len(key))]),
+            value=value_element, confidence=0.8
+        ))
+
+    page = DocumentPage(page_number=1, words=words, lines=lines, selection_marks=selection_marks)
+    return AnalyzeResult(content=content, pages=[page], key_value_pairs=pairs, languages=[])
+
+ROWS = ["בקשה לטיפול רפואי", "שם משפחה כהן", "מין זכר נקבה", "קופת חולים כללית מכבי"]
+MARKS = [(2, "זכר", "unselected"), (2, "נקבה", "selected"), (3, "כללית", "selected"), (3, "מכבי", "selected")]
+
+def test_words_are_assigned_to_their_lines():
+    layout = build_layout(make_result(ROWS))
+
+    assert len(layout) == 13 and layout.page_count == 1
+    assert layout.word_line.tolist() == [0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 3]
+    assert layout.word_boxes.shape == (13, 4) and layout.word_confidence.dtype.name == "float32"
+    assert layout.text == "\n".join(ROWS)
+
+def test_checkboxes_are_labelled_with_the_word_to_their_left():
+    layout = build_layout(make_result(ROWS, MARKS))
+
+    assert [(box["label"], box["selected"]) for box in layout.checkboxes] == [
+        ("זכר", False), ("נקבה", True), ("כללית", True), ("מכבי", True)
+    ]
+    assert layout.selected_option(("זכר", "נקבה")) == "נקבה"
+    assert layout.selected_option(("כללית", "מכבי")) is None, "Two selected options should not be decided."
+
+def test_prompt_leaves_out_lines_covered_by_key_value_pairs():
+    layout = build_layout(make_result(ROWS, MARKS, key_values=[("שם משפחה", "כהן")]))
+
+    prompt = layout.prompt_text()
+
+    assert "שם משפחה: כהן" in prompt
+    assert "[x] נקבה" in prompt and "[ ] זכר" in prompt
+    assert "שם משפחה כהן" not in prompt
+    assert "בקשה לטיפול רפואי" in prompt
+
+def test_checkbox_key_value_pairs_name_their_selection_mark():
+    layout = build_layout(make_result(ROWS, MARKS[:1], key_values=[("מין זכר", ":unselected:")]))
+
+    assert layout.mark_labels == ["מין זכר"]
+    assert layout.key_value_pairs == []
+
+def test_layout_survives_a_json_round_trip():
+    layout = build_layout(make_result(ROWS, MARKS, key_values=[("שם משפחה", "כהן")]))
+
+    restored = DocumentLayout.from_dict(json.loads(json.dumps(layout.to_dict(), ensure_ascii=False)))
+
+    assert restored.words == layout.words
+    assert restored.prompt_text() == layout.prompt_text()
+    assert restored.word_boxes.tolist() == layout.word_boxes.tolist()
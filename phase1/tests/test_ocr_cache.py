@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import uuid
+import pytest
+import redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from ocr_cache import DiskOCRCache, RedisOCRCache, ocr_cache_key, encode_entry
+
+RESULT = {"model_id": "prebuilt-document", "content": "שם משפחה כהן", "pages": [{"page_number": 1, "words": []}]}
+
+def test_key_depends_on_content_model_and_features():
+    key = ocr_cache_key(b"form", "prebuilt-document", ["languages"])
+
+    assert key == ocr_cache_key(b"form", "prebuilt-document", ["languages"])
+    assert key != ocr_cache_key(b"other form", "prebuilt-document", ["languages"])
+    assert key != ocr_cache_key(b"form", "prebuilt-layout", ["languages"])
+    assert key != ocr_cache_key(b"form", "prebuilt-document")
+
+def test_disk_cache_round_trip_survives_restart(tmp_path):
+    cache = DiskOCRCache(str(tmp_path))
+    assert cache.get("a") is None
+
+    cache.put("a", RESULT)
+
+    assert DiskOCRCache(str(tmp_path)).get("a") == RESULT, "Cached result was not persisted to disk."
+    assert cache.stats()["misses"] == 1
+
+def test_disk_cache_evicts_least_recently_used(tmp_path):
+    entry_size = len(encode_entry(RESULT))
+    cache = DiskOCRCache(str(tmp_path), max_bytes=int(entry_size * 2.5))
+
+    cache.put("a", RESULT)
+    time.sleep(0.01)
+    cache.put("b", RESULT)
+    time.sleep(0.01)
+    cache.get("a")
+    time.sleep(0.01)
+    cache.put("c", RESULT)
+
+    assert cache.get("b") is None, "The least recently used result should have been evicted."
+    assert cache.get("a") == RESULT
+    assert cache.get("c") == RESULT
+    assert cache.stats()["bytes"] <= cache.max_bytes
+
+def test_redis_cache_evicts_least_recently_used():
+    prefix = f"test_ocr_cache_{uuid.uuid4().hex}"
+    cache = RedisOCRCache(max_bytes=int(len(encode_entry(RESULT)) * 2.5), key_prefix=prefix)
+    try:
+        cache.redis.ping()
+    except redis.ConnectionError:
+        pytest.skip("Redis is not reachable.")
+
+    try:
+        cache.put("a", RESULT)
+        cache.put("b", RESULT)
+        cache.get("a")
+        cache.put("c", RESULT)
+
+        assert cache.get("b") is None
+        assert cache.get("a") == RESULT
+        assert cache.get("c") == RESULT
+    finally:
+        keys = cache.redis.keys(f"{prefix}:*")
+        if keys:
+            cache.redis.delete(*keys)
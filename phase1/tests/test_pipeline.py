@@ -0,0 +1,63 @@
+import os
+import sys
+import asyncio
+import time
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import analyze
+from analyze import analyze_documents
+from layout import DocumentLayout
+
+OCR_SECONDS = 0.2
+EXTRACTION_SECONDS = 0.2
+
+@pytest.fixture
+def stub_stages(monkeypatch):
+    calls = []
+
+    async def run_ocr(file_bytes):
+        calls.append(("ocr", file_bytes))
+        await asyncio.sleep(OCR_SECONDS)
+        if file_bytes == b"broken":
+            raise ValueError("OCR failed")
+        return DocumentLayout(page_count=1, words=[file_bytes.decode()], word_confidence=[1.0])
+
+    async def extract_structured_data(layout, on_progress=None):
+        calls.append(("extraction", layout.words[0]))
+        await asyncio.sleep(EXTRACTION_SECONDS)
+        if on_progress:
+            on_progress("extraction", fields=1)
+        return {"text": layout.words[0]}
+
+    monkeypatch.setattr(analyze, "run_ocr", run_ocr)
+    monkeypatch.setattr(analyze, "extract_structured_data", extract_structured_data)
+    return calls
+
+@pytest.mark.asyncio
+async def test_ocr_of_the_next_document_overlaps_extraction(stub_stages):
+    documents = [b"a", b"b", b"c", b"d"]
+
+    start = time.perf_counter()
+    results = await analyze_documents(documents, ocr_concurrency=1, extraction_concurrency=1)
+    elapsed = time.perf_counter() - start
+
+    assert results == [{"text": "a"}, {"text": "b"}, {"text": "c"}, {"text": "d"}], "Results should keep input order."
+    sequential = len(documents) * (OCR_SECONDS + EXTRACTION_SECONDS)
+    pipelined = len(documents) * OCR_SECONDS + EXTRACTION_SECONDS
+    assert elapsed < (sequential + pipelined) / 2, f"Took {elapsed:.2f}s, the stages do not overlap."
+    assert len(stub_stages) == 2 * len(documents)
+
+@pytest.mark.asyncio
+async def test_failed_document_does_not_stop_the_others(stub_stages):
+    events = []
+
+    results = await analyze_documents(
+        [b"a", b"broken", b"c"], on_progress=lambda index, stage, **data: events.append((index, stage))
+    )
+
+    assert results[0] == {"text": "a"} and results[2] == {"text": "c"}
+    assert isinstance(results[1], ValueError)
+    assert (1, "ocr") not in events
+    assert sorted(events) == [(0, "extraction"), (0, "ocr"), (2, "extraction"), (2, "ocr")]
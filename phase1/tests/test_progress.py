@@ -0,0 +1,62 @@
+import os
+import sys
+import uuid
+import time
+import asyncio
+import pytest
+import redis
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import progress
+from progress import publish_progress, publish_progress_in_background, iter_progress, progress_key, PROGRESS_REDIS_URL
+
+@pytest.fixture
+def redis_client():
+    client = redis.Redis.from_url(PROGRESS_REDIS_URL, decode_responses=True)
+    try:
+        client.ping()
+    except redis.ConnectionError:
+        pytest.skip(f"Redis is not reachable at {PROGRESS_REDIS_URL}")
+    return client
+
+def test_progress_events_in_order(redis_client):
+    task_id = f"test-{uuid.uuid4()}"
+    # Events published before the reader starts must still be delivered
+    publish_progress(task_id, "uploaded", redis_client=redis_client, size_bytes=10)
+    publish_progress(task_id, "language", redis_client=redis_client, language="Hebrew")
+    publish_progress(task_id, "done", redis_client=redis_client, result={"שם פרטי": "ישראל"})
+
+    try:
+        events = list(iter_progress(task_id, timeout=1, redis_client=redis_client))
+    finally:
+        redis_client.delete(progress_key(task_id))
+
+    assert [event["stage"] for event in events] == ["uploaded", "language", "done"]
+    assert events[1]["data"] == {"language": "Hebrew"}
+    assert events[2]["data"]["result"]["שם פרטי"] == "ישראל", "Result was not carried by the final event."
+
+def test_progress_times_out_without_events(redis_client):
+    with pytest.raises(TimeoutError):
+        list(iter_progress(f"test-{uuid.uuid4()}", timeout=0.2, redis_client=redis_client))
+
+def test_background_publishing_does_not_block_the_event_loop(monkeypatch):
+    published = []
+
+    def slow_publish(task_id, stage, event_time=None, **data):
+        time.sleep(0.1)
+        published.append((stage, event_time))
+
+    monkeypatch.setattr(progress, "publish_progress", slow_publish)
+
+    async def report_stages():
+        start = time.perf_counter()
+        for stage in ("ocr", "language", "extraction"):
+            publish_progress_in_background("task", stage)
+        return time.perf_counter() - start
+
+    assert asyncio.run(report_stages()) < 0.05, "Reporting a stage should not wait for Redis."
+    publish_progress_in_background("task", "done").result()
+
+    assert [stage for stage, _ in published] == ["ocr", "language", "extraction", "done"]
+    assert all(event_time is not None for _, event_time in published)
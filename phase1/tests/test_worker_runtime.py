@@ -0,0 +1,69 @@
+import os
+import sys
+import asyncio
+import threading
+import time
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import worker_runtime
+from worker_runtime import get_runtime, run_async, shutdown_runtime
+
+@pytest.fixture(autouse=True)
+def fresh_runtime(monkeypatch):
+    # The clients are created with the runtime and only need to be constructible here
+    monkeypatch.setattr(worker_runtime, "ENDPOINT_OCR", "http://127.0.0.1:9")
+    monkeypatch.setattr(worker_runtime, "API_KEY_OCR", "test")
+    monkeypatch.setattr(worker_runtime, "ENDPOINT_OPENAI", "http://127.0.0.1:9")
+    monkeypatch.setattr(worker_runtime, "API_KEY_OPENAI", "test")
+    shutdown_runtime()
+    yield
+    shutdown_runtime()
+
+def test_coroutines_share_one_long_lived_loop():
+    async def current_loop():
+        return asyncio.get_running_loop()
+
+    first = run_async(current_loop())
+    second = run_async(current_loop())
+
+    assert first is second, "Each call got its own event loop."
+    assert first is get_runtime().loop
+    assert get_runtime().openai_client is get_runtime().openai_client
+
+def test_task_threads_keep_documents_in_flight_concurrently():
+    results = []
+
+    def task(i):
+        results.append(run_async(asyncio.sleep(0.2, result=i)))
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=task, args=(i,)) for i in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(results) == list(range(10))
+    assert time.perf_counter() - start < 1.0, "Coroutines from different task threads ran one after another."
+
+def test_exceptions_reach_the_caller():
+    async def fail():
+        raise ValueError("bad document")
+
+    with pytest.raises(ValueError, match="bad document"):
+        run_async(fail())
+
+def test_shutdown_stops_the_loop_and_a_forked_runtime_is_replaced(monkeypatch):
+    runtime = get_runtime()
+    shutdown_runtime()
+
+    assert runtime.loop.is_closed()
+    assert not runtime.thread.is_alive()
+
+    inherited = get_runtime()
+    # Simulate a runtime inherited from the parent of a forked worker process
+    monkeypatch.setattr(inherited, "pid", -1)
+    assert get_runtime() is not inherited
+    inherited.close()
@@ -0,0 +1,156 @@
+"""
+Module: worker_runtime.py
+
+Purpose:
+Per-process runtime of the document analysis workers: one long-lived asyncio event loop running in a background
+thread, plus the async Document Intelligence and Azure OpenAI clients with bounded, reused HTTP connection pools. Both
+clients are bound to the runtime loop, so OCR polling and completions never block it.
+
+The runtime is created when a worker process starts (`worker_process_init` for prefork children) or lazily on first
+use (thread and solo pools, scripts), and closed on `worker_process_shutdown` / `worker_shutdown`. A runtime inherited
+through fork is never reused, since its loop thread only exists in the parent.
+
+Tasks submit coroutines with `run_async`, which blocks the calling task thread until the coroutine finishes on the
+shared loop. Under the thread pool (`--pool threads --concurrency N`, see run_app.sh) one worker process therefore keeps
+up to N documents in flight on a single loop and a single set of connections, instead of a loop and a client per task.
+All coroutines using `get_ocr_client` or `get_openai_client` must run on the runtime loop, i.e. through `run_async`.
+
+Configuration (environment variables):
+- OPENAI_MAX_CONNECTIONS: connections kept to Azure OpenAI per worker process (default 20)
+- OCR_MAX_CONNECTIONS: connections kept to Document Intelligence per worker process (default 10)
+- OPENAI_TIMEOUT: seconds before an Azure OpenAI request times out (default 60)
+- OPENAI_API_VERSION: Azure OpenAI API version (default 2024-08-01-preview)
+"""
+
+import os
+import asyncio
+import logging
+import threading
+import aiohttp
+import httpx
+from dotenv import load_dotenv
+from azure.ai.formrecognizer.aio import DocumentAnalysisClient
+from azure.core.credentials import AzureKeyCredential
+from azure.core.pipeline.transport import AioHttpTransport
+from celery.signals import worker_process_init, worker_process_shutdown, worker_shutdown
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
+
+# Load environment variables
+load_dotenv()
+
+# Retrieve credentials from .env file
+ENDPOINT_OCR = os.getenv("AZURE_OCR_AI_SERVICES_URL")
+API_KEY_OCR = os.getenv("AZURE_OCR_AI_SERVICES_KEY")
+
+ENDPOINT_OPENAI = os.getenv("AZURE_OPENAI_SERVICES_URL")
+API_KEY_OPENAI = os.getenv("AZURE_OPENAI_SERVICES_KEY")
+
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "20"))
+OCR_MAX_CONNECTIONS = int(os.getenv("OCR_MAX_CONNECTIONS", "10"))
+OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "60"))
+# Structured outputs (see EXTRACTION_RESPONSE_FORMAT in analyze.py) need API version 2024-08-01-preview or later
+OPENAI_API_VERSION = os.getenv("OPENAI_API_VERSION", "2024-08-01-preview")
+
+logger = logging.getLogger(__name__)
+
+async def create_ocr_client():
+    # The aiohttp session binds to the loop it is created on, hence a coroutine run on the runtime loop
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=OCR_MAX_CONNECTIONS))
+    return DocumentAnalysisClient(
+        endpoint=ENDPOINT_OCR,
+        credential=AzureKeyCredential(API_KEY_OCR),
+        transport=AioHttpTransport(session=session, session_owner=True)
+    )
+
+def create_openai_client():
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS, max_keepalive_connections=OPENAI_MAX_CONNECTIONS),
+        timeout=OPENAI_TIMEOUT
+    )
+    return AsyncAzureOpenAI(
+        api_key=API_KEY_OPENAI,
+        azure_endpoint=ENDPOINT_OPENAI,
+        api_version=OPENAI_API_VERSION,
+        http_client=http_client
+    )
+
+class WorkerRuntime:
+    """
+    Event loop thread and clients of one worker process.
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self._run_loop, name="analysis-event-loop", daemon=True)
+        self.thread.start()
+        self.ocr_client = self.run(create_ocr_client())
+        self.openai_client = create_openai_client()
+        logger.info(f"Started analysis runtime in process {self.pid}.")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+
+    def run(self, coro):
+        """
+        Runs a coroutine on the runtime loop and waits for its result.
+
+        Args:
+            coro (coroutine): The coroutine to run.
+
+        Returns:
+            The coroutine's result; its exception is raised in the caller.
+        """
+        if threading.current_thread() is self.thread:
+            coro.close()
+            raise RuntimeError("run_async cannot be called from a coroutine running on the runtime loop; await instead.")
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self):
+        self.run(self.openai_client.close())
+        self.run(self.ocr_client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+        self.loop.close()
+        logger.info(f"Closed analysis runtime in process {self.pid}.")
+
+_runtime = None
+_runtime_lock = threading.Lock()
+
+def get_runtime():
+    """
+    Returns:
+        WorkerRuntime: The runtime of the current process, created on first use.
+    """
+    global _runtime
+    with _runtime_lock:
+        if _runtime is None or _runtime.pid != os.getpid():
+            _runtime = WorkerRuntime()
+        return _runtime
+
+def run_async(coro):
+    return get_runtime().run(coro)
+
+def get_ocr_client():
+    return get_runtime().ocr_client
+
+def get_openai_client():
+    return get_runtime().openai_client
+
+def shutdown_runtime():
+    global _runtime
+    with _runtime_lock:
+        if _runtime is not None and _runtime.pid == os.getpid():
+            _runtime.close()
+        _runtime = None
+
+@worker_process_init.connect
+def start_worker_runtime(**kwargs):
+    # Connections are opened per child process; pools never cross a fork
+    get_runtime()
+
+@worker_process_shutdown.connect
+@worker_shutdown.connect
+def stop_worker_runtime(**kwargs):
+    shutdown_runtime()
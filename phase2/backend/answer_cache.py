@@ -0,0 +1,278 @@
+"""
+Module: answer_cache.py
+
+Purpose:
+Semantic cache for chatbot answers. Users keep asking the same HMO-benefit questions in slightly different words,
+so a new question whose embedding is close enough to a previously answered one reuses that answer instead of paying
+for another GPT-4o completion.
+
+Entries are partitioned by scope: the knowledge base version plus the user fields that change the answer (HMO and
+insurance tier). Cacheable answers are generated from a prompt that only shows those fields (see
+`cacheable_user_info`), so they never mention the details of the user who asked first (name, ID, age, ...). A lookup
+only compares against entries in the same scope and returns the best match whose cosine similarity is at least the
+threshold. Entries expire after a TTL and the least recently used ones are evicted once the cache is full.
+Reloading the knowledge base invalidates the cache (see `data_loader.on_knowledge_base_reload`).
+
+Two stores are available:
+- MemoryAnswerStore: per-process, the default.
+- RedisAnswerStore: shared by all workers; works with Redis or any Redis-compatible server (Valkey, KeyDB, ...).
+
+Configuration (environment variables):
+- ANSWER_CACHE_BACKEND: "memory" (default), "redis" or "none"
+- ANSWER_CACHE_REDIS_URL: connection URL for the Redis store (default redis://localhost:6379/1)
+- ANSWER_CACHE_THRESHOLD: minimum cosine similarity for a hit (default 0.95)
+- ANSWER_CACHE_TTL: seconds an answer stays valid (default 3600)
+- ANSWER_CACHE_MAX_ENTRIES: entries kept in memory across all scopes, or per scope in Redis (default 1024)
+"""
+
+import os
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_BACKEND = os.getenv("ANSWER_CACHE_BACKEND", "memory")
+ANSWER_CACHE_REDIS_URL = os.getenv("ANSWER_CACHE_REDIS_URL", "redis://localhost:6379/1")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", "3600"))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "1024"))
+
+def normalize_embedding(embedding):
+    vector = np.asarray(embedding, dtype=np.float32).reshape(-1)
+    return vector / np.linalg.norm(vector)
+
+def scope_fields(user_info):
+    hmo = str(user_info.get("hmo_name", "")).strip()
+    tier = str(user_info.get("insurance_tier", user_info.get("insurance_membership", ""))).strip()
+    return hmo, tier
+
+def cacheable_user_info(user_info):
+    """
+    The user information a cacheable answer may be generated from: only the fields of its scope, so the answer
+    applies to every user of the scope and never carries another user's personal details.
+
+    Args:
+        user_info (dict): User information sent by the frontend.
+
+    Returns:
+        dict: The HMO and insurance tier, when set.
+    """
+    hmo, tier = scope_fields(user_info)
+    return {key: value for key, value in (("hmo_name", hmo), ("insurance_tier", tier)) if value}
+
+def answer_scope(user_info, version=None):
+    """
+    Builds the cache partition for a user: answers only carry over between users with the same HMO and tier.
+
+    Args:
+        user_info (dict): User information sent by the frontend.
+        version (str, optional): Knowledge base version the answers were generated from.
+
+    Returns:
+        str: Scope identifier.
+    """
+    hmo, tier = scope_fields(user_info)
+    return f"{version}:{hmo}:{tier}"
+
+class MemoryAnswerStore:
+    """
+    In-process store. One LRU-ordered dict of entry id -> (scope, unit vector, answer, expiry) bounds the number of
+    entries across all scopes; each scope indexes the ids of its entries and is dropped once it has none left.
+    """
+
+    def __init__(self, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.scopes = {}
+        self.evictions = 0
+
+    def _remove(self, entry_id):
+        scope = self.entries.pop(entry_id)[0]
+        entry_ids = self.scopes[scope]
+        entry_ids.discard(entry_id)
+        if not entry_ids:
+            del self.scopes[scope]
+
+    async def lookup(self, scope, vector, threshold):
+        now = time.time()
+        for entry_id in [entry_id for entry_id in self.scopes.get(scope, ()) if self.entries[entry_id][3] <= now]:
+            self._remove(entry_id)
+        ids = list(self.scopes.get(scope, ()))
+        if not ids:
+            return None
+
+        similarities = np.stack([self.entries[entry_id][1] for entry_id in ids]) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+
+        self.entries.move_to_end(ids[best])
+        return self.entries[ids[best]][2], float(similarities[best])
+
+    async def store(self, scope, vector, answer, ttl):
+        now = time.time()
+        # The oldest entries are the first to expire unless they were hit since
+        while self.entries and next(iter(self.entries.values()))[3] <= now:
+            self._remove(next(iter(self.entries)))
+
+        entry_id = uuid.uuid4().hex
+        self.entries[entry_id] = (scope, vector, answer, now + ttl)
+        self.scopes.setdefault(scope, set()).add(entry_id)
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.evictions += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.scopes.clear()
+
+    def size(self):
+        return len(self.entries)
+
+class RedisAnswerStore:
+    """
+    Store shared across workers. Each entry is a Redis key with a native TTL holding the vector and the answer;
+    a per-scope sorted set orders entry ids by last access for LRU eviction.
+    """
+
+    KEY_PREFIX = "answer_cache"
+
+    def __init__(self, url=ANSWER_CACHE_REDIS_URL, max_entries=ANSWER_CACHE_MAX_ENTRIES):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.max_entries = max_entries
+        self.evictions = 0
+
+    def _scope_key(self, scope):
+        return f"{self.KEY_PREFIX}:scope:{scope}"
+
+    def _entry_key(self, entry_id):
+        return f"{self.KEY_PREFIX}:entry:{entry_id}"
+
+    async def lookup(self, scope, vector, threshold):
+        entry_ids = [entry_id.decode() for entry_id in await self.redis.zrange(self._scope_key(scope), 0, -1)]
+        if not entry_ids:
+            return None
+
+        raw_entries = await self.redis.mget([self._entry_key(entry_id) for entry_id in entry_ids])
+        expired = [entry_id for entry_id, raw in zip(entry_ids, raw_entries) if raw is None]
+        if expired:
+            await self.redis.zrem(self._scope_key(scope), *expired)
+
+        live = [(entry_id, json.loads(raw)) for entry_id, raw in zip(entry_ids, raw_entries) if raw is not None]
+        if not live:
+            return None
+
+        similarities = np.array([entry["vector"] for _, entry in live], dtype=np.float32) @ vector
+        best = int(np.argmax(similarities))
+        if similarities[best] < threshold:
+            return None
+
+        await self.redis.zadd(self._scope_key(scope), {live[best][0]: time.time()})
+        return live[best][1]["answer"], float(similarities[best])
+
+    async def store(self, scope, vector, answer, ttl):
+        entry_id = uuid.uuid4().hex
+        entry = json.dumps({"vector": vector.tolist(), "answer": answer}, ensure_ascii=False)
+        scope_key = self._scope_key(scope)
+
+        async with self.redis.pipeline() as pipe:
+            pipe.set(self._entry_key(entry_id), entry, ex=int(ttl))
+            pipe.zadd(scope_key, {entry_id: time.time()})
+            pipe.expire(scope_key, int(ttl))
+            await pipe.execute()
+
+        overflow = await self.redis.zcard(scope_key) - self.max_entries
+        if overflow > 0:
+            evicted = [entry_id.decode() for entry_id, _ in await self.redis.zpopmin(scope_key, overflow)]
+            await self.redis.delete(*[self._entry_key(entry_id) for entry_id in evicted])
+            self.evictions += len(evicted)
+
+    def clear(self):
+        # Scopes include the knowledge base version, so entries from an older build can no longer
+        # be looked up by any worker once it reloads; they expire through their TTL.
+        pass
+
+    def size(self):
+        return None
+
+class AnswerCache:
+    """
+    Front end to an answer store that tracks hit-rate metrics.
+    """
+
+    def __init__(self, store, threshold=ANSWER_CACHE_THRESHOLD, ttl=ANSWER_CACHE_TTL):
+        self.store = store
+        self.threshold = threshold
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    async def lookup(self, embedding, user_info, version=None):
+        """
+        Finds a cached answer for a semantically equivalent question in the user's scope.
+
+        Args:
+            embedding (array-like): Question embedding.
+            user_info (dict): User information sent by the frontend.
+            version (str, optional): Current knowledge base version.
+
+        Returns:
+            str or None: The cached answer, or None on a miss.
+        """
+        try:
+            result = await self.store.lookup(answer_scope(user_info, version), normalize_embedding(embedding), self.threshold)
+        except Exception:
+            logger.exception("Answer cache lookup failed; treating as a miss.")
+            result = None
+
+        if result is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        answer, similarity = result
+        logger.info(f"Answer cache hit (similarity {similarity:.3f}).")
+        return answer
+
+    async def store_answer(self, embedding, user_info, answer, version=None):
+        try:
+            await self.store.store(answer_scope(user_info, version), normalize_embedding(embedding), answer, self.ttl)
+        except Exception:
+            logger.exception("Failed to store answer in cache.")
+
+    def invalidate(self):
+        logger.info("Invalidating answer cache.")
+        self.store.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.store).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": self.store.size(),
+            "evictions": self.store.evictions
+        }
+
+def create_answer_cache(backend=ANSWER_CACHE_BACKEND):
+    """
+    Creates the answer cache configured by ANSWER_CACHE_BACKEND.
+
+    Returns:
+        AnswerCache or None: None when caching is disabled.
+    """
+    if backend == "none":
+        return None
+    if backend == "redis":
+        return AnswerCache(RedisAnswerStore())
+    if backend == "memory":
+        return AnswerCache(MemoryAnswerStore())
+    raise ValueError(f"Unknown answer cache backend '{backend}'. Expected memory, redis or none.")
@@ -1,7 +1,10 @@
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI, DefaultAsyncHttpxClient
 import os
+import asyncio
 import logging
+import time
 from dotenv import load_dotenv
+import httpx
 import numpy as np
 
 load_dotenv()
@@ -9,61 +12,212 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-openai_client = AzureOpenAI(
-    api_key=os.getenv("AZURE_OPENAI_SERVICES_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_SERVICES_URL"),
-    api_version="2024-02-01"
-)
+# Upstream call limits, shared by every request handled by this worker
+OPENAI_MAX_CONCURRENCY = int(os.getenv("OPENAI_MAX_CONCURRENCY", "32"))
+OPENAI_MAX_CONNECTIONS = int(os.getenv("OPENAI_MAX_CONNECTIONS", "64"))
+EMBEDDING_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+# Chunks are self-contained table rows and list items (see chunker.py), and hybrid retrieval puts exact
+# service-name matches first, so a handful of them answers a question
+RETRIEVAL_TOP_K = 8
+COMPLETION_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
 
-# Load the knowledge base at startup
-from data_loader import load_embeddings_from_pickle
-index, knowledge_base_texts = load_embeddings_from_pickle()
+_openai_client = None
+_openai_semaphore = asyncio.Semaphore(OPENAI_MAX_CONCURRENCY)
 
-async def select_relevant_content(question: str, top_k=50):
-    question_embedding_response = openai_client.embeddings.create(
-        model="text-embedding-ada-002",
-        input=question
-    )
+def get_openai_client():
+    """
+    Returns the worker-wide async Azure OpenAI client, creating it on first use.
+    All requests share one pooled HTTP connection pool instead of opening connections per call.
 
-    question_embedding = np.array(question_embedding_response.data[0].embedding).reshape(1, -1)
+    Returns:
+        AsyncAzureOpenAI: The shared client.
+    """
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncAzureOpenAI(
+            api_key=os.getenv("AZURE_OPENAI_SERVICES_KEY"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_SERVICES_URL"),
+            api_version="2024-02-01",
+            http_client=DefaultAsyncHttpxClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_MAX_CONNECTIONS,
+                    max_keepalive_connections=OPENAI_MAX_CONNECTIONS
+                )
+            )
+        )
+    return _openai_client
+
+async def close_openai_client():
+    global _openai_client
+    if _openai_client is not None:
+        await _openai_client.close()
+        _openai_client = None
+
+from data_loader import search_knowledge_base, user_filters, knowledge_base_version, on_knowledge_base_reload
+from answer_cache import create_answer_cache, cacheable_user_info
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_FILE
+from prompt_builder import build_prompt, count_tokens
+from metrics import track_stage, observe_stage, record_prompt_tokens, record_completion_tokens, record_answer
+
+answer_cache = create_answer_cache()
+if answer_cache is not None:
+    on_knowledge_base_reload(answer_cache.invalidate)
+
+# Repeated and concurrent identical questions share one embedding call
+question_embedding_cache = EmbeddingCache("text-embedding-ada-002", file_path=EMBEDDING_CACHE_FILE or None)
+
+async def fetch_question_embedding(question: str) -> list:
+    async with _openai_semaphore:
+        question_embedding_response = await get_openai_client().embeddings.create(
+            model="text-embedding-ada-002",
+            input=question,
+            timeout=EMBEDDING_TIMEOUT
+        )
+
+    return question_embedding_response.data[0].embedding
+
+async def embed_question(question: str) -> np.ndarray:
+    question_embedding = await question_embedding_cache.get_or_compute(question, fetch_question_embedding)
+    return question_embedding.reshape(1, -1)
+
+async def select_relevant_content(question: str, top_k=RETRIEVAL_TOP_K, question_embedding=None, user_info=None):
+    """
+    Retrieves the knowledge base sections for a question. With user information, only general chunks and
+    chunks for the user's HMO and insurance tier are searched, so other HMOs' and tiers' rows never reach the prompt.
 
-    distances, indices = index.search(question_embedding, top_k)
-    relevant_sections = [knowledge_base_texts[i] for i in indices[0]]
+    Args:
+        question (str): The user's question.
+        top_k (int): Number of sections to retrieve.
+        question_embedding (np.ndarray, optional): Precomputed question embedding of shape (1, d).
+        user_info (dict, optional): User information sent by the frontend.
 
-    return "\n\n".join(relevant_sections)
+    Returns:
+        list[str]: The sections, best first.
+    """
+    if question_embedding is None:
+        question_embedding = await embed_question(question)
 
-async def get_answer_from_openai(question: str, user_info: dict, history: list) -> str:
-    relevant_knowledge = await select_relevant_content(question)
+    hmo, tier = user_filters(user_info or {})
+    return search_knowledge_base(question_embedding, top_k, hmo=hmo, tier=tier, query_text=question)
 
-    prompt = f"""
-    You're an assistant specialized in medical services for Israeli HMOs and your name is 'Medical Assitant'. 
-    Use the following Knowledge Base to answer clearly and accurately:
+def use_answer_cache(history: list) -> bool:
+    # Follow-up questions depend on the conversation, so only self-contained first questions are cached
+    return answer_cache is not None and not history
 
-    Knowledge Base:
-    {relevant_knowledge}
+def prompt_user_info(user_info: dict, history: list) -> dict:
+    # Cached answers are served to every user of the same HMO and tier, so they are generated without personal details
+    return cacheable_user_info(user_info) if use_answer_cache(history) else user_info
 
-    User Information: 
-    {user_info}
-    
-    Conversation history:
-    {history}
+async def get_answer_from_openai(question: str, user_info: dict, history: list) -> str:
+    start = time.perf_counter()
+    with track_stage("embed"):
+        question_embedding = await embed_question(question)
+
+    if use_answer_cache(history):
+        with track_stage("cache_lookup"):
+            cached_answer = await answer_cache.lookup(question_embedding, user_info, knowledge_base_version())
+        if cached_answer is not None:
+            record_answer("cache")
+            observe_stage("request", time.perf_counter() - start)
+            return cached_answer
+
+    with track_stage("search"):
+        relevant_sections = await select_relevant_content(question, question_embedding=question_embedding, user_info=user_info)
+    with track_stage("prompt_build"):
+        prompt, token_breakdown = build_prompt(question, prompt_user_info(user_info, history), history, relevant_sections)
+    record_prompt_tokens(token_breakdown)
+    logger.debug("Prompt tokens: %s", token_breakdown)
+    logger.debug("Sending prompt to OpenAI: %.500s...", prompt)
+
+    with track_stage("completion"):
+        async with _openai_semaphore:
+            response = await get_openai_client().chat.completions.create(
+                model="gpt-4o",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.2,
+                max_tokens=1000,
+                timeout=COMPLETION_TIMEOUT
+            )
 
-    Question:
-    {question}
+    answer = response.choices[0].message.content.strip()
+    record_completion_tokens(response.usage.completion_tokens if response.usage else count_tokens(answer))
+    record_answer("completion")
+    logger.debug("Received response from OpenAI: %.500s...", answer)
 
-    Provide a detailed, accurate response based on the knowledge base.
-    """
+    if use_answer_cache(history):
+        await answer_cache.store_answer(question_embedding, user_info, answer, knowledge_base_version())
 
-    logger.info(f"Sending prompt to OpenAI: {prompt[:500]}...")
+    elapsed = time.perf_counter() - start
+    observe_stage("request", elapsed)
+    logger.info(f"Answered in {elapsed:.3f}s.")
+    return answer
 
-    response = openai_client.chat.completions.create(
-        model="gpt-4o",
-        messages=[{"role": "user", "content": prompt}],
-        temperature=0.2,
-        max_tokens=1000
-    )
+async def stream_answer_from_openai(question: str, user_info: dict, history: list):
+    """
+    Streams the answer to a question as completion deltas arrive from Azure OpenAI.
 
-    answer = response.choices[0].message.content.strip()
-    logger.info(f"Received response from OpenAI: {response.choices[0].message.content[:500]}...")
+    Args:
+        question (str): The user's question.
+        user_info (dict): Information collected about the user.
+        history (list): Previous question/answer turns.
 
-    return answer
\ No newline at end of file
+    Yields:
+        str: Consecutive pieces of the answer text.
+    """
+    start = time.perf_counter()
+    first_token_at = None
+    with track_stage("embed"):
+        question_embedding = await embed_question(question)
+
+    if use_answer_cache(history):
+        with track_stage("cache_lookup"):
+            cached_answer = await answer_cache.lookup(question_embedding, user_info, knowledge_base_version())
+        if cached_answer is not None:
+            record_answer("cache")
+            observe_stage("first_token", time.perf_counter() - start)
+            observe_stage("request", time.perf_counter() - start)
+            yield cached_answer
+            return
+
+    with track_stage("search"):
+        relevant_sections = await select_relevant_content(question, question_embedding=question_embedding, user_info=user_info)
+    with track_stage("prompt_build"):
+        prompt, token_breakdown = build_prompt(question, prompt_user_info(user_info, history), history, relevant_sections)
+    record_prompt_tokens(token_breakdown)
+    logger.debug("Prompt tokens: %s", token_breakdown)
+    logger.debug("Streaming prompt to OpenAI: %.500s...", prompt)
+    answer_parts = []
+
+    # Spans cannot stay open across yields, so the streamed completion is timed by hand
+    completion_start = time.perf_counter()
+    async with _openai_semaphore:
+        stream = await get_openai_client().chat.completions.create(
+            model="gpt-4o",
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=1000,
+            timeout=COMPLETION_TIMEOUT,
+            stream=True
+        )
+        async for chunk in stream:
+            # Azure sends content-filter results in chunks without choices
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            if first_token_at is None:
+                first_token_at = time.perf_counter()
+                observe_stage("first_token", first_token_at - start)
+            answer_parts.append(chunk.choices[0].delta.content)
+            yield chunk.choices[0].delta.content
+
+    end = time.perf_counter()
+    answer = "".join(answer_parts).strip()
+    observe_stage("completion", end - completion_start)
+    observe_stage("request", end - start)
+    record_completion_tokens(count_tokens(answer))
+    record_answer("completion")
+
+    ttft = f"{first_token_at - start:.3f}s" if first_token_at else "n/a"
+    logger.info(f"Streamed answer: time to first token {ttft}, total {end - start:.3f}s.")
+
+    if use_answer_cache(history):
+        await answer_cache.store_answer(question_embedding, user_info, answer, knowledge_base_version())
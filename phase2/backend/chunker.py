@@ -0,0 +1,176 @@
+"""
+Module: chunker.py
+
+Purpose:
+Splits the knowledge base HTML files into self-contained retrieval chunks while keeping their structure.
+Splitting `get_text()` on blank lines shreds the benefits tables into orphaned cells, so instead:
+
+- Every table row is expanded into one chunk per HMO column and insurance tier, each carrying the page topic,
+  the table's service column header and the service name, e.g.
+  "מרפאות שיניים | שם השירות: סתימות | מכבי | זהב: 80% הנחה, חומרים מתקדמים".
+- List items that start with an HMO name (phone numbers, links) become one chunk per HMO.
+- Other paragraphs and list items are grouped under their heading and packed up to `max_chars`,
+  with `overlap_chars` of the previous chunk repeated at the start of the next one.
+
+Each chunk has metadata: source file, section (heading path), service, HMO and tier (None when not specific).
+"""
+
+import os
+import re
+from bs4 import BeautifulSoup, NavigableString, Tag
+
+HMO_NAMES = ("מכבי", "מאוחדת", "כללית")
+TIER_NAMES = ("זהב", "כסף", "ארד")
+MAX_CHUNK_CHARS = 800
+CHUNK_OVERLAP_CHARS = 100
+
+_TIER_LINE = re.compile(rf"^({'|'.join(TIER_NAMES)})\s*:\s*(.+)$")
+_HMO_ITEM = re.compile(rf"^({'|'.join(HMO_NAMES)})\s*:\s*(.*)$")
+
+def clean_text(text):
+    return " ".join(text.split())
+
+def make_chunk(text, source, section, service=None, hmo=None, tier=None):
+    return {
+        "text": text,
+        "metadata": {"source": source, "section": section, "service": service, "hmo": hmo, "tier": tier}
+    }
+
+def split_on_breaks(cell):
+    """
+    Splits an element's content into lines at <br> tags.
+
+    Args:
+        cell (Tag): Element to split.
+
+    Returns:
+        list[str]: Non-empty, whitespace-normalized lines.
+    """
+    lines, current = [], []
+    for node in cell.descendants:
+        if isinstance(node, Tag) and node.name == "br":
+            lines.append(clean_text("".join(current)))
+            current = []
+        elif isinstance(node, NavigableString):
+            current.append(str(node))
+    lines.append(clean_text("".join(current)))
+    return [line for line in lines if line]
+
+def pack_text(parts, max_chars, overlap_chars):
+    """
+    Packs text parts into chunks of at most `max_chars`, repeating the tail of each chunk at the start of the next.
+    Parts longer than `max_chars` are split on word boundaries.
+
+    Args:
+        parts (list[str]): Paragraphs or list items, in order.
+        max_chars (int): Maximum chunk length.
+        overlap_chars (int): Number of trailing characters carried into the next chunk.
+
+    Returns:
+        list[str]: Chunk texts.
+    """
+    words = []
+    for part in parts:
+        words.extend(part.split())
+        words.append("\n")
+
+    chunks, current = [], ""
+    for word in words:
+        separator = "" if not current or current.endswith("\n") or word == "\n" else " "
+        if current.strip() and len(current) + len(separator) + len(word) > max_chars:
+            chunks.append(current.strip())
+            tail = current[-overlap_chars:] if overlap_chars else ""
+            current = tail[tail.find(" ") + 1:] if " " in tail else tail
+            separator = " " if current and not current.endswith("\n") else ""
+        current += separator + word
+
+    if current.strip():
+        chunks.append(current.strip())
+    return chunks
+
+def chunk_table(table, source, topic):
+    rows = table.find_all("tr")
+    if not rows:
+        return []
+
+    header = [clean_text(cell.get_text(" ")) for cell in rows[0].find_all(["th", "td"])]
+    service_label = header[0] if header else ""
+    chunks = []
+
+    for row in rows[1:]:
+        cells = row.find_all("td")
+        if not cells:
+            continue
+        service = clean_text(cells[0].get_text(" "))
+        context = f"{topic} | {service_label}: {service}"
+
+        for column, cell in zip(header[1:], cells[1:]):
+            hmo = column if column in HMO_NAMES else None
+            lines = split_on_breaks(cell)
+            tier_lines = [_TIER_LINE.match(line) for line in lines]
+
+            if lines and all(tier_lines):
+                for match in tier_lines:
+                    tier, value = match.groups()
+                    chunks.append(make_chunk(f"{context} | {column} | {tier}: {value}", source, topic, service, hmo, tier))
+            elif lines:
+                chunks.append(make_chunk(f"{context} | {column}: {' '.join(lines)}", source, topic, service, hmo))
+    return chunks
+
+def chunk_html(html, source, max_chars=MAX_CHUNK_CHARS, overlap_chars=CHUNK_OVERLAP_CHARS):
+    """
+    Splits one knowledge base HTML document into structured chunks.
+
+    Args:
+        html (str): HTML content.
+        source (str): Source file name recorded in the chunk metadata.
+        max_chars (int): Maximum length of prose chunks.
+        overlap_chars (int): Overlap between consecutive prose chunks.
+
+    Returns:
+        list[dict]: Chunks with "text" and "metadata" keys, in document order.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    root = soup.body or soup
+
+    chunks = []
+    topic, heading = "", ""
+    prose = []
+
+    def flush_prose():
+        section = f"{topic} | {heading}" if heading else topic
+        prefix = f"{section}\n" if section else ""
+        for text in pack_text(prose, max_chars - len(prefix), overlap_chars):
+            chunks.append(make_chunk(prefix + text, source, section))
+        prose.clear()
+
+    for element in root.find_all(recursive=False):
+        if element.name in ("h1", "h2"):
+            flush_prose()
+            topic, heading = clean_text(element.get_text(" ")), ""
+        elif element.name in ("h3", "h4", "h5", "h6"):
+            flush_prose()
+            heading = clean_text(element.get_text(" ")).rstrip(":")
+        elif element.name == "table":
+            flush_prose()
+            chunks.extend(chunk_table(element, source, topic))
+        elif element.name in ("ul", "ol"):
+            section = f"{topic} | {heading}" if heading else topic
+            for item in element.find_all("li", recursive=False):
+                text = " ".join(split_on_breaks(item))
+                match = _HMO_ITEM.match(text)
+                if match:
+                    chunks.append(make_chunk(f"{section}\n{text}", source, section, hmo=match.group(1)))
+                elif text:
+                    prose.append(f"- {text}")
+        else:
+            text = clean_text(element.get_text(" "))
+            if text:
+                prose.append(text)
+
+    flush_prose()
+    return chunks
+
+def chunk_html_file(file_path, max_chars=MAX_CHUNK_CHARS, overlap_chars=CHUNK_OVERLAP_CHARS):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return chunk_html(file.read(), os.path.basename(file_path), max_chars, overlap_chars)
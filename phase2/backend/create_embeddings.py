@@ -2,15 +2,22 @@
 Script: create_embeddings.py
 
 Purpose:
-This script generates embeddings for text extracted from HTML files located in the specified `DATA_DIR`. It uses the Azure OpenAI embedding model (text-embedding-ada-002) to convert text sections into vector representations suitable for similarity search or retrieval tasks. These embeddings are stored persistently in a pickle file (`knowledge_base_embeddings.pkl`), enabling efficient retrieval of relevant content during runtime.
+This script generates embeddings for text extracted from HTML files located in the specified `DATA_DIR`. It uses the Azure OpenAI embedding model (text-embedding-ada-002) to convert text sections into vector representations suitable for similarity search or retrieval tasks. These embeddings are stored persistently in a memory-mappable store file (`knowledge_base_embeddings.kb`, see `embedding_store.py`), enabling efficient retrieval of relevant content during runtime.
 
 Functionality:
 - Iterates over all `.html` files within the `DATA_DIR` directory.
-- Parses each HTML file and extracts text sections using BeautifulSoup.
-- Generates embeddings for each text section using the Azure OpenAI embedding model.
-- Saves the generated embeddings along with their corresponding texts to `knowledge_base_embeddings.pkl`.
+- Splits each HTML file into structure-aware chunks (see `chunker.py`): one chunk per table row, HMO and tier,
+  one per HMO-specific list item, and size-bounded prose chunks, each with source/section/HMO/tier metadata.
+- Packs sections into batched embedding requests bounded by `MAX_BATCH_SIZE` inputs and `MAX_BATCH_TOKENS` estimated tokens.
+- Sends the batches through a bounded pool of `MAX_CONCURRENCY` async workers, retrying with exponential backoff on HTTP 429 and transient errors.
+- Streams each finished batch to a `.partial` file, then writes the ordered embeddings, texts and metadata to `knowledge_base_embeddings.kb`.
+- Resumes an interrupted build from its `.partial` file: sections embedded before the interruption are not embedded again.
+- Records a content hash per section (keyed together with the embedding model) in the store.
 
-Running the script again will overwrite the existing embeddings file.
+By default, running the script again is incremental: sections whose hash is already in the store reuse their stored
+vectors, only new or changed sections are embedded, and sections that no longer exist are dropped. Pass `--full` to
+re-embed everything. A running backend picks up the rebuilt store through `POST /admin/reload-knowledge-base` (with the
+backend's ADMIN_TOKEN in the `X-Admin-Token` header), which also invalidates its answer cache.
 
 Dependencies:
 - Azure OpenAI Python SDK
@@ -20,22 +27,41 @@ Dependencies:
 Make sure the `.env` file includes correct Azure OpenAI credentials:
 - AZURE_OPENAI_SERVICES_KEY
 - AZURE_OPENAI_SERVICES_URL
+
+To benchmark rebuild throughput offline, run `benchmarks/bench_embeddings.py`, which points this script at a local mock endpoint.
 """
 
 import os
+import argparse
+import asyncio
 import logging
 import pickle
-from bs4 import BeautifulSoup
+import random
+import time
 import numpy as np
 import faiss
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AzureOpenAI, AsyncAzureOpenAI, RateLimitError, APIConnectionError, APITimeoutError, InternalServerError
+from embedding_store import open_store, write_store, section_key
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_FILE
+from chunker import chunk_html_file, MAX_CHUNK_CHARS, CHUNK_OVERLAP_CHARS
 
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 
 DATA_DIR = "../phase2_data"
-EMBEDDINGS_FILE = "knowledge_base_embeddings.pkl"
+EMBEDDINGS_FILE = "knowledge_base_embeddings.kb"
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Azure caps a single embeddings request at 16 inputs and ada-002 at 8191 tokens per request.
+MAX_BATCH_SIZE = 16
+MAX_BATCH_TOKENS = 8000
+MAX_CONCURRENCY = 8
+MAX_RETRIES = 6
+BACKOFF_BASE_SECONDS = 0.5
+BACKOFF_MAX_SECONDS = 30.0
+
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, APITimeoutError, InternalServerError)
 
 openai_client = AzureOpenAI(
     api_key=os.getenv("AZURE_OPENAI_SERVICES_KEY"),
@@ -45,39 +71,316 @@ openai_client = AzureOpenAI(
 
 def get_embedding(text):
     response = openai_client.embeddings.create(
-        model="text-embedding-ada-002",
+        model=EMBEDDING_MODEL,
         input=text
     )
     return response.data[0].embedding
 
-def create_and_save_embeddings():
-    logging.info("Starting embeddings creation from HTML files...")
-    knowledge_base_embeddings = []
-    knowledge_base_texts = []
+def create_async_client():
+    # Retries are handled by `embed_batch` so that backoff is shared across the worker pool.
+    return AsyncAzureOpenAI(
+        api_key=os.getenv("AZURE_OPENAI_SERVICES_KEY"),
+        azure_endpoint=os.getenv("AZURE_OPENAI_SERVICES_URL"),
+        api_version="2024-02-01",
+        max_retries=0
+    )
+
+def estimate_tokens(text):
+    """
+    Conservatively estimates the token count of a text without a tokenizer.
+
+    Hebrew characters take two UTF-8 bytes and usually about one token each, while English averages
+    about four characters per token, so half the UTF-8 byte length over-estimates both.
+
+    Args:
+        text (str): Text to measure.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return len(text.encode("utf-8")) // 2 + 1
+
+def load_previous_build(output_file):
+    """
+    Loads the vectors of a previous build, keyed by section hash.
+
+    Args:
+        output_file (str): Path of the store written by the previous build.
+
+    Returns:
+        dict: Mapping of section key to embedding. Empty if there is no usable previous build.
+    """
+    if not os.path.exists(output_file):
+        return {}
+
+    try:
+        store = open_store(output_file)
+    except ValueError as e:
+        logging.warning(f"Ignoring the previous build: {e}")
+        return {}
+    if store.model != EMBEDDING_MODEL:
+        logging.info(f"Previous build used {store.model}; re-embedding everything with {EMBEDDING_MODEL}.")
+        return {}
+    return {key: np.array(store.embeddings[i]) for key, i in store.key_index().items()}
+
+def load_partial_build(partial_path):
+    """
+    Loads the batches streamed to the `.partial` file of an interrupted build.
 
-    for filename in os.listdir(DATA_DIR):
+    Args:
+        partial_path (str): Path of the `.partial` file.
+
+    Returns:
+        dict: Mapping of section key to embedding. A batch cut off by the interruption is ignored.
+    """
+    vectors = {}
+    if not os.path.exists(partial_path):
+        return vectors
+
+    with open(partial_path, "rb") as f:
+        while True:
+            try:
+                keys, embeddings = pickle.load(f)
+            except EOFError:
+                break
+            except (pickle.UnpicklingError, ValueError, TypeError):
+                logging.warning(f"Ignoring the truncated end of {partial_path}.")
+                break
+            vectors.update(zip(keys, embeddings))
+    return vectors
+
+def collect_sections(data_dir=DATA_DIR, max_chars=MAX_CHUNK_CHARS, overlap_chars=CHUNK_OVERLAP_CHARS):
+    """
+    Chunks every HTML file in a directory with the structure-aware chunker.
+
+    Args:
+        data_dir (str): Directory containing the knowledge base HTML files.
+        max_chars (int): Maximum length of prose chunks.
+        overlap_chars (int): Overlap between consecutive prose chunks.
+
+    Returns:
+        tuple: (texts, metadata) for all chunks, ordered by file name and then by position in the file.
+    """
+    texts, metadata = [], []
+    for filename in sorted(os.listdir(data_dir)):
         if filename.endswith(".html"):
-            logging.info(f"Processing file: {filename}")
-            with open(os.path.join(DATA_DIR, filename), "r", encoding="utf-8") as file:
-                soup = BeautifulSoup(file, "html.parser")
-                sections = soup.get_text(separator="\n").split("\n\n")
-                for section in sections:
-                    cleaned_section = section.strip()
-                    if cleaned_section:
-                        embedding = openai_client.embeddings.create(
-                            model="text-embedding-ada-002",
-                            input=cleaned_section
-                        ).data[0].embedding
-                        knowledge_base_embeddings.append(embedding)
-                        knowledge_base_texts.append(cleaned_section)
-            logging.info(f"Processed {filename}, extracted {len(knowledge_base_texts)} sections.")
-
-    # Save embeddings
-    with open(EMBEDDINGS_FILE, "wb") as f:
-        pickle.dump((knowledge_base_embeddings, knowledge_base_texts), f)
-
-    logging.info(f"Saved {len(knowledge_base_texts)} embeddings successfully.")
+            chunks = chunk_html_file(os.path.join(data_dir, filename), max_chars, overlap_chars)
+            texts.extend(chunk["text"] for chunk in chunks)
+            metadata.extend(chunk["metadata"] for chunk in chunks)
+            logging.info(f"Processed {filename}, extracted {len(chunks)} chunks.")
+    return texts, metadata
+
+def pack_batches(texts, max_batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    """
+    Greedily packs texts into embedding requests without exceeding the per-request limits.
+
+    Args:
+        texts (list[str]): Texts to embed.
+        max_batch_size (int): Maximum number of inputs per request.
+        max_batch_tokens (int): Maximum estimated tokens per request.
+
+    Returns:
+        list[list[int]]: Batches of indices into `texts`.
+    """
+    batches = []
+    current, current_tokens = [], 0
+
+    for i, text in enumerate(texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_batch_size or current_tokens + tokens > max_batch_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += tokens
+
+    if current:
+        batches.append(current)
+    return batches
+
+def backoff_delay(attempt, error=None):
+    """
+    Computes how long to wait before retrying a failed request.
+
+    Honors the `retry-after-ms` / `retry-after` headers sent with Azure 429 responses and
+    otherwise falls back to exponential backoff with full jitter.
+
+    Args:
+        attempt (int): Zero-based retry attempt.
+        error (Exception, optional): The error that triggered the retry.
+
+    Returns:
+        float: Delay in seconds.
+    """
+    response = getattr(error, "response", None)
+    if response is not None:
+        try:
+            if "retry-after-ms" in response.headers:
+                return float(response.headers["retry-after-ms"]) / 1000
+            if "retry-after" in response.headers:
+                return float(response.headers["retry-after"])
+        except ValueError:
+            pass
+
+    return random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2 ** attempt))
+
+async def embed_batch(client, texts, model=EMBEDDING_MODEL, max_retries=MAX_RETRIES):
+    """
+    Embeds a batch of texts in a single request, retrying rate-limited and transient failures.
+
+    Args:
+        client (AsyncAzureOpenAI): Client used for the request.
+        texts (list[str]): Texts to embed.
+        model (str): Embedding deployment name.
+        max_retries (int): Retries before the error is raised.
+
+    Returns:
+        list[list[float]]: One embedding per text, in input order.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            response = await client.embeddings.create(model=model, input=texts)
+            return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+        except RETRYABLE_ERRORS as e:
+            if attempt == max_retries:
+                raise
+            delay = backoff_delay(attempt, e)
+            logging.warning(f"Embedding request failed ({type(e).__name__}), retrying in {delay:.2f}s.")
+            await asyncio.sleep(delay)
+
+async def embed_texts(texts, client=None, partial_path=None, keys=None, max_concurrency=MAX_CONCURRENCY,
+                      max_batch_size=MAX_BATCH_SIZE, max_batch_tokens=MAX_BATCH_TOKENS):
+    """
+    Embeds texts through a bounded pool of async workers.
+
+    Each finished batch is appended to `partial_path` with the section keys of its texts as soon as it completes,
+    so a crash mid-run still leaves the work done so far on disk for `load_partial_build`.
+
+    Args:
+        texts (list[str]): Texts to embed.
+        client (AsyncAzureOpenAI, optional): Client to use. Created from the environment if omitted.
+        partial_path (str, optional): File that finished batches are appended to.
+        keys (list[str], optional): Section keys of the texts, recorded in `partial_path`. Required with it.
+        max_concurrency (int): Number of concurrent workers.
+        max_batch_size (int): Maximum number of inputs per request.
+        max_batch_tokens (int): Maximum estimated tokens per request.
+
+    Returns:
+        list[list[float]]: One embedding per text, in input order.
+    """
+    client = client or create_async_client()
+    batches = pack_batches(texts, max_batch_size, max_batch_tokens)
+    embeddings = [None] * len(texts)
+
+    queue = asyncio.Queue()
+    for batch in batches:
+        queue.put_nowait(batch)
+
+    partial_file = open(partial_path, "ab") if partial_path else None
+
+    async def worker():
+        while True:
+            try:
+                batch = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            vectors = await embed_batch(client, [texts[i] for i in batch])
+            for i, vector in zip(batch, vectors):
+                embeddings[i] = vector
+            if partial_file:
+                pickle.dump(([keys[i] for i in batch], vectors), partial_file)
+                partial_file.flush()
+
+    logging.info(f"Embedding {len(texts)} sections in {len(batches)} batches with {max_concurrency} workers...")
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(max_concurrency, len(batches)))))
+    finally:
+        if partial_file:
+            partial_file.close()
+
+    return embeddings
+
+async def create_and_save_embeddings_async(data_dir=DATA_DIR, output_file=EMBEDDINGS_FILE, client=None,
+                                           max_concurrency=MAX_CONCURRENCY, max_batch_size=MAX_BATCH_SIZE,
+                                           incremental=True, cache_file=EMBEDDING_CACHE_FILE,
+                                           max_chars=MAX_CHUNK_CHARS, overlap_chars=CHUNK_OVERLAP_CHARS):
+    logging.info("Starting embeddings creation from HTML files...")
+    start = time.perf_counter()
+
+    knowledge_base_texts, knowledge_base_metadata = collect_sections(data_dir, max_chars, overlap_chars)
+    keys = [section_key(text, EMBEDDING_MODEL) for text in knowledge_base_texts]
+
+    previous = load_previous_build(output_file) if incremental else {}
+    knowledge_base_embeddings = [previous.get(key) for key in keys]
+
+    # Batches finished by an interrupted build; a full rebuild starts over
+    partial_path = output_file + ".partial"
+    if incremental:
+        resumed = load_partial_build(partial_path)
+        if resumed:
+            logging.info(f"Resuming an interrupted build with {len(resumed)} embedded sections.")
+        knowledge_base_embeddings = [
+            resumed.get(key) if embedding is None else embedding for key, embedding in zip(keys, knowledge_base_embeddings)
+        ]
+    elif os.path.exists(partial_path):
+        os.remove(partial_path)
+    # Vectors computed earlier by the backend or by previous builds are shared through the embedding cache
+    cache = EmbeddingCache(EMBEDDING_MODEL, file_path=cache_file or None)
+    if incremental:
+        for i, embedding in enumerate(knowledge_base_embeddings):
+            if embedding is None:
+                knowledge_base_embeddings[i] = cache.get(knowledge_base_texts[i])
+
+    missing = [i for i, embedding in enumerate(knowledge_base_embeddings) if embedding is None]
+    dropped = len(set(previous) - set(keys))
+    logging.info(
+        f"Reusing {len(keys) - len(missing)} stored or cached embeddings, embedding {len(missing)} new or changed "
+        f"sections, dropping {dropped} deleted sections."
+    )
+
+    if missing:
+        owns_client = client is None
+        client = client or create_async_client()
+        try:
+            new_embeddings = await embed_texts(
+                [knowledge_base_texts[i] for i in missing],
+                client=client,
+                partial_path=partial_path,
+                keys=[keys[i] for i in missing],
+                max_concurrency=max_concurrency,
+                max_batch_size=max_batch_size
+            )
+        finally:
+            if owns_client:
+                await client.close()
+        for i, embedding in zip(missing, new_embeddings):
+            knowledge_base_embeddings[i] = embedding
+            cache.put(knowledge_base_texts[i], embedding)
+        cache.save()
+
+    write_store(output_file, knowledge_base_embeddings, knowledge_base_texts, keys, EMBEDDING_MODEL, knowledge_base_metadata)
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    logging.info(f"Saved {len(knowledge_base_texts)} embeddings successfully in {time.perf_counter() - start:.2f}s.")
+    return len(missing)
+
+def create_and_save_embeddings(**kwargs):
+    return asyncio.run(create_and_save_embeddings_async(**kwargs))
 
 # Run this function separately to build embeddings once
 if __name__ == "__main__":
-    create_and_save_embeddings()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Build the knowledge base embeddings file.")
+    parser.add_argument("--concurrency", type=int, default=MAX_CONCURRENCY, help="Number of concurrent embedding requests.")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE, help="Maximum sections per embedding request.")
+    parser.add_argument("--full", action="store_true", help="Re-embed every section instead of reusing unchanged ones.")
+    parser.add_argument("--chunk-size", type=int, default=MAX_CHUNK_CHARS, help="Maximum characters per prose chunk.")
+    parser.add_argument("--chunk-overlap", type=int, default=CHUNK_OVERLAP_CHARS, help="Characters repeated between prose chunks.")
+    args = parser.parse_args()
+
+    create_and_save_embeddings(
+        max_concurrency=args.concurrency,
+        max_batch_size=args.batch_size,
+        incremental=not args.full,
+        max_chars=args.chunk_size,
+        overlap_chars=args.chunk_overlap
+    )
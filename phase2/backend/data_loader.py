@@ -1,13 +1,57 @@
+import os
 import pickle
 import faiss
 import numpy as np
 import logging
+import resource
+import threading
+import time
+from embedding_store import open_store
+from vector_index import load_or_build_index, configure_search, store_fingerprint, filtered_search_params
+from chunker import HMO_NAMES, TIER_NAMES
+from lexical_index import BM25Index, reciprocal_rank_fusion
 
 logging.basicConfig(level=logging.INFO)
 
+EMBEDDINGS_FILE = "knowledge_base_embeddings.kb"
+INDEX_TYPE = os.getenv("KB_INDEX_TYPE", "flat")
+NPROBE = int(os.getenv("KB_NPROBE", "8"))
+EF_SEARCH = int(os.getenv("KB_EF_SEARCH", "64"))
+# Hybrid retrieval: BM25 and vector candidates fused with reciprocal rank fusion, optionally reranked
+HYBRID_SEARCH = os.getenv("KB_HYBRID", "1") == "1"
+RERANK = os.getenv("KB_RERANK", "0") == "1"
+HYBRID_CANDIDATES = int(os.getenv("KB_HYBRID_CANDIDATES", "30"))
+RERANK_LEXICAL_WEIGHT = 0.1
+
+def load_embeddings(file_path=EMBEDDINGS_FILE, index_type=INDEX_TYPE, nprobe=NPROBE, ef_search=EF_SEARCH, store=None):
+    """
+    Opens the memory-mapped embedding store and initializes a FAISS vector index over it.
+
+    The float32 matrix is handed to FAISS straight from the memory map, so the only in-process copy
+    is the one held by the index itself, and texts are decoded from the shared mapping on access.
+
+    Args:
+        file_path (str): Path to the embedding store written by create_embeddings.py.
+        index_type (str): Index backend, one of vector_index.INDEX_TYPES.
+        nprobe (int): IVF clusters searched per query.
+        ef_search (int): HNSW candidate list size.
+        store (EmbeddingStore, optional): The store already opened from `file_path`, to avoid mapping it twice.
+
+    Returns:
+        index (faiss.Index): FAISS index for efficient vector searches.
+        texts (TextBlob): Corresponding text segments for embeddings.
+    """
+    store = store or open_store(file_path)
+    index = load_or_build_index(store, file_path, index_type)
+    configure_search(index, nprobe=nprobe, ef_search=ef_search)
+
+    logging.info(f"Loaded {store.count} embeddings into FAISS index.")
+    return index, store.texts
+
 def load_embeddings_from_pickle(file_path="knowledge_base_embeddings.pkl"):
     """
-    Loads pre-generated embeddings from a pickle file and initializes a FAISS vector index.
+    Loads pre-generated embeddings from a legacy pickle file and initializes a FAISS vector index.
+    New builds are written as embedding stores; use `load_embeddings` for those.
 
     Args:
         file_path (str): Path to the pickle file with embeddings.
@@ -27,8 +71,318 @@ def load_embeddings_from_pickle(file_path="knowledge_base_embeddings.pkl"):
     logging.info(f"Loaded {len(texts)} embeddings into FAISS index.")
     return index, texts
 
-# Load embeddings only once at startup
-index, knowledge_base_texts = load_embeddings_from_pickle("knowledge_base_embeddings.pkl")
+class MetadataFilter:
+    """
+    Row ids of the chunks that apply to each HMO and insurance tier.
+
+    A chunk applies to a user when its HMO and tier are either unset (general content) or equal to the user's.
+    The id lists, and the FAISS search parameters built from them, are computed once per (HMO, tier) and reused.
+    """
+
+    def __init__(self, metadata):
+        self.hmos = np.array([item.get("hmo") or "" for item in metadata], dtype=object)
+        self.tiers = np.array([item.get("tier") or "" for item in metadata], dtype=object)
+        self._params = {}
+        self._masks = {}
+
+    def ids(self, hmo=None, tier=None):
+        """
+        Args:
+            hmo (str, optional): HMO name; None keeps chunks of every HMO.
+            tier (str, optional): Insurance tier; None keeps chunks of every tier.
+
+        Returns:
+            np.ndarray: Sorted int64 row ids of the matching chunks.
+        """
+        mask = np.ones(len(self.hmos), dtype=bool)
+        if hmo:
+            mask &= (self.hmos == "") | (self.hmos == hmo)
+        if tier:
+            mask &= (self.tiers == "") | (self.tiers == tier)
+        return np.flatnonzero(mask).astype(np.int64)
+
+    def mask(self, hmo=None, tier=None):
+        """
+        Returns:
+            np.ndarray: Boolean mask of the matching chunks.
+        """
+        key = (hmo or "", tier or "")
+        if key not in self._masks:
+            mask = np.zeros(len(self.hmos), dtype=bool)
+            mask[self.ids(hmo, tier)] = True
+            self._masks[key] = mask
+        return self._masks[key]
+
+    def search_params(self, index, hmo=None, tier=None):
+        """
+        Returns:
+            faiss.SearchParameters or None: Parameters restricting a search to the matching chunks,
+            or None when no chunk is excluded.
+        """
+        key = (hmo or "", tier or "")
+        if key not in self._params:
+            ids = self.ids(hmo, tier)
+            self._params[key] = filtered_search_params(index, ids) if len(ids) < len(self.hmos) else None
+        return self._params[key]
+
+def user_filters(user_info):
+    """
+    Extracts the retrieval filters from the user information sent by the frontend.
+    Values that are not a known HMO or tier name are ignored rather than filtering everything out.
+
+    Args:
+        user_info (dict): User information sent by the frontend.
+
+    Returns:
+        tuple: (hmo, tier), each a name from chunker.HMO_NAMES / TIER_NAMES or None.
+    """
+    hmo = str(user_info.get("hmo_name", "")).strip()
+    tier = str(user_info.get("insurance_tier", user_info.get("insurance_membership", ""))).strip()
+    return (hmo if hmo in HMO_NAMES else None), (tier if tier in TIER_NAMES else None)
+
+# Process-wide knowledge base, loaded once on first use or by `warm_up()` from the app lifespan
+_knowledge_base = None
+_metadata_filter = None
+_lexical_index = None
+_store = None
+_knowledge_base_lock = threading.Lock()
+_load_stats = {"ready": False, "load_time_seconds": None, "embeddings": 0, "version": None, "error": None}
+_reload_hooks = []
+
+def current_rss_mb():
+    """
+    Returns:
+        float: Resident set size of this process in MB (peak RSS where /proc is unavailable).
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def load_knowledge_base(file_path=EMBEDDINGS_FILE):
+    """
+    Loads a knowledge base without installing it as the process-wide one.
+
+    Args:
+        file_path (str): Path to the embedding store.
+
+    Returns:
+        tuple: (parts, stats): the (index, texts), metadata filter, lexical index and store, and the load statistics.
+    """
+    start = time.perf_counter()
+    # One mapping of the file backs the index, the filters and the version fingerprint
+    store = open_store(file_path)
+    knowledge_base = load_embeddings(file_path, store=store)
+    parts = (knowledge_base, MetadataFilter(store.metadata), BM25Index(store.texts), store)
+    stats = {
+        "ready": True,
+        "load_time_seconds": round(time.perf_counter() - start, 4),
+        "embeddings": knowledge_base[0].ntotal,
+        "version": store_fingerprint(store),
+        "error": None
+    }
+    return parts, stats
+
+def install_knowledge_base(parts, stats):
+    # Callers hold _knowledge_base_lock
+    global _knowledge_base, _metadata_filter, _lexical_index, _store
+    _knowledge_base, _metadata_filter, _lexical_index, _store = parts
+    _load_stats.update(stats)
+
+def get_knowledge_base(file_path=EMBEDDINGS_FILE):
+    """
+    Returns the process-wide FAISS index and texts, loading them on first use.
+    Concurrent first callers wait on a lock so the store is only loaded once per process.
+
+    Args:
+        file_path (str): Path to the embedding store, used only by the call that performs the load.
+
+    Returns:
+        tuple: (index, texts) as returned by `load_embeddings`.
+    """
+    if _knowledge_base is not None:
+        return _knowledge_base
+
+    with _knowledge_base_lock:
+        if _knowledge_base is None:
+            try:
+                loaded = load_knowledge_base(file_path)
+            except Exception as e:
+                _load_stats.update(ready=False, error=f"{type(e).__name__}: {e}")
+                raise
+            install_knowledge_base(*loaded)
+    return _knowledge_base
+
+def warm_up(file_path=EMBEDDINGS_FILE):
+    """
+    Eagerly loads the knowledge base so the first request does not pay for it.
+    Failures are logged and reported by `knowledge_base_status` instead of being raised.
+
+    Args:
+        file_path (str): Path to the embedding store.
+
+    Returns:
+        dict: The knowledge base status after the attempt.
+    """
+    try:
+        get_knowledge_base(file_path)
+        logging.info(f"Knowledge base ready in {_load_stats['load_time_seconds']}s.")
+    except Exception:
+        logging.exception("Failed to load the knowledge base.")
+    return knowledge_base_status()
+
+def release_knowledge_base():
+    global _knowledge_base, _metadata_filter, _lexical_index, _store
+    with _knowledge_base_lock:
+        _knowledge_base = None
+        _metadata_filter = None
+        _lexical_index = None
+        _store = None
+        _load_stats.update(ready=False, load_time_seconds=None, embeddings=0, version=None)
+
+def on_knowledge_base_reload(hook):
+    """
+    Registers a callable to run after the knowledge base is reloaded, e.g. to invalidate caches
+    that hold answers derived from the previous build.
+
+    Args:
+        hook (callable): Called with no arguments.
+    """
+    _reload_hooks.append(hook)
+
+def reload_knowledge_base(file_path=EMBEDDINGS_FILE):
+    """
+    Swaps in a rebuilt knowledge base and fires the reload hooks.
+
+    The new store is loaded while the current knowledge base keeps serving requests, and only replaces it once it
+    loaded successfully. If the load fails, the current knowledge base stays in place, the error is reported in the
+    status and the hooks are not fired, so caches derived from it are kept.
+
+    Args:
+        file_path (str): Path to the embedding store.
+
+    Returns:
+        dict: The knowledge base status after the reload; `error` is set if the reload failed.
+    """
+    try:
+        loaded = load_knowledge_base(file_path)
+    except Exception as e:
+        logging.exception("Failed to reload the knowledge base; keeping the current one.")
+        _load_stats.update(error=f"{type(e).__name__}: {e}")
+        return knowledge_base_status()
+
+    with _knowledge_base_lock:
+        install_knowledge_base(*loaded)
+    logging.info(f"Knowledge base reloaded in {_load_stats['load_time_seconds']}s.")
+    for hook in _reload_hooks:
+        hook()
+    return knowledge_base_status()
+
+def knowledge_base_version():
+    """
+    Returns:
+        str: Fingerprint of the loaded store's sections, or None if nothing is loaded.
+    """
+    return _load_stats["version"]
+
+def knowledge_base_status():
+    """
+    Returns:
+        dict: Whether the knowledge base is loaded, how long the load took, its size, and current process memory.
+    """
+    return {**_load_stats, "rss_mb": round(current_rss_mb(), 1)}
+
+def rerank(ids, query_embedding, query_text):
+    """
+    Reorders candidates by exact cosine similarity to the query plus a small bonus for the fraction of query terms
+    they contain. Exact similarity corrects the ordering of approximate indexes and of fused lists, where ranks
+    from the two retrievers are not comparable scores.
+
+    Args:
+        ids (list[int]): Candidate row ids.
+        query_embedding (np.ndarray): Query vector of shape (1, d).
+        query_text (str): Query text.
+
+    Returns:
+        list[int]: The candidates, best first.
+    """
+    if not ids:
+        return ids
+    vectors = np.asarray(_store.embeddings[ids], dtype=np.float32)
+    query = query_embedding.reshape(-1) / np.linalg.norm(query_embedding)
+    similarities = vectors @ query / np.maximum(np.linalg.norm(vectors, axis=1), 1e-12)
+
+    scores = similarities + RERANK_LEXICAL_WEIGHT * _lexical_index.coverage(query_text, ids)
+    return [ids[i] for i in np.argsort(-scores, kind="stable")]
+
+def retrieve(query_embedding, top_k, hmo=None, tier=None, query_text=None, hybrid=HYBRID_SEARCH, rerank_results=RERANK):
+    """
+    Finds the row ids of the knowledge base chunks most relevant to a query.
+
+    The vector search is restricted to the chunks that apply to the HMO and insurance tier inside FAISS. With
+    `hybrid` and a query text, the top HYBRID_CANDIDATES of the vector and BM25 searches are fused with reciprocal
+    rank fusion; with `rerank_results` the fused candidates are reordered by `rerank` before the top k are kept.
+
+    Args:
+        query_embedding (np.ndarray): float32 query vector of shape (1, d).
+        top_k (int): Number of chunks to return.
+        hmo (str, optional): Restrict to general chunks and chunks of this HMO.
+        tier (str, optional): Restrict to general chunks and chunks of this tier.
+        query_text (str, optional): Query text for the lexical search and the reranker.
+        hybrid (bool): Fuse BM25 results with the vector results.
+        rerank_results (bool): Rerank the candidates.
+
+    Returns:
+        list[int]: Row ids, best first.
+    """
+    index, _ = get_knowledge_base()
+    use_text = query_text is not None and (hybrid or rerank_results)
+    candidates = max(top_k, HYBRID_CANDIDATES) if use_text else top_k
+
+    params = _metadata_filter.search_params(index, hmo, tier) if hmo or tier else None
+    distances, indices = index.search(query_embedding, candidates, params=params)
+    # Approximate indexes return -1 when fewer than the requested allowed rows were reached
+    ids = [int(i) for i in indices[0] if i >= 0]
+
+    if use_text and hybrid:
+        allowed = _metadata_filter.mask(hmo, tier) if hmo or tier else None
+        lexical_ids, _ = _lexical_index.search(query_text, candidates, allowed=allowed)
+        ids = reciprocal_rank_fusion([ids, lexical_ids])
+    if use_text and rerank_results:
+        ids = rerank(ids, query_embedding, query_text)
+    return ids[:top_k]
+
+def lexical_search(query_text, top_k, hmo=None, tier=None):
+    """
+    BM25-only search, used to evaluate the lexical retriever on its own.
+
+    Returns:
+        list[int]: Row ids, best first.
+    """
+    get_knowledge_base()
+    allowed = _metadata_filter.mask(hmo, tier) if hmo or tier else None
+    ids, _ = _lexical_index.search(query_text, top_k, allowed=allowed)
+    return [int(i) for i in ids]
+
+def search_knowledge_base(query_embedding, top_k, hmo=None, tier=None, query_text=None):
+    """
+    Searches the knowledge base, optionally restricted to the chunks that apply to an HMO and insurance tier.
+    The restriction is applied inside the FAISS search, so all `top_k` results come from the allowed chunks.
+    See `retrieve` for the hybrid lexical search enabled by passing the query text.
+
+    Args:
+        query_embedding (np.ndarray): float32 query vector of shape (1, d).
+        top_k (int): Number of sections to return.
+        hmo (str, optional): Restrict to general chunks and chunks of this HMO.
+        tier (str, optional): Restrict to general chunks and chunks of this tier.
+        query_text (str, optional): Query text for hybrid retrieval.
+
+    Returns:
+        list[str]: Most relevant sections, best first.
+    """
+    _, knowledge_base_texts = get_knowledge_base()
+    return [knowledge_base_texts[i] for i in retrieve(query_embedding, top_k, hmo, tier, query_text)]
 
 def find_relevant_sections(query, embedding_function, top_k=5):
     """
@@ -43,6 +397,7 @@ def find_relevant_sections(query, embedding_function, top_k=5):
         list[str]: Most relevant knowledge base sections.
     """
     logging.info("Generating embedding for user query...")
+    index, knowledge_base_texts = get_knowledge_base()
     query_embedding = np.array([embedding_function(query)]).astype('float32')
     distances, indices = index.search(query_embedding, top_k)
     relevant_texts = [knowledge_base_texts[i] for i in indices[0]]
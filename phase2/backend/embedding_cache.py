@@ -0,0 +1,161 @@
+"""
+Module: embedding_cache.py
+
+Purpose:
+Cache layer in front of the embedding API, shared by query time (azure_openai.py) and ingestion (create_embeddings.py).
+
+- Vectors are kept as float32 arrays in an LRU bounded by total bytes, keyed by `embedding_store.section_key`
+  (SHA-256 of model name and text), so a text embedded once is never sent upstream again while it stays cached.
+- Concurrent requests for the same text are coalesced: the first caller starts the upstream call in a task of its own
+  and every caller awaits that task (single-flight), so N simultaneous identical questions cost one call. The task is
+  shielded, so a caller that is cancelled (e.g. a client disconnecting) does not cancel it for the others.
+- The cache can be persisted in the embedding store format. Ingestion and the backend both default to
+  `embedding_cache.kb` in the backend directory, so vectors computed by one are reused by the other. A relative
+  EMBEDDING_CACHE_FILE is resolved against the backend directory, not the working directory, so both share the file
+  wherever they are started from.
+
+Configuration (environment variables):
+- EMBEDDING_CACHE_FILE: persistence path, relative to the backend directory; empty disables persistence
+  (default embedding_cache.kb)
+- EMBEDDING_CACHE_MAX_MB: memory bound for cached vectors (default 64)
+"""
+
+import os
+import asyncio
+import logging
+from collections import OrderedDict
+import numpy as np
+from embedding_store import open_store, write_store, section_key
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_FILE = os.getenv("EMBEDDING_CACHE_FILE", "embedding_cache.kb")
+if EMBEDDING_CACHE_FILE:
+    EMBEDDING_CACHE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), EMBEDDING_CACHE_FILE)
+EMBEDDING_CACHE_MAX_MB = float(os.getenv("EMBEDDING_CACHE_MAX_MB", "64"))
+
+def normalize_text(text):
+    # Whitespace differences should not defeat the cache
+    return " ".join(text.split())
+
+class EmbeddingCache:
+    """
+    LRU cache of embedding vectors with single-flight coalescing of upstream calls.
+    """
+
+    def __init__(self, model, max_bytes=int(EMBEDDING_CACHE_MAX_MB * 2**20), file_path=None):
+        self.model = model
+        self.max_bytes = max_bytes
+        self.file_path = file_path
+        self._vectors = OrderedDict()
+        self._bytes = 0
+        self._inflight = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        if file_path and os.path.exists(file_path):
+            self.load(file_path)
+
+    def key(self, text):
+        return section_key(normalize_text(text), self.model)
+
+    def _get(self, key):
+        vector = self._vectors.get(key)
+        if vector is not None:
+            self._vectors.move_to_end(key)
+        return vector
+
+    def _put(self, key, vector):
+        if key in self._vectors:
+            self._bytes -= self._vectors.pop(key).nbytes
+        self._vectors[key] = vector
+        self._bytes += vector.nbytes
+        while self._bytes > self.max_bytes and len(self._vectors) > 1:
+            self._bytes -= self._vectors.popitem(last=False)[1].nbytes
+
+    def get(self, text):
+        """
+        Args:
+            text (str): Text whose embedding is requested.
+
+        Returns:
+            np.ndarray or None: The cached float32 vector, or None if it is not cached.
+        """
+        vector = self._get(self.key(text))
+        if vector is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return vector
+
+    def put(self, text, vector):
+        self._put(self.key(text), np.asarray(vector, dtype=np.float32).reshape(-1))
+
+    async def get_or_compute(self, text, compute):
+        """
+        Returns the cached embedding of a text, computing it at most once across concurrent callers.
+
+        Args:
+            text (str): Text to embed.
+            compute (callable): Coroutine function taking the text and returning its embedding.
+
+        Returns:
+            np.ndarray: float32 embedding vector.
+        """
+        key = self.key(text)
+        vector = self._get(key)
+        if vector is not None:
+            self.hits += 1
+            return vector
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            self.coalesced += 1
+        else:
+            self.misses += 1
+            inflight = asyncio.ensure_future(self._compute(key, text, compute))
+            # Retrieve the outcome so a failure is not reported when every caller was cancelled
+            inflight.add_done_callback(lambda task: task.cancelled() or task.exception())
+            self._inflight[key] = inflight
+        return await asyncio.shield(inflight)
+
+    async def _compute(self, key, text, compute):
+        try:
+            vector = np.asarray(await compute(text), dtype=np.float32).reshape(-1)
+            self._put(key, vector)
+            return vector
+        finally:
+            del self._inflight[key]
+
+    def load(self, file_path):
+        try:
+            store = open_store(file_path)
+        except ValueError as e:
+            logger.warning(f"Ignoring embedding cache {file_path}: {e}")
+            return
+        if store.model != self.model:
+            return
+        for key, i in store.key_index().items():
+            self._put(key, np.array(store.embeddings[i]))
+        logger.info(f"Loaded {len(self._vectors)} cached embeddings from {file_path}.")
+
+    def save(self, file_path=None):
+        file_path = file_path or self.file_path
+        if not file_path or not self._vectors:
+            return
+        keys = list(self._vectors)
+        write_store(file_path, np.stack(list(self._vectors.values())), [""] * len(keys), keys, self.model)
+        logger.info(f"Saved {len(keys)} cached embeddings to {file_path}.")
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "entries": len(self._vectors),
+            "bytes": self._bytes
+        }
@@ -0,0 +1,221 @@
+"""
+Module: embedding_store.py
+
+Purpose:
+Versioned on-disk format for the knowledge base embeddings. A store is a single file laid out as:
+
+    magic (8 bytes) | header length (uint32) | format version (uint32) | JSON header
+    embeddings        float32[count, dim]   row-major matrix
+    keys              uint8[count, 32]      SHA-256 section keys used by incremental builds
+    offsets           uint64[count + 1]     byte offsets of each text in the blob
+    texts             UTF-8 blob
+    metadata_offsets  uint64[count + 1]     byte offsets of each chunk's metadata (version 2)
+    metadata          UTF-8 blob of JSON objects: source, section, service, HMO, tier (version 2)
+
+Every section starts on a 64-byte boundary, so all of them can be opened with `np.memmap` without copying.
+Workers that open the same file share its pages through the OS page cache, and opening a store only parses
+the small JSON header, so startup time no longer grows with the size of the corpus.
+
+Usage:
+    python embedding_store.py convert knowledge_base_embeddings.pkl knowledge_base_embeddings.kb
+"""
+
+import os
+import sys
+import json
+import hashlib
+import logging
+import pickle
+import struct
+import tempfile
+from collections.abc import Sequence
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+FORMAT_MAGIC = b"KBSTORE\0"
+FORMAT_VERSION = 2
+SUPPORTED_VERSIONS = (1, 2)
+ALIGNMENT = 64
+KEY_SIZE = 32
+_PREAMBLE = struct.Struct("<8sII")
+
+def section_key(text, model):
+    """
+    Computes the content hash that identifies a section's embedding.
+
+    The model name is part of the key, so switching embedding models never reuses stale vectors.
+
+    Args:
+        text (str): Section text.
+        model (str): Embedding model name.
+
+    Returns:
+        str: Hex SHA-256 digest.
+    """
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+class TextBlob(Sequence):
+    """
+    Read-only sequence of texts backed by a memory-mapped UTF-8 blob and its offsets.
+    Texts are decoded on access, so only the sections that are actually retrieved are materialized.
+    """
+
+    def __init__(self, blob, offsets):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("text index out of range")
+        return self._blob[self._offsets[i]:self._offsets[i + 1]].tobytes().decode("utf-8")
+
+class JsonBlob(TextBlob):
+    """
+    Read-only sequence of JSON objects stored like a TextBlob, decoded on access.
+    """
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return super().__getitem__(i)
+        return json.loads(super().__getitem__(i))
+
+class EmbeddingStore:
+    """
+    A knowledge base store opened from disk. `embeddings`, `keys`, `texts` and `metadata` are views over the memory-mapped file.
+    """
+
+    def __init__(self, file_path):
+        with open(file_path, "rb") as f:
+            magic, header_length, version = _PREAMBLE.unpack(f.read(_PREAMBLE.size))
+            if magic != FORMAT_MAGIC:
+                raise ValueError(f"{file_path} is not an embedding store.")
+            if version not in SUPPORTED_VERSIONS:
+                raise ValueError(f"Unsupported embedding store version {version} (expected {FORMAT_VERSION}).")
+            self.header = json.loads(f.read(header_length))
+
+        self.file_path = file_path
+        self.model = self.header["model"]
+        self.count = self.header["count"]
+        self.dim = self.header["dim"]
+
+        sections = self.header["sections"]
+        self.embeddings = self._map(np.float32, sections["embeddings"], (self.count, self.dim))
+        self.keys = self._map(np.uint8, sections["keys"], (self.count, KEY_SIZE))
+        offsets = self._map(np.uint64, sections["offsets"], (self.count + 1,))
+        blob = self._map(np.uint8, sections["texts"], (int(offsets[-1]),))
+        self.texts = TextBlob(blob, offsets)
+
+        if "metadata" in sections:
+            metadata_offsets = self._map(np.uint64, sections["metadata_offsets"], (self.count + 1,))
+            metadata_blob = self._map(np.uint8, sections["metadata"], (int(metadata_offsets[-1]),))
+            self.metadata = JsonBlob(metadata_blob, metadata_offsets)
+        else:
+            self.metadata = [{}] * self.count
+
+    def _map(self, dtype, offset, shape):
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.memmap(self.file_path, dtype=dtype, mode="r", offset=offset, shape=shape)
+
+    def key_index(self):
+        """
+        Returns:
+            dict: Mapping of hex section key to row number.
+        """
+        return {bytes(key).hex(): i for i, key in enumerate(self.keys)}
+
+def open_store(file_path):
+    logging.info(f"Opening embedding store {file_path}...")
+    return EmbeddingStore(file_path)
+
+def _encode_blob(strings):
+    encoded = [string.encode("utf-8") for string in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    return offsets.tobytes(), b"".join(encoded)
+
+def write_store(file_path, embeddings, texts, keys, model, metadata=None):
+    """
+    Writes embeddings, texts, their section keys and chunk metadata to a store file.
+    The file is written to a temporary file of its own in the same directory and atomically renamed, so readers never
+    observe a partial store and concurrent writers (e.g. several workers saving the embedding cache) never mix their data.
+
+    Args:
+        file_path (str): Destination path.
+        embeddings (array-like): Embedding vectors, one per text.
+        texts (list[str]): Section texts.
+        keys (list[str]): Hex section keys, one per text.
+        model (str): Name of the embedding model that produced the vectors.
+        metadata (list[dict], optional): JSON-serializable metadata, one per text.
+    """
+    matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+    offsets, blob = _encode_blob(texts)
+    metadata_offsets, metadata_blob = _encode_blob(
+        json.dumps(item, ensure_ascii=False) for item in (metadata or [{}] * len(texts))
+    )
+    key_bytes = np.frombuffer(b"".join(bytes.fromhex(key) for key in keys), dtype=np.uint8)
+
+    payloads = [
+        ("embeddings", matrix.tobytes()),
+        ("keys", key_bytes.tobytes()),
+        ("offsets", offsets),
+        ("texts", blob),
+        ("metadata_offsets", metadata_offsets),
+        ("metadata", metadata_blob),
+    ]
+
+    # The header records absolute section offsets, which depend on the header's own length.
+    # Reserve a fixed-size slot large enough for the JSON so the offsets can be computed up front.
+    header = {"model": model, "count": len(texts), "dim": int(matrix.shape[1]), "dtype": "float32", "sections": {}}
+    header_slot = _align(_PREAMBLE.size + len(json.dumps(header)) + 256) - _PREAMBLE.size
+    position = _PREAMBLE.size + header_slot
+    for name, payload in payloads:
+        header["sections"][name] = position
+        position = _align(position + len(payload))
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_slot, b" ")
+
+    stem, extension = os.path.splitext(os.path.basename(file_path))
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(file_path)), prefix=f"{stem}.", suffix=f"{extension}.tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(_PREAMBLE.pack(FORMAT_MAGIC, header_slot, FORMAT_VERSION))
+            f.write(header_bytes)
+            for name, payload in payloads:
+                f.seek(header["sections"][name])
+                f.write(payload)
+        # mkstemp creates the file readable by its owner only
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, file_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def convert_pickle(pickle_path, store_path, model="text-embedding-ada-002"):
+    """
+    Converts a legacy `(embeddings, texts)` pickle into a store file.
+
+    Args:
+        pickle_path (str): Path to the legacy pickle file.
+        store_path (str): Destination store path.
+        model (str): Embedding model that produced the pickled vectors.
+    """
+    with open(pickle_path, "rb") as f:
+        embeddings, texts = pickle.load(f)
+    write_store(store_path, embeddings, texts, [section_key(text, model) for text in texts], model)
+    logging.info(f"Converted {len(texts)} embeddings from {pickle_path} to {store_path}.")
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] != "convert":
+        sys.exit("Usage: python embedding_store.py convert <input.pkl> <output.kb>")
+    convert_pickle(sys.argv[2], sys.argv[3])
@@ -0,0 +1,183 @@
+"""
+Module: lexical_index.py
+
+Purpose:
+In-process BM25 index over the knowledge base chunks, searched alongside the FAISS index (see data_loader.py).
+Embedding similarity alone often misses exact Hebrew service names and HMO terms, while a lexical match on them is
+cheap and precise. Results of the two retrievers are combined with reciprocal rank fusion (`reciprocal_rank_fusion`).
+
+Hebrew text is normalized before indexing and querying:
+- niqqud and cantillation marks are removed, and maqaf is treated as a space;
+- geresh / gershayim and quotes inside words are dropped, so acronyms such as קופ"ח match קופח;
+- each token is indexed together with its forms without a leading prefix (ו, ה, ב, ל, מ, ש, כ and their common
+  combinations such as וה, שב, מה), so "לסתימות" and "במכבי" match "סתימות" and "מכבי". Stripping is done on
+  both sides without a lexicon, so a word that merely starts with a prefix letter also gets a (harmless) extra form.
+  Forms shorter than three letters are not generated.
+"""
+
+import re
+import math
+import logging
+from collections import Counter, defaultdict
+import numpy as np
+
+logging.basicConfig(level=logging.INFO)
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+HEBREW_PREFIXES = (
+    "וכש", "ושה", "וה", "וב", "ול", "ומ", "וש", "וכ", "שה", "שב", "של", "שמ", "מה", "כש", "לכ", "מש",
+    "ו", "ה", "ב", "ל", "מ", "ש", "כ"
+)
+MIN_STEM_LENGTH = 3
+STOPWORDS = frozenset({
+    "מה", "האם", "כמה", "של", "את", "על", "עם", "יש", "אני", "לי", "זה", "הוא", "היא", "או", "גם", "כל", "אם",
+    "the", "a", "an", "is", "are", "of", "for", "to", "in", "on", "and", "or", "what", "how", "do", "does", "my", "i"
+})
+
+_NIQQUD = re.compile(r"[\u0591-\u05BD\u05BF-\u05C7]")
+_MAQAF = re.compile(r"\u05BE")
+_INNER_QUOTES = re.compile(r"(?<=\w)[\"'\u05F3\u05F4](?=\w)")
+_TOKEN = re.compile(r"\w+")
+
+def normalize_hebrew(text):
+    text = _MAQAF.sub(" ", text)
+    text = _NIQQUD.sub("", text)
+    return _INNER_QUOTES.sub("", text).lower()
+
+def token_forms(token):
+    """
+    Returns a token and its forms without a leading Hebrew prefix.
+
+    Args:
+        token (str): Normalized token.
+
+    Returns:
+        list[str]: The token first, then its stripped forms.
+    """
+    forms = [token]
+    for prefix in HEBREW_PREFIXES:
+        if token.startswith(prefix) and len(token) - len(prefix) >= MIN_STEM_LENGTH:
+            forms.append(token[len(prefix):])
+    return forms
+
+def tokenize(text):
+    """
+    Splits text into normalized index terms, including prefix-stripped forms and excluding stopwords.
+
+    Args:
+        text (str): Hebrew or English text.
+
+    Returns:
+        list[str]: Terms in order of appearance.
+    """
+    terms = []
+    for token in _TOKEN.findall(normalize_hebrew(text)):
+        if token in STOPWORDS:
+            continue
+        terms.extend(form for form in token_forms(token) if form not in STOPWORDS)
+    return terms
+
+class BM25Index:
+    """
+    Okapi BM25 over a fixed list of texts. Postings are kept as NumPy arrays per term, so a query touches only
+    the documents that contain its terms.
+    """
+
+    def __init__(self, texts, k1=BM25_K1, b=BM25_B):
+        self.k1 = k1
+        self.b = b
+        postings = defaultdict(lambda: ([], []))
+        lengths = []
+
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            lengths.append(sum(counts.values()))
+            for term, count in counts.items():
+                postings[term][0].append(doc_id)
+                postings[term][1].append(count)
+
+        self.count = len(lengths)
+        self.lengths = np.array(lengths, dtype=np.float32)
+        average_length = float(self.lengths.mean()) if self.count else 0.0
+        # Per-document length normalization of the BM25 denominator, computed once
+        self._norms = k1 * (1 - b + b * self.lengths / average_length) if average_length else np.full(self.count, k1)
+        self.postings = {
+            term: (np.array(doc_ids, dtype=np.int64), np.array(counts, dtype=np.float32))
+            for term, (doc_ids, counts) in postings.items()
+        }
+        self.idf = {
+            term: math.log(1 + (self.count - len(doc_ids) + 0.5) / (len(doc_ids) + 0.5))
+            for term, (doc_ids, _) in self.postings.items()
+        }
+        logging.info(f"Built BM25 index over {self.count} texts with {len(self.postings)} terms.")
+
+    def scores(self, query):
+        """
+        Args:
+            query (str): Query text.
+
+        Returns:
+            np.ndarray: BM25 score of every document.
+        """
+        scores = np.zeros(self.count, dtype=np.float32)
+        for term in set(tokenize(query)):
+            if term not in self.postings:
+                continue
+            doc_ids, counts = self.postings[term]
+            scores[doc_ids] += self.idf[term] * counts * (self.k1 + 1) / (counts + self._norms[doc_ids])
+        return scores
+
+    def coverage(self, query, doc_ids):
+        """
+        Args:
+            query (str): Query text.
+            doc_ids (list[int]): Documents to check.
+
+        Returns:
+            np.ndarray: Fraction of the query's terms that occur in each document.
+        """
+        terms = set(tokenize(query))
+        matched = np.zeros(len(doc_ids), dtype=np.float32)
+        for term in terms & self.postings.keys():
+            matched += np.isin(doc_ids, self.postings[term][0])
+        return matched / len(terms) if terms else matched
+
+    def search(self, query, top_k, allowed=None):
+        """
+        Returns the best matching documents for a query.
+
+        Args:
+            query (str): Query text.
+            top_k (int): Maximum number of results.
+            allowed (np.ndarray, optional): Boolean mask of documents that may be returned.
+
+        Returns:
+            tuple: (doc ids, scores), best first. Documents without any matching term are not returned.
+        """
+        scores = self.scores(query)
+        if allowed is not None:
+            scores[~allowed] = 0
+        candidates = np.flatnonzero(scores)
+        if len(candidates) > top_k:
+            candidates = candidates[np.argpartition(-scores[candidates], top_k - 1)[:top_k]]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return order, scores[order]
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """
+    Fuses ranked result lists: each document scores the sum of 1 / (k + rank) over the lists it appears in.
+
+    Args:
+        rankings (list[list[int]]): Document ids of each retriever, best first.
+        k (int): Damping constant; larger values flatten the contribution of top ranks.
+
+    Returns:
+        list[int]: Document ids ordered by fused score.
+    """
+    fused = defaultdict(float)
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking):
+            fused[int(doc_id)] += 1 / (k + rank + 1)
+    return sorted(fused, key=fused.get, reverse=True)
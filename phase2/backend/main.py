@@ -1,8 +1,44 @@
-from fastapi import FastAPI
+import os
+import secrets
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Header, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from pydantic import BaseModel
-from azure_openai import get_answer_from_openai
+from azure_openai import (
+    get_answer_from_openai,
+    stream_answer_from_openai,
+    close_openai_client,
+    answer_cache,
+    question_embedding_cache
+)
+from data_loader import warm_up, release_knowledge_base, reload_knowledge_base, knowledge_base_status, EMBEDDINGS_FILE
+from sessions import create_session_store
+from metrics import register_collectors, metrics_payload, setup_tracing
 
-app = FastAPI(title="Medical Chatbot Microservice")
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+session_store = create_session_store()
+
+# Cache and knowledge base figures are read when /metrics is scraped
+instrumented_caches = {"embeddings": question_embedding_cache}
+if answer_cache is not None:
+    instrumented_caches["answers"] = answer_cache
+register_collectors(instrumented_caches, knowledge_base_status, EMBEDDINGS_FILE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load the knowledge base once per worker before serving traffic
+    warm_up()
+    yield
+    question_embedding_cache.save()
+    await session_store.close()
+    await close_openai_client()
+    release_knowledge_base()
+
+app = FastAPI(title="Medical Chatbot Microservice", lifespan=lifespan)
+setup_tracing(app)
 
 class ChatRequest(BaseModel):
     user_info: dict
@@ -12,10 +48,62 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     response: str
 
+class SessionRequest(BaseModel):
+    user_info: dict
+
+class SessionResponse(BaseModel):
+    session_id: str
+
+class SessionHistoryResponse(BaseModel):
+    session_id: str
+    user_info: dict
+    history: list
+
+class MessageRequest(BaseModel):
+    question: str
+
+async def get_session_or_404(session_id: str) -> dict:
+    session = await session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired.")
+    return session
+
 @app.get("/")
 async def root():
     return {"message": "Medical Chatbot backend is running."}
 
+@app.get("/ready")
+async def ready():
+    status = knowledge_base_status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
+
+def require_admin_token(token):
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not found.")
+    if not token or not secrets.compare_digest(token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+@app.post("/admin/reload-knowledge-base")
+async def reload_endpoint(x_admin_token: str | None = Header(default=None)):
+    # Call after create_embeddings.py rebuilds the store; also invalidates the answer cache.
+    # The load builds the index and memory-maps the store, so it runs off the event loop.
+    require_admin_token(x_admin_token)
+    status = await run_in_threadpool(reload_knowledge_base)
+    return JSONResponse(status_code=200 if status["ready"] and not status["error"] else 503, content=status)
+
+@app.get("/cache/stats")
+async def cache_stats():
+    return {
+        "answers": answer_cache.stats() if answer_cache is not None else {"backend": None},
+        "embeddings": question_embedding_cache.stats(),
+        "sessions": session_store.stats()
+    }
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = metrics_payload()
+    return Response(content=body, media_type=content_type)
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     answer = await get_answer_from_openai(
@@ -24,4 +112,57 @@ async def chat_endpoint(request: ChatRequest):
         history=request.history
     )
 
-    return ChatResponse(response=answer)
\ No newline at end of file
+    return ChatResponse(response=answer)
+
+@app.post("/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    # Answer text is sent as a chunked plain-text body, one piece per completion delta
+    return StreamingResponse(
+        stream_answer_from_openai(
+            question=request.question,
+            user_info=request.user_info,
+            history=request.history
+        ),
+        media_type="text/plain; charset=utf-8"
+    )
+
+@app.post("/sessions", response_model=SessionResponse, status_code=201)
+async def create_session(request: SessionRequest):
+    return SessionResponse(session_id=await session_store.create(request.user_info))
+
+@app.get("/sessions/{session_id}", response_model=SessionHistoryResponse)
+async def get_session(session_id: str):
+    session = await get_session_or_404(session_id)
+    return SessionHistoryResponse(session_id=session_id, **session)
+
+@app.delete("/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    await session_store.delete(session_id)
+
+@app.post("/sessions/{session_id}/messages", response_model=ChatResponse)
+async def session_message_endpoint(session_id: str, request: MessageRequest):
+    session = await get_session_or_404(session_id)
+    answer = await get_answer_from_openai(
+        question=request.question,
+        user_info=session["user_info"],
+        history=session["history"]
+    )
+    await session_store.append_turn(session_id, request.question, answer)
+
+    return ChatResponse(response=answer)
+
+async def stream_session_answer(session_id: str, session: dict, question: str):
+    answer_parts = []
+    async for part in stream_answer_from_openai(question=question, user_info=session["user_info"], history=session["history"]):
+        answer_parts.append(part)
+        yield part
+    # The turn is only recorded once the whole answer has been streamed
+    await session_store.append_turn(session_id, question, "".join(answer_parts).strip())
+
+@app.post("/sessions/{session_id}/messages/stream")
+async def session_message_stream_endpoint(session_id: str, request: MessageRequest):
+    session = await get_session_or_404(session_id)
+    return StreamingResponse(
+        stream_session_answer(session_id, session, request.question),
+        media_type="text/plain; charset=utf-8"
+    )
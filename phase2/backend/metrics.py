@@ -0,0 +1,185 @@
+"""
+Module: metrics.py
+
+Purpose:
+Request-level instrumentation for the chatbot backend, exported in Prometheus format on `/metrics` (see main.py).
+
+- chatbot_stage_seconds{stage}: latency histogram of each /chat stage: embed, cache_lookup, search, prompt_build,
+  completion, first_token (streaming only) and request (end to end).
+- chatbot_prompt_tokens_total{part}: prompt tokens sent per prompt part (see prompt_builder.build_prompt).
+- chatbot_completion_tokens_total: completion tokens received.
+- chatbot_answers_total{source}: answers served from the answer cache or generated.
+- chatbot_cache_*{cache}: hits, misses, hit rate and entries of the answer and embedding caches, read at scrape time.
+- chatbot_knowledge_base_*: number of indexed chunks, store file size, load time and process RSS, read at scrape time.
+
+Recording a stage is a perf_counter pair and one histogram observation on a pre-bound child, and cache and
+knowledge base figures are only read when Prometheus scrapes, so instrumentation can stay on under load.
+
+Optional OpenTelemetry tracing (CHATBOT_TRACING=1) additionally opens a span per stage, continues the trace started by
+the Streamlit frontend from the incoming `traceparent` header, and exports spans over OTLP (configured with the
+standard OTEL_EXPORTER_OTLP_* variables). It needs the opentelemetry-sdk, opentelemetry-exporter-otlp-proto-http
+and opentelemetry-instrumentation-fastapi packages, which are only imported when tracing is enabled.
+
+With several uvicorn workers, set PROMETHEUS_MULTIPROC_DIR so prometheus_client aggregates across processes.
+"""
+
+import os
+import time
+import logging
+from contextlib import contextmanager, nullcontext
+from prometheus_client import Counter, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+TRACING_ENABLED = os.getenv("CHATBOT_TRACING", "0") == "1"
+TRACING_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "medical-chatbot-backend")
+STAGES = ("embed", "cache_lookup", "search", "prompt_build", "completion", "first_token", "request")
+# Sub-millisecond stages (cache hits, search) up to long completions
+STAGE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+STAGE_SECONDS = Histogram("chatbot_stage_seconds", "Latency of each chat request stage.", ["stage"], buckets=STAGE_BUCKETS)
+PROMPT_TOKENS = Counter("chatbot_prompt_tokens", "Prompt tokens sent to the completion model, by prompt part.", ["part"])
+COMPLETION_TOKENS = Counter("chatbot_completion_tokens", "Completion tokens received from the completion model.")
+ANSWERS = Counter("chatbot_answers", "Answers served, by source.", ["source"])
+
+# Label lookups are done once here instead of on every observation
+_stage_histograms = {stage: STAGE_SECONDS.labels(stage) for stage in STAGES}
+_tracer = None
+_collectors = []
+
+def observe_stage(stage, seconds):
+    _stage_histograms[stage].observe(seconds)
+
+@contextmanager
+def track_stage(stage):
+    """
+    Times a block as one request stage, and traces it as a span when tracing is enabled.
+    Do not wrap blocks that yield from an async generator; measure those with `observe_stage`.
+
+    Args:
+        stage (str): One of STAGES.
+    """
+    span = _tracer.start_as_current_span(stage) if _tracer is not None else nullcontext()
+    start = time.perf_counter()
+    with span:
+        try:
+            yield
+        finally:
+            _stage_histograms[stage].observe(time.perf_counter() - start)
+
+def record_prompt_tokens(breakdown):
+    """
+    Args:
+        breakdown (dict): Token breakdown returned by prompt_builder.build_prompt.
+    """
+    for part in ("template", "question", "user_info", "history", "summary", "knowledge"):
+        PROMPT_TOKENS.labels(part).inc(breakdown[part])
+
+def record_completion_tokens(count):
+    COMPLETION_TOKENS.inc(count)
+
+def record_answer(source):
+    ANSWERS.labels(source).inc()
+
+class CacheStatsCollector:
+    """
+    Exposes the `stats()` of the answer and embedding caches when Prometheus scrapes.
+    """
+
+    def __init__(self, caches):
+        self.caches = caches
+
+    def collect(self):
+        hits = CounterMetricFamily("chatbot_cache_hits", "Cache hits.", labels=["cache"])
+        misses = CounterMetricFamily("chatbot_cache_misses", "Cache misses.", labels=["cache"])
+        hit_rate = GaugeMetricFamily("chatbot_cache_hit_rate", "Cache hits over lookups since start.", labels=["cache"])
+        entries = GaugeMetricFamily("chatbot_cache_entries", "Entries held by the cache.", labels=["cache"])
+
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            hit_rate.add_metric([name], stats["hit_rate"])
+            if stats.get("entries") is not None:
+                entries.add_metric([name], stats["entries"])
+        yield from (hits, misses, hit_rate, entries)
+
+class KnowledgeBaseCollector:
+    """
+    Exposes the knowledge base status (see data_loader.knowledge_base_status) when Prometheus scrapes.
+    """
+
+    def __init__(self, status, store_path):
+        self.status = status
+        self.store_path = store_path
+
+    def collect(self):
+        status = self.status()
+        yield GaugeMetricFamily("chatbot_knowledge_base_ready", "Whether the knowledge base is loaded.", value=int(status["ready"]))
+        yield GaugeMetricFamily("chatbot_knowledge_base_chunks", "Chunks in the search index.", value=status["embeddings"])
+        if status["load_time_seconds"] is not None:
+            yield GaugeMetricFamily(
+                "chatbot_knowledge_base_load_seconds", "Time taken to load the knowledge base.", value=status["load_time_seconds"]
+            )
+        if os.path.exists(self.store_path):
+            yield GaugeMetricFamily(
+                "chatbot_knowledge_base_store_bytes", "Size of the embedding store file.", value=os.path.getsize(self.store_path)
+            )
+        yield GaugeMetricFamily("chatbot_process_rss_megabytes", "Resident memory of this worker.", value=status["rss_mb"])
+
+def register_collectors(caches, knowledge_base_status, store_path):
+    """
+    Registers the scrape-time collectors with the default registry.
+
+    Args:
+        caches (dict): Cache name -> object with a `stats()` method.
+        knowledge_base_status (callable): Returns the knowledge base status dict.
+        store_path (str): Path of the embedding store.
+    """
+    _collectors.extend([CacheStatsCollector(caches), KnowledgeBaseCollector(knowledge_base_status, store_path)])
+    for collector in _collectors:
+        REGISTRY.register(collector)
+
+def metrics_payload():
+    """
+    Returns:
+        tuple: (body bytes, content type) of the Prometheus exposition.
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # Scrape-time figures come from the worker that serves the scrape
+        for collector in _collectors:
+            registry.register(collector)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+def setup_tracing(app):
+    """
+    Enables OpenTelemetry tracing for the FastAPI app when CHATBOT_TRACING=1. Incoming requests continue the trace of
+    the `traceparent` header sent by the frontend, and `track_stage` spans become children of the request span.
+
+    Args:
+        app (FastAPI): The application to instrument.
+    """
+    global _tracer
+    if not TRACING_ENABLED:
+        return
+
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.fastapi import FastAPIInstrumentor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": TRACING_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    FastAPIInstrumentor.instrument_app(app, excluded_urls="metrics,ready")
+    _tracer = trace.get_tracer(__name__)
+    logger.info("OpenTelemetry tracing enabled.")
@@ -0,0 +1,246 @@
+"""
+Module: prompt_builder.py
+
+Purpose:
+Assembles the chat prompt within a fixed token budget. Formatting the whole history and every retrieved section into
+the prompt makes long sessions grow in size, latency and cost until they overflow the context window, so each part
+of the prompt gets a share of the budget instead:
+
+- instructions: always included.
+- question: always included, truncated to PROMPT_QUESTION_TOKENS so a very long question cannot push the prompt
+  past the budget.
+- user information: rendered as "field: value" lines, truncated to PROMPT_USER_INFO_TOKENS.
+- history: the last PROMPT_RECENT_TURNS turns verbatim (newest first, while they fit in PROMPT_HISTORY_TOKENS),
+  and a rolling summary of older turns: one line per turn with the question and the start of its answer,
+  keeping the newest lines that fit in PROMPT_SUMMARY_TOKENS. The summary is extractive, so it adds no model call.
+- knowledge: whatever budget remains, filled with retrieved sections in rank order after dropping duplicates.
+  The first section that does not fit is truncated and the rest are dropped.
+
+Tokens are counted with tiktoken's encoding for the completion model. If tiktoken or its encoding files are
+unavailable, a conservative UTF-8 length estimate is used instead.
+
+Configuration (environment variables):
+- PROMPT_TOKEN_BUDGET: total prompt tokens (default 6000)
+- PROMPT_QUESTION_TOKENS: budget for the question (default 500)
+- PROMPT_USER_INFO_TOKENS: budget for user information (default 200)
+- PROMPT_HISTORY_TOKENS: budget for verbatim recent turns (default 1500)
+- PROMPT_SUMMARY_TOKENS: budget for the summary of older turns (default 300)
+- PROMPT_RECENT_TURNS: turns kept verbatim (default 3)
+"""
+
+import os
+import logging
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+PROMPT_QUESTION_TOKENS = int(os.getenv("PROMPT_QUESTION_TOKENS", "500"))
+PROMPT_USER_INFO_TOKENS = int(os.getenv("PROMPT_USER_INFO_TOKENS", "200"))
+PROMPT_HISTORY_TOKENS = int(os.getenv("PROMPT_HISTORY_TOKENS", "1500"))
+PROMPT_SUMMARY_TOKENS = int(os.getenv("PROMPT_SUMMARY_TOKENS", "300"))
+PROMPT_RECENT_TURNS = int(os.getenv("PROMPT_RECENT_TURNS", "3"))
+TOKENIZER_ENCODING = "o200k_base"
+# Per-turn limits for summary lines
+SUMMARY_QUESTION_TOKENS = 40
+SUMMARY_ANSWER_TOKENS = 60
+SECTION_SEPARATOR = "\n\n"
+
+PROMPT_TEMPLATE = """
+    You're an assistant specialized in medical services for Israeli HMOs and your name is 'Medical Assitant'.
+    Use the following Knowledge Base to answer clearly and accurately:
+
+    Knowledge Base:
+    {knowledge}
+
+    User Information:
+    {user_info}
+
+    Summary of earlier conversation:
+    {summary}
+
+    Conversation history:
+    {history}
+
+    Question:
+    {question}
+
+    Provide a detailed, accurate response based on the knowledge base.
+    """
+
+_encoding = None
+_encoding_failed = False
+
+def get_encoding():
+    """
+    Returns:
+        tiktoken.Encoding or None: The tokenizer, or None when tiktoken cannot be loaded.
+    """
+    global _encoding, _encoding_failed
+    if _encoding is None and not _encoding_failed:
+        try:
+            import tiktoken
+
+            _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+        except Exception as e:
+            _encoding_failed = True
+            logger.warning(f"tiktoken unavailable ({type(e).__name__}); estimating token counts from UTF-8 length.")
+    return _encoding
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # Hebrew averages about two UTF-8 bytes per token, English about four, so this overestimates
+    return len(text.encode("utf-8")) // 2 + 1
+
+def truncate_to_tokens(text, max_tokens):
+    """
+    Cuts text down to at most `max_tokens` tokens.
+
+    Args:
+        text (str): Text to truncate.
+        max_tokens (int): Token limit.
+
+    Returns:
+        str: The text, with "..." appended when it was cut.
+    """
+    if max_tokens <= 0:
+        return ""
+    if count_tokens(text) <= max_tokens:
+        return text
+
+    encoding = get_encoding()
+    if encoding is not None:
+        return encoding.decode(encoding.encode(text)[:max_tokens - 1]).rstrip() + "..."
+    limit = (max_tokens - 2) * 2
+    return text.encode("utf-8")[:limit].decode("utf-8", errors="ignore").rstrip() + "..."
+
+def format_user_info(user_info):
+    return "\n".join(f"{key}: {value}" for key, value in user_info.items() if value not in (None, ""))
+
+def turn_parts(turn):
+    if isinstance(turn, dict):
+        return str(turn.get("question", "")), str(turn.get("answer", ""))
+    return "", str(turn)
+
+def format_turn(turn):
+    question, answer = turn_parts(turn)
+    return f"User: {question}\nAssistant: {answer}" if question else answer
+
+def summarize_turn(turn):
+    question, answer = turn_parts(turn)
+    first_sentence = answer.strip().split("\n")[0].split(". ")[0]
+    return (
+        f"- {truncate_to_tokens(question, SUMMARY_QUESTION_TOKENS)} -> "
+        f"{truncate_to_tokens(first_sentence, SUMMARY_ANSWER_TOKENS)}"
+    )
+
+def fit_newest(items, max_tokens):
+    """
+    Keeps the newest items whose combined size fits the budget.
+
+    Args:
+        items (list[str]): Items in chronological order.
+        max_tokens (int): Token budget.
+
+    Returns:
+        tuple: (kept items in chronological order, tokens used)
+    """
+    kept, used = [], 0
+    for item in reversed(items):
+        tokens = count_tokens(item)
+        if used + tokens > max_tokens:
+            break
+        kept.append(item)
+        used += tokens
+    return kept[::-1], used
+
+def select_sections(sections, max_tokens):
+    """
+    Fills the knowledge budget with sections in rank order, skipping duplicates and truncating the last one.
+
+    Args:
+        sections (list[str]): Retrieved sections, best first.
+        max_tokens (int): Token budget.
+
+    Returns:
+        tuple: (selected sections, tokens used, number of sections dropped)
+    """
+    selected, seen, used = [], set(), 0
+    for section in sections:
+        normalized = " ".join(section.split())
+        if normalized in seen or any(normalized in other for other in seen):
+            continue
+        seen.add(normalized)
+
+        # Sections are joined with a blank line, which is counted with the section that follows it
+        separator = SECTION_SEPARATOR if selected else ""
+        tokens = count_tokens(separator + section)
+        if used + tokens > max_tokens:
+            # Partial table rows are useless, so only truncate prose-sized remainders
+            remaining = max_tokens - used - (count_tokens(separator) if separator else 0)
+            if remaining >= 50:
+                section = truncate_to_tokens(section, remaining)
+                selected.append(section)
+                used += count_tokens(separator + section)
+            break
+        selected.append(section)
+        used += tokens
+    return selected, used, len(sections) - len(selected)
+
+def build_prompt(question, user_info, history, sections, budget=PROMPT_TOKEN_BUDGET):
+    """
+    Builds the prompt for a question within the token budget.
+
+    Args:
+        question (str): The user's question.
+        user_info (dict): Information collected about the user.
+        history (list): Previous turns, oldest first, as {"question", "answer"} dicts.
+        sections (list[str]): Retrieved knowledge base sections, best first.
+        budget (int): Total prompt token budget.
+
+    Returns:
+        tuple: (prompt, breakdown) where breakdown maps each prompt part to its token count, plus how many
+        sections and turns were kept, summarized or dropped.
+    """
+    template_tokens = count_tokens(PROMPT_TEMPLATE.format(knowledge="", user_info="", summary="", history="", question=""))
+    question = truncate_to_tokens(question, PROMPT_QUESTION_TOKENS)
+    question_tokens = count_tokens(question)
+
+    user_info_text = truncate_to_tokens(format_user_info(user_info), PROMPT_USER_INFO_TOKENS)
+    user_info_tokens = count_tokens(user_info_text) if user_info_text else 0
+
+    recent_turns = history[-PROMPT_RECENT_TURNS:] if PROMPT_RECENT_TURNS > 0 else []
+    older_turns = history[:len(history) - len(recent_turns)]
+    verbatim, history_tokens = fit_newest([format_turn(turn) for turn in recent_turns], PROMPT_HISTORY_TOKENS)
+    # Recent turns that did not fit verbatim are summarized along with the older ones
+    summarized_turns = older_turns + recent_turns[:len(recent_turns) - len(verbatim)]
+    summary_lines, summary_tokens = fit_newest([summarize_turn(turn) for turn in summarized_turns], PROMPT_SUMMARY_TOKENS)
+
+    knowledge_budget = max(0, budget - template_tokens - question_tokens - user_info_tokens - history_tokens - summary_tokens)
+    selected, knowledge_tokens, dropped = select_sections(sections, knowledge_budget)
+
+    prompt = PROMPT_TEMPLATE.format(
+        knowledge=SECTION_SEPARATOR.join(selected),
+        user_info=user_info_text,
+        summary="\n".join(summary_lines) or "None",
+        history="\n\n".join(verbatim) or "None",
+        question=question
+    )
+    breakdown = {
+        "template": template_tokens,
+        "question": question_tokens,
+        "user_info": user_info_tokens,
+        "history": history_tokens,
+        "summary": summary_tokens,
+        "knowledge": knowledge_tokens,
+        "total": count_tokens(prompt),
+        "budget": budget,
+        "sections_used": len(selected),
+        "sections_dropped": dropped,
+        "turns_verbatim": len(verbatim),
+        "turns_summarized": len(summary_lines),
+        "turns_dropped": len(summarized_turns) - len(summary_lines)
+    }
+    return prompt, breakdown
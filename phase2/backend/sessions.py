@@ -0,0 +1,194 @@
+"""
+Module: sessions.py
+
+Purpose:
+Server-side conversation sessions. The frontend creates a session once with the user's information and afterwards
+sends only the session id and each new question, instead of re-sending the user information and the whole history
+with every turn. The backend appends each answered turn to the session.
+
+Sessions expire after SESSION_TTL seconds without activity (the TTL is refreshed on every access), and each session
+keeps at most SESSION_MAX_TURNS turns; older turns are dropped (the prompt builder summarizes what it cannot fit
+anyway, see prompt_builder.py).
+
+Two stores are available:
+- MemorySessionStore: per-process and bounded to SESSION_MAX_SESSIONS, evicting the least recently used session.
+  Only suitable for a single worker, since requests of one session may reach any worker.
+- RedisSessionStore: shared by all workers; each session is a key holding the user information plus a list of turns,
+  both expiring through native Redis TTLs.
+
+Configuration (environment variables):
+- SESSION_BACKEND: "memory" (default) or "redis"
+- SESSION_REDIS_URL: connection URL for the Redis store (default redis://localhost:6379/2)
+- SESSION_TTL: seconds of inactivity before a session expires (default 3600)
+- SESSION_MAX_SESSIONS: sessions kept by the memory store (default 10000)
+- SESSION_MAX_TURNS: turns kept per session (default 50)
+"""
+
+import os
+import json
+import logging
+import secrets
+import time
+from collections import OrderedDict
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory")
+SESSION_REDIS_URL = os.getenv("SESSION_REDIS_URL", "redis://localhost:6379/2")
+SESSION_TTL = float(os.getenv("SESSION_TTL", "3600"))
+SESSION_MAX_SESSIONS = int(os.getenv("SESSION_MAX_SESSIONS", "10000"))
+SESSION_MAX_TURNS = int(os.getenv("SESSION_MAX_TURNS", "50"))
+
+def new_session_id():
+    # Session ids are bearer tokens for the conversation, so they must not be guessable
+    return secrets.token_urlsafe(16)
+
+class MemorySessionStore:
+    """
+    In-process store: an LRU-ordered dict of session id -> {"user_info", "history", "expires_at"}.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX_SESSIONS, max_turns=SESSION_MAX_TURNS):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.sessions = OrderedDict()
+        self.evictions = 0
+
+    def _live(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if session["expires_at"] <= time.time():
+            del self.sessions[session_id]
+            return None
+        session["expires_at"] = time.time() + self.ttl
+        self.sessions.move_to_end(session_id)
+        return session
+
+    async def create(self, user_info):
+        """
+        Args:
+            user_info (dict): Information collected about the user.
+
+        Returns:
+            str: The new session id.
+        """
+        session_id = new_session_id()
+        self.sessions[session_id] = {"user_info": user_info, "history": [], "expires_at": time.time() + self.ttl}
+        while len(self.sessions) > self.max_sessions:
+            self.sessions.popitem(last=False)
+            self.evictions += 1
+        return session_id
+
+    async def get(self, session_id):
+        """
+        Returns:
+            dict or None: {"user_info", "history"} of a live session, or None if it does not exist or expired.
+        """
+        session = self._live(session_id)
+        if session is None:
+            return None
+        return {"user_info": session["user_info"], "history": list(session["history"])}
+
+    async def append_turn(self, session_id, question, answer):
+        """
+        Records an answered turn.
+
+        Returns:
+            bool: False if the session no longer exists.
+        """
+        session = self._live(session_id)
+        if session is None:
+            return False
+        session["history"].append({"question": question, "answer": answer})
+        del session["history"][:-self.max_turns]
+        return True
+
+    async def delete(self, session_id):
+        self.sessions.pop(session_id, None)
+
+    async def close(self):
+        pass
+
+    def stats(self):
+        now = time.time()
+        return {
+            "backend": type(self).__name__,
+            "sessions": sum(1 for session in self.sessions.values() if session["expires_at"] > now),
+            "evictions": self.evictions
+        }
+
+class RedisSessionStore:
+    """
+    Store shared across workers. A session is two keys with the same TTL: one holding the user information as JSON
+    and one Redis list of JSON-encoded turns, so appending a turn never rewrites the rest of the history.
+    """
+
+    KEY_PREFIX = "session"
+
+    def __init__(self, url=SESSION_REDIS_URL, ttl=SESSION_TTL, max_turns=SESSION_MAX_TURNS):
+        import redis.asyncio as redis
+
+        self.redis = redis.from_url(url)
+        self.ttl = int(ttl)
+        self.max_turns = max_turns
+
+    def _info_key(self, session_id):
+        return f"{self.KEY_PREFIX}:{session_id}:user_info"
+
+    def _history_key(self, session_id):
+        return f"{self.KEY_PREFIX}:{session_id}:history"
+
+    async def create(self, user_info):
+        session_id = new_session_id()
+        await self.redis.set(self._info_key(session_id), json.dumps(user_info, ensure_ascii=False), ex=self.ttl)
+        return session_id
+
+    async def get(self, session_id):
+        async with self.redis.pipeline() as pipe:
+            pipe.get(self._info_key(session_id))
+            pipe.lrange(self._history_key(session_id), 0, -1)
+            pipe.expire(self._info_key(session_id), self.ttl)
+            pipe.expire(self._history_key(session_id), self.ttl)
+            user_info, history, _, _ = await pipe.execute()
+
+        if user_info is None:
+            return None
+        return {"user_info": json.loads(user_info), "history": [json.loads(turn) for turn in history]}
+
+    async def append_turn(self, session_id, question, answer):
+        if not await self.redis.exists(self._info_key(session_id)):
+            return False
+
+        turn = json.dumps({"question": question, "answer": answer}, ensure_ascii=False)
+        async with self.redis.pipeline() as pipe:
+            pipe.rpush(self._history_key(session_id), turn)
+            pipe.ltrim(self._history_key(session_id), -self.max_turns, -1)
+            pipe.expire(self._history_key(session_id), self.ttl)
+            pipe.expire(self._info_key(session_id), self.ttl)
+            await pipe.execute()
+        return True
+
+    async def delete(self, session_id):
+        await self.redis.delete(self._info_key(session_id), self._history_key(session_id))
+
+    async def close(self):
+        await self.redis.aclose()
+
+    def stats(self):
+        return {"backend": type(self).__name__, "sessions": None, "evictions": None}
+
+def create_session_store(backend=SESSION_BACKEND):
+    """
+    Creates the session store configured by SESSION_BACKEND.
+
+    Returns:
+        MemorySessionStore or RedisSessionStore: The store.
+    """
+    if backend == "redis":
+        return RedisSessionStore()
+    if backend == "memory":
+        return MemorySessionStore()
+    raise ValueError(f"Unknown session backend '{backend}'. Expected memory or redis.")
@@ -0,0 +1,194 @@
+"""
+Module: vector_index.py
+
+Purpose:
+Builds, persists and tunes the FAISS index used for knowledge base retrieval. The index type is configurable,
+so the exhaustive flat scan can be swapped for an approximate index once the corpus grows:
+
+- flat:      exact search (faiss.IndexFlatL2). No training, best recall, O(N·d) per query.
+- ivf_flat:  inverted file over k-means clusters; searches `nprobe` clusters per query.
+- hnsw:      hierarchical navigable small-world graph; tuned with `efSearch`.
+- ivf_pq:    inverted file with product-quantized vectors; smallest memory footprint.
+
+Trained indexes are written next to the embedding store, named after a fingerprint of the store's section keys,
+so a rebuilt knowledge base never reuses a stale index. Persisted indexes are opened with FAISS's mmap flag so
+workers share the inverted lists through the page cache.
+
+Configuration (environment variables, read by data_loader.py):
+- KB_INDEX_TYPE: one of INDEX_TYPES (default "flat")
+- KB_NPROBE: clusters searched per query for IVF indexes
+- KB_EF_SEARCH: candidate list size for HNSW
+
+Use `benchmarks/bench_index.py` to compare recall@k, QPS and memory before changing the default.
+"""
+
+import os
+import glob
+import hashlib
+import logging
+import math
+import tempfile
+import time
+import faiss
+
+logging.basicConfig(level=logging.INFO)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+HNSW_M = 32
+HNSW_EF_CONSTRUCTION = 200
+PQ_SUBVECTOR_DIM = 24
+
+def default_nlist(count):
+    """
+    Picks the number of IVF clusters: about 4·sqrt(N), capped so that each centroid gets the
+    39 training points FAISS asks for.
+
+    Args:
+        count (int): Number of vectors in the corpus.
+
+    Returns:
+        int: Number of clusters.
+    """
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+def index_factory_string(index_type, count, dim):
+    """
+    Translates an index type into a FAISS factory string sized for the corpus.
+
+    Args:
+        index_type (str): One of INDEX_TYPES.
+        count (int): Number of vectors in the corpus.
+        dim (int): Vector dimensionality.
+
+    Returns:
+        str: FAISS index factory string.
+    """
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf_flat":
+        return f"IVF{default_nlist(count)},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{HNSW_M}"
+    if index_type == "ivf_pq":
+        # One sub-quantizer per PQ_SUBVECTOR_DIM dimensions, each with at most 256 centroids and 39 training points per centroid
+        m = next(m for m in range(max(1, dim // PQ_SUBVECTOR_DIM), 0, -1) if dim % m == 0)
+        nbits = max(1, min(8, int(math.log2(max(count // 39, 2)))))
+        return f"IVF{default_nlist(count)},PQ{m}x{nbits}"
+    raise ValueError(f"Unknown index type '{index_type}'. Expected one of {', '.join(INDEX_TYPES)}.")
+
+def build_index(embeddings, index_type="flat"):
+    """
+    Creates, trains and fills an index.
+
+    Args:
+        embeddings (np.ndarray): float32 matrix of shape (N, d).
+        index_type (str): One of INDEX_TYPES.
+
+    Returns:
+        faiss.Index: The populated index.
+    """
+    count, dim = embeddings.shape
+    factory = index_factory_string(index_type, count, dim)
+    start = time.perf_counter()
+
+    index = faiss.index_factory(dim, factory, faiss.METRIC_L2)
+    if index_type == "hnsw":
+        index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+    if not index.is_trained:
+        index.train(embeddings)
+    index.add(embeddings)
+
+    logging.info(f"Built {factory} index over {count} vectors in {time.perf_counter() - start:.2f}s.")
+    return index
+
+def configure_search(index, nprobe=None, ef_search=None):
+    """
+    Applies query-time parameters to an index. Parameters that do not apply to the index type are ignored.
+
+    Args:
+        index (faiss.Index): Index to tune.
+        nprobe (int, optional): IVF clusters to visit per query. Higher means better recall and slower queries.
+        ef_search (int, optional): HNSW candidate list size. Higher means better recall and slower queries.
+    """
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None and nprobe:
+        ivf.nprobe = min(nprobe, ivf.nlist)
+    if hasattr(index, "hnsw") and ef_search:
+        index.hnsw.efSearch = ef_search
+
+def filtered_search_params(index, ids):
+    """
+    Builds search parameters that restrict a query to a subset of the index's rows.
+    FAISS checks the selector inside the scan (flat), the visited inverted lists (IVF) or the graph walk (HNSW),
+    so excluded rows never take one of the top-k slots. The index's current nprobe / efSearch are carried over,
+    since type-specific parameters override the ones set by `configure_search`.
+
+    Args:
+        index (faiss.Index): Index that will be searched.
+        ids (np.ndarray): int64 row ids that may be returned.
+
+    Returns:
+        faiss.SearchParameters: Parameters to pass as `index.search(..., params=...)`.
+    """
+    selector = faiss.IDSelectorBatch(ids)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        params = faiss.SearchParametersIVF(sel=selector, nprobe=ivf.nprobe)
+    elif hasattr(index, "hnsw"):
+        params = faiss.SearchParametersHNSW(sel=selector, efSearch=index.hnsw.efSearch)
+    else:
+        params = faiss.SearchParameters(sel=selector)
+    # The parameters only hold a raw pointer to the selector; keep it alive for as long as they are used
+    params.referenced_objects = [selector, ids]
+    return params
+
+def store_fingerprint(store):
+    return hashlib.sha256(store.keys.tobytes()).hexdigest()[:16]
+
+def index_path(store_path, index_type, fingerprint):
+    return f"{store_path}.{index_type}-{fingerprint}.faiss"
+
+def load_or_build_index(store, store_path, index_type="flat"):
+    """
+    Returns an index over the store's embeddings, reusing a persisted one when it matches the store.
+
+    Flat indexes are cheap to rebuild and are never persisted. Other types are trained once, written next to the
+    store, and memory-mapped on later loads. Each build writes a temporary file of its own and renames it into place,
+    so workers building the same index at once never mix their output. Indexes of other builds of the store that are
+    older than the store file are removed; newer ones may belong to a store another worker is still switching to.
+
+    Args:
+        store (EmbeddingStore): Opened embedding store.
+        store_path (str): Path of the store file.
+        index_type (str): One of INDEX_TYPES.
+
+    Returns:
+        faiss.Index: The index.
+    """
+    if index_type == "flat":
+        return build_index(store.embeddings, index_type)
+
+    path = index_path(store_path, index_type, store_fingerprint(store))
+    if os.path.exists(path):
+        logging.info(f"Loading persisted index {path}...")
+        return faiss.read_index(path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+
+    index = build_index(store.embeddings, index_type)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=os.path.basename(path) + ".", suffix=".tmp")
+    os.close(fd)
+    try:
+        faiss.write_index(index, tmp_path)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    store_mtime = os.path.getmtime(store_path)
+    for stale_path in glob.glob(f"{glob.escape(store_path)}.{index_type}-*.faiss"):
+        try:
+            if stale_path != path and os.path.getmtime(stale_path) < store_mtime:
+                os.remove(stale_path)
+        except FileNotFoundError:
+            # Already removed by another worker
+            pass
+    return index
@@ -0,0 +1,100 @@
+"""
+Script: bench_embeddings.py
+
+Purpose:
+Measures knowledge base rebuild throughput offline by running `create_embeddings` against the
+local mock OpenAI endpoint. The first row (batch size 1, one worker) reproduces the original
+one-request-per-section behaviour and serves as the baseline. The last line times an incremental
+rebuild after a single file is edited.
+
+Usage:
+    cd phase2
+    python benchmarks/bench_embeddings.py --latency 0.2 --rate-limit-ratio 0.05
+"""
+
+import os
+import sys
+import argparse
+import asyncio
+import logging
+import tempfile
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+PORT = 8100
+os.environ["AZURE_OPENAI_SERVICES_URL"] = f"http://127.0.0.1:{PORT}"
+os.environ["AZURE_OPENAI_SERVICES_KEY"] = "mock"
+
+from mock_openai import app, start_mock_server
+import create_embeddings
+
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phase2_data'))
+
+CONFIGURATIONS = [
+    # (batch size, concurrency)
+    (1, 1),
+    (16, 1),
+    (16, 4),
+    (16, 8),
+    (16, 16),
+]
+
+def run_benchmark(latency, rate_limit_ratio, copies):
+    server = start_mock_server(PORT, latency=latency, rate_limit_ratio=rate_limit_ratio)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # Replicate the knowledge base to simulate a larger corpus
+        for copy in range(copies):
+            for filename in os.listdir(DATA_DIR):
+                with open(os.path.join(DATA_DIR, filename), "r", encoding="utf-8") as src:
+                    content = src.read()
+                with open(os.path.join(tmp_dir, f"{copy}_{filename}"), "w", encoding="utf-8") as dst:
+                    dst.write(content)
+
+        print(f"{'batch':>6} {'workers':>8} {'sections':>9} {'requests':>9} {'seconds':>8} {'sections/s':>11}")
+        for batch_size, concurrency in CONFIGURATIONS:
+            app.state.request_count = 0
+            output_file = os.path.join(tmp_dir, "embeddings.kb")
+
+            start = time.perf_counter()
+            sections = asyncio.run(create_embeddings.create_and_save_embeddings_async(
+                data_dir=tmp_dir,
+                output_file=output_file,
+                max_concurrency=concurrency,
+                max_batch_size=batch_size,
+                incremental=False,
+                cache_file=None
+            ))
+            elapsed = time.perf_counter() - start
+
+            print(f"{batch_size:>6} {concurrency:>8} {sections:>9} {app.state.request_count:>9} "
+                  f"{elapsed:>8.2f} {sections / elapsed:>11.1f}")
+
+        # Incremental rebuild after editing a single file
+        edited = os.path.join(tmp_dir, "0_dentel_services.html")
+        with open(edited, "a", encoding="utf-8") as f:
+            f.write("\n\n<p>סעיף חדש שנוסף לצורך בדיקת בנייה מצטברת.</p>\n")
+
+        app.state.request_count = 0
+        start = time.perf_counter()
+        embedded = asyncio.run(create_embeddings.create_and_save_embeddings_async(
+            data_dir=tmp_dir,
+            output_file=output_file,
+            cache_file=None
+        ))
+        elapsed = time.perf_counter() - start
+        print(f"\nIncremental rebuild after editing {os.path.basename(edited)}: "
+              f"{embedded} sections embedded, {app.state.request_count} requests, {elapsed:.2f}s")
+
+    server.should_exit = True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark knowledge base rebuild throughput against a mock endpoint.")
+    parser.add_argument("--latency", type=float, default=0.2, help="Simulated seconds per embedding request.")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--copies", type=int, default=1, help="Number of times to replicate phase2_data.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    run_benchmark(args.latency, args.rate_limit_ratio, args.copies)
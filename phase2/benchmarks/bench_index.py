@@ -0,0 +1,100 @@
+"""
+Script: bench_index.py
+
+Purpose:
+Compares the index backends in `vector_index.py` so the retrieval trade-off can be chosen from data.
+For each index type and query-time setting it reports build time, recall@k against the exact flat index,
+single-query QPS and serialized index size.
+
+By default a synthetic, clustered corpus of normalized vectors is generated. Pass `--store` to benchmark
+against a real embedding store; queries are then perturbed copies of stored vectors.
+
+Usage:
+    cd phase2
+    python benchmarks/bench_index.py --count 20000 --queries 500 --k 10
+    python benchmarks/bench_index.py --store backend/knowledge_base_embeddings.kb
+"""
+
+import os
+import sys
+import argparse
+import logging
+import time
+import faiss
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+from embedding_store import open_store
+from vector_index import build_index, configure_search
+
+SEARCH_SWEEPS = {
+    "flat": [{}],
+    "ivf_flat": [{"nprobe": n} for n in (1, 4, 16, 64)],
+    "hnsw": [{"ef_search": ef} for ef in (16, 64, 256)],
+    "ivf_pq": [{"nprobe": n} for n in (4, 16, 64)],
+}
+
+def synthetic_corpus(count, queries, dim, clusters, seed=0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim)).astype("float32")
+
+    def sample(n):
+        points = centers[rng.integers(0, clusters, n)] + 0.5 * rng.standard_normal((n, dim)).astype("float32")
+        return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+    return sample(count), sample(queries)
+
+def store_corpus(store_path, queries, seed=0):
+    rng = np.random.default_rng(seed)
+    embeddings = np.ascontiguousarray(open_store(store_path).embeddings)
+    picks = embeddings[rng.integers(0, len(embeddings), queries)]
+    noisy = picks + 0.01 * rng.standard_normal(picks.shape).astype("float32")
+    return embeddings, noisy / np.linalg.norm(noisy, axis=1, keepdims=True)
+
+def recall_at_k(found, truth):
+    k = truth.shape[1]
+    return np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)])
+
+def run_benchmark(embeddings, queries, k, index_types):
+    truth = None
+    print(f"Corpus: {embeddings.shape[0]} x {embeddings.shape[1]}, {len(queries)} queries, k={k}\n")
+    print(f"{'index':<10} {'params':<16} {'build s':>8} {'recall@k':>9} {'QPS':>9} {'size MB':>8}")
+
+    for index_type in index_types:
+        start = time.perf_counter()
+        index = build_index(embeddings, index_type)
+        build_seconds = time.perf_counter() - start
+        size_mb = len(faiss.serialize_index(index)) / 2**20
+
+        for params in SEARCH_SWEEPS[index_type]:
+            configure_search(index, **params)
+
+            # The backend searches one question at a time, so time single-query calls
+            start = time.perf_counter()
+            found = np.vstack([index.search(query.reshape(1, -1), k)[1] for query in queries])
+            qps = len(queries) / (time.perf_counter() - start)
+
+            if truth is None:
+                truth = found if index_type == "flat" else build_index(embeddings, "flat").search(queries, k)[1]
+            label = ",".join(f"{key}={value}" for key, value in params.items()) or "-"
+            print(f"{index_type:<10} {label:<16} {build_seconds:>8.2f} {recall_at_k(found, truth):>9.3f} "
+                  f"{qps:>9.0f} {size_mb:>8.1f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark FAISS index backends for knowledge base retrieval.")
+    parser.add_argument("--store", help="Benchmark a real embedding store instead of a synthetic corpus.")
+    parser.add_argument("--count", type=int, default=20000, help="Synthetic corpus size.")
+    parser.add_argument("--dim", type=int, default=1536, help="Synthetic vector dimensionality (ada-002 is 1536).")
+    parser.add_argument("--clusters", type=int, default=200, help="Number of topics in the synthetic corpus.")
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--index-types", nargs="+", default=list(SEARCH_SWEEPS), choices=list(SEARCH_SWEEPS))
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.store:
+        embeddings, queries = store_corpus(args.store, args.queries)
+    else:
+        embeddings, queries = synthetic_corpus(args.count, args.queries, args.dim, args.clusters)
+    run_benchmark(embeddings, queries, args.k, args.index_types)
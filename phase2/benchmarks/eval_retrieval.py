@@ -0,0 +1,120 @@
+"""
+Script: eval_retrieval.py
+
+Purpose:
+Offline retrieval evaluation against the six phase2_data files. Each line of `retrieval_eval.jsonl` holds a
+question, the asking user's HMO and insurance tier, and a substring of the chunk that answers it. For every
+retrieval mode the script reports hit@k (the share of questions whose answer chunk is among the first k results)
+and retrieval latency, excluding the embedding call:
+
+- vector:        FAISS search only
+- bm25:          lexical search only (needs no embeddings)
+- hybrid:        vector and BM25 fused with reciprocal rank fusion (the backend default)
+- hybrid_rerank: hybrid followed by `data_loader.rerank`
+
+Question embeddings are fetched once through the shared embedding cache, so repeated runs make no API calls.
+Vectors from benchmarks/mock_openai.py are hash-based, so vector modes are only meaningful against Azure OpenAI;
+use `--lexical-only` to evaluate BM25 without an endpoint.
+
+Usage:
+    cd phase2/backend
+    python ../benchmarks/eval_retrieval.py
+    python ../benchmarks/eval_retrieval.py --lexical-only
+"""
+
+import os
+import sys
+import argparse
+import json
+import logging
+import time
+import numpy as np
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+
+import data_loader
+from embedding_cache import EmbeddingCache, EMBEDDING_CACHE_FILE
+
+EVAL_FILE = os.path.join(os.path.dirname(__file__), "retrieval_eval.jsonl")
+MODES = ("vector", "bm25", "hybrid", "hybrid_rerank")
+K_VALUES = (1, 3, 5, 8)
+
+def load_questions(file_path=EVAL_FILE):
+    with open(file_path, "r", encoding="utf-8") as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def embed_questions(questions):
+    from create_embeddings import get_embedding, EMBEDDING_MODEL
+
+    cache = EmbeddingCache(EMBEDDING_MODEL, file_path=EMBEDDING_CACHE_FILE or None)
+    embeddings = []
+    for question in questions:
+        vector = cache.get(question["question"])
+        if vector is None:
+            vector = np.asarray(get_embedding(question["question"]), dtype=np.float32)
+            cache.put(question["question"], vector)
+        embeddings.append(vector.reshape(1, -1))
+    cache.save()
+    return embeddings
+
+def run_mode(mode, question, embedding, top_k):
+    hmo, tier = data_loader.user_filters(question)
+    if mode == "bm25":
+        return data_loader.lexical_search(question["question"], top_k, hmo, tier)
+    return data_loader.retrieve(
+        embedding, top_k, hmo, tier,
+        query_text=question["question"],
+        hybrid=mode != "vector",
+        rerank_results=mode == "hybrid_rerank"
+    )
+
+def evaluate(questions, embeddings, modes, k_values):
+    _, texts = data_loader.get_knowledge_base()
+    top_k = max(k_values)
+    print(f"{len(questions)} questions, {len(texts)} chunks\n")
+    print(f"{'mode':<14} " + " ".join(f"{f'hit@{k}':>7}" for k in k_values) + f" {'mean ms':>8} {'p95 ms':>8}")
+
+    results = {}
+    for mode in modes:
+        hits = np.zeros(len(k_values))
+        latencies = []
+        for question, embedding in zip(questions, embeddings):
+            start = time.perf_counter()
+            ids = run_mode(mode, question, embedding, top_k)
+            latencies.append((time.perf_counter() - start) * 1000)
+
+            ranks = [rank for rank, i in enumerate(ids) if question["expected"] in texts[i]]
+            if ranks:
+                hits += [ranks[0] < k for k in k_values]
+
+        hit_rates = hits / len(questions)
+        results[mode] = {
+            **{f"hit@{k}": round(float(rate), 3) for k, rate in zip(k_values, hit_rates)},
+            "mean_ms": round(float(np.mean(latencies)), 3),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 3)
+        }
+        print(f"{mode:<14} " + " ".join(f"{rate:>7.3f}" for rate in hit_rates) +
+              f" {results[mode]['mean_ms']:>8.2f} {results[mode]['p95_ms']:>8.2f}")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate knowledge base retrieval with hit@k and latency.")
+    parser.add_argument("--store", default=data_loader.EMBEDDINGS_FILE, help="Embedding store to evaluate.")
+    parser.add_argument("--questions", default=EVAL_FILE, help="JSONL evaluation set.")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--k", nargs="+", type=int, default=list(K_VALUES))
+    parser.add_argument("--lexical-only", action="store_true", help="Evaluate BM25 only, without embeddings.")
+    parser.add_argument("--output", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    data_loader.get_knowledge_base(args.store)
+    questions = load_questions(args.questions)
+
+    modes = ["bm25"] if args.lexical_only else args.modes
+    embeddings = [None] * len(questions) if modes == ["bm25"] else embed_questions(questions)
+    results = evaluate(questions, embeddings, modes, sorted(args.k))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
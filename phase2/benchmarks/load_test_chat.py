@@ -0,0 +1,261 @@
+"""
+Script: load_test_chat.py
+
+Purpose:
+Offline load test and latency benchmark for the phase 2 backend. The backend (`main:app`) runs as a separate
+uvicorn process pointed at the local mock OpenAI server, whose per-call latency and completion token rate are
+configurable. A mix of Hebrew and English questions from different HMOs and tiers (the retrieval evaluation set,
+`retrieval_eval.jsonl`) is replayed at fixed concurrency levels, a few of them as follow-ups with history.
+
+For each level the script reports:
+- end-to-end p50 / p95 / p99 latency and requests per second (and time to first byte on /chat/stream);
+- mean and p95 latency of every backend stage (embed, search, prompt_build, completion, ...), taken from the
+  difference of the backend's /metrics histograms before and after the level;
+- the backend's resident memory after the level.
+
+Results, together with the configuration and the git commit, are written as JSON. Pass `--compare` with an earlier
+result file to print the change in p95 latency and throughput per level.
+
+The knowledge base store (backend/knowledge_base_embeddings.kb) must exist; build it against the
+mock with `python benchmarks/bench_embeddings.py` or create_embeddings.py.
+
+Usage:
+    cd phase2
+    python benchmarks/load_test_chat.py --latency 0.3 --token-rate 50 --answer-tokens 100 --concurrency 1 4 16 32
+    python benchmarks/load_test_chat.py --endpoint stream --output after.json --compare before.json
+"""
+
+import os
+import sys
+import argparse
+import asyncio
+import json
+import logging
+import subprocess
+import time
+import httpx
+import numpy as np
+from prometheus_client.parser import text_string_to_metric_families
+
+from mock_openai import start_mock_server
+
+MOCK_PORT = 8100
+BACKEND_PORT = 8001
+BACKEND_URL = f"http://127.0.0.1:{BACKEND_PORT}"
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+QUESTIONS_FILE = os.path.join(os.path.dirname(__file__), "retrieval_eval.jsonl")
+# Every n-th request is a follow-up carrying a previous turn, which skips the answer cache
+FOLLOW_UP_EVERY = 4
+
+def load_payloads(file_path=QUESTIONS_FILE):
+    """
+    Builds the request mix from the evaluation questions, each asked by a user of the question's HMO and tier.
+
+    Returns:
+        list[dict]: /chat request payloads.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        questions = [json.loads(line) for line in file if line.strip()]
+
+    payloads = []
+    for i, question in enumerate(questions):
+        history = []
+        if i % FOLLOW_UP_EVERY == FOLLOW_UP_EVERY - 1:
+            previous = questions[i - 1]["question"]
+            history = [{"question": previous, "answer": "תשובה קודמת לדוגמה. A previous sample answer."}]
+        payloads.append({
+            "user_info": {"first_name": "Test", "hmo_name": question["hmo_name"], "insurance_tier": question["insurance_tier"]},
+            "history": history,
+            "question": question["question"]
+        })
+    return payloads
+
+def start_backend(answer_cache):
+    env = {
+        **os.environ,
+        "AZURE_OPENAI_SERVICES_URL": f"http://127.0.0.1:{MOCK_PORT}",
+        "AZURE_OPENAI_SERVICES_KEY": "mock",
+        "ANSWER_CACHE_BACKEND": answer_cache,
+        # Question embeddings persisted by earlier runs would turn every embed stage into a cache hit
+        "EMBEDDING_CACHE_FILE": ""
+    }
+    backend = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(BACKEND_PORT), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=env
+    )
+
+    for _ in range(300):
+        try:
+            if httpx.get(f"{BACKEND_URL}/ready").status_code == 200:
+                return backend
+        except httpx.TransportError:
+            pass
+        time.sleep(0.1)
+    backend.terminate()
+    raise RuntimeError("Backend did not become ready; is the knowledge base store built?")
+
+async def scrape_stages(client):
+    """
+    Returns:
+        dict: stage -> {"buckets": [(upper bound, cumulative count)], "sum": float, "count": float}
+    """
+    response = await client.get(f"{BACKEND_URL}/metrics")
+    stages = {}
+    for family in text_string_to_metric_families(response.text):
+        if family.name != "chatbot_stage_seconds":
+            continue
+        for sample in family.samples:
+            stage = stages.setdefault(sample.labels["stage"], {"buckets": [], "sum": 0.0, "count": 0.0})
+            if sample.name.endswith("_bucket"):
+                stage["buckets"].append((float(sample.labels["le"]), sample.value))
+            elif sample.name.endswith("_sum"):
+                stage["sum"] = sample.value
+            elif sample.name.endswith("_count"):
+                stage["count"] = sample.value
+    return stages
+
+def stage_summary(before, after):
+    """
+    Computes per-stage latency over an interval from two histogram scrapes.
+    The p95 is the upper bound of the bucket holding the 95th percentile observation.
+
+    Returns:
+        dict: stage -> {"count", "mean_ms", "p95_ms"}
+    """
+    summary = {}
+    for stage, end in after.items():
+        start = before.get(stage, {"buckets": [], "sum": 0.0, "count": 0.0})
+        count = end["count"] - start["count"]
+        if count <= 0:
+            continue
+
+        start_buckets = dict(start["buckets"])
+        p95 = None
+        for bound, cumulative in sorted(end["buckets"]):
+            if cumulative - start_buckets.get(bound, 0.0) >= 0.95 * count:
+                p95 = bound
+                break
+        summary[stage] = {
+            "count": int(count),
+            "mean_ms": round((end["sum"] - start["sum"]) / count * 1000, 2),
+            "p95_ms": round(p95 * 1000, 2) if p95 not in (None, float("inf")) else None
+        }
+    return summary
+
+async def send_request(client, endpoint, payload):
+    """
+    Returns:
+        tuple: (total seconds, seconds to the first body byte)
+    """
+    start = time.perf_counter()
+    if endpoint == "chat":
+        response = await client.post(f"{BACKEND_URL}/chat", json=payload)
+        response.raise_for_status()
+        elapsed = time.perf_counter() - start
+        return elapsed, elapsed
+
+    first_byte = None
+    async with client.stream("POST", f"{BACKEND_URL}/chat/stream", json=payload) as response:
+        response.raise_for_status()
+        async for _ in response.aiter_raw():
+            if first_byte is None:
+                first_byte = time.perf_counter() - start
+    return time.perf_counter() - start, first_byte or 0.0
+
+async def run_level(client, endpoint, payloads, concurrency, requests_per_worker):
+    latencies, first_bytes = [], []
+    next_payload = iter(range(concurrency * requests_per_worker))
+
+    async def worker():
+        for i in next_payload:
+            total, first_byte = await send_request(client, endpoint, payloads[i % len(payloads)])
+            latencies.append(total)
+            first_bytes.append(first_byte)
+
+    before = await scrape_stages(client)
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    after = await scrape_stages(client)
+    status = (await client.get(f"{BACKEND_URL}/ready")).json()
+
+    latencies_ms = np.array(latencies) * 1000
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(float(np.percentile(latencies_ms, 50)), 1),
+        "p95_ms": round(float(np.percentile(latencies_ms, 95)), 1),
+        "p99_ms": round(float(np.percentile(latencies_ms, 99)), 1),
+        "ttfb_p50_ms": round(float(np.percentile(first_bytes, 50)) * 1000, 1),
+        "rss_mb": status["rss_mb"],
+        "stages": stage_summary(before, after)
+    }
+
+async def run_load_test(endpoint, payloads, levels, requests_per_worker):
+    results = []
+    async with httpx.AsyncClient(timeout=120, limits=httpx.Limits(max_connections=max(levels) + 2)) as client:
+        # Warm up connections, the tokenizer and the first-call paths outside the measurements
+        await run_level(client, endpoint, payloads, 1, 2)
+
+        print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfb ms':>8} {'rss MB':>7}")
+        for concurrency in levels:
+            result = await run_level(client, endpoint, payloads, concurrency, requests_per_worker)
+            results.append(result)
+            print(f"{concurrency:>11} {result['rps']:>8.2f} {result['p50_ms']:>8.1f} {result['p95_ms']:>8.1f} "
+                  f"{result['p99_ms']:>8.1f} {result['ttfb_p50_ms']:>8.1f} {result['rss_mb']:>7.1f}")
+            print("            " + ", ".join(
+                f"{stage} {summary['mean_ms']:.1f}ms" for stage, summary in result["stages"].items()
+            ))
+    return results
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline_path):
+    with open(baseline_path, "r", encoding="utf-8") as file:
+        baseline = {level["concurrency"]: level for level in json.load(file)["levels"]}
+
+    print(f"\nChange against {baseline_path}:")
+    for level in results:
+        previous = baseline.get(level["concurrency"])
+        if previous is None:
+            continue
+        p95_change = (level["p95_ms"] - previous["p95_ms"]) / previous["p95_ms"] * 100
+        rps_change = (level["rps"] - previous["rps"]) / previous["rps"] * 100
+        print(f"  concurrency {level['concurrency']:>3}: p95 {p95_change:+.1f}%, req/s {rps_change:+.1f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test the chat backend against a mock OpenAI server.")
+    parser.add_argument("--latency", type=float, default=0.5, help="Simulated seconds per OpenAI call.")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Simulated completion tokens per second.")
+    parser.add_argument("--answer-tokens", type=int, default=0, help="Simulated answer length in tokens.")
+    parser.add_argument("--endpoint", choices=("chat", "stream"), default="chat")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 32])
+    parser.add_argument("--requests-per-worker", type=int, default=4)
+    parser.add_argument("--answer-cache", choices=("none", "memory"), default="none",
+                        help="Answer cache of the backend; disabled by default so every request runs the full pipeline.")
+    parser.add_argument("--output", default="load_test_results.json", help="JSON results file.")
+    parser.add_argument("--compare", help="Earlier results file to compare against.")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    payloads = load_payloads()
+    mock = start_mock_server(MOCK_PORT, latency=args.latency, token_rate=args.token_rate, answer_tokens=args.answer_tokens)
+    backend = start_backend(args.answer_cache)
+    try:
+        results = asyncio.run(run_load_test(args.endpoint, payloads, args.concurrency, args.requests_per_worker))
+    finally:
+        backend.terminate()
+        backend.wait()
+        mock.should_exit = True
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump({"commit": git_commit(), "config": vars(args), "levels": results}, file, indent=2)
+    print(f"\nSaved results to {args.output}.")
+    if args.compare:
+        compare(results, args.compare)
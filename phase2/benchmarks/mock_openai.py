@@ -0,0 +1,199 @@
+"""
+Script: mock_openai.py
+
+Purpose:
+A local stand-in for the Azure OpenAI REST API, used to benchmark the phase 2 backend offline.
+It serves deterministic embeddings and canned chat completions so that knowledge base rebuilds and
+/chat load can be timed without network access or Azure credentials, and can inject latency and
+429 responses to exercise the retry path. With a token rate, completions are generated at that many
+tokens (words) per second, streamed or not, like a real model.
+
+Usage:
+    python mock_openai.py --port 8100 --latency 0.2 --rate-limit-ratio 0.05
+    python mock_openai.py --port 8100 --latency 0.3 --token-rate 50 --answer-tokens 200
+
+Then point the backend at it:
+    AZURE_OPENAI_SERVICES_URL=http://127.0.0.1:8100
+    AZURE_OPENAI_SERVICES_KEY=mock
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+EMBEDDING_DIM = 1536
+
+app = FastAPI(title="Mock Azure OpenAI")
+app.state.latency = 0.0
+app.state.rate_limit_ratio = 0.0
+app.state.request_count = 0
+app.state.token_rate = 0.0
+app.state.answer_tokens = 0
+
+
+def fake_embedding(text):
+    """
+    Produces a deterministic unit-length vector for a piece of text.
+
+    Args:
+        text (str): Input text.
+
+    Returns:
+        list[float]: Embedding of length EMBEDDING_DIM.
+    """
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+    vector = np.random.default_rng(seed).standard_normal(EMBEDDING_DIM).astype("float32")
+    vector /= np.linalg.norm(vector)
+    return vector.tolist()
+
+
+@app.post("/openai/deployments/{deployment}/embeddings")
+async def embeddings(deployment: str, request: Request):
+    app.state.request_count += 1
+    body = await request.json()
+
+    if random.random() < app.state.rate_limit_ratio:
+        return JSONResponse(
+            status_code=429,
+            headers={"retry-after-ms": "100"},
+            content={"error": {"code": "429", "message": "Rate limit is exceeded."}}
+        )
+
+    await asyncio.sleep(app.state.latency)
+
+    inputs = body["input"]
+    if isinstance(inputs, str):
+        inputs = [inputs]
+
+    return {
+        "object": "list",
+        "model": deployment,
+        "data": [
+            {"object": "embedding", "index": i, "embedding": fake_embedding(text)}
+            for i, text in enumerate(inputs)
+        ],
+        "usage": {
+            "prompt_tokens": sum(len(text) for text in inputs),
+            "total_tokens": sum(len(text) for text in inputs)
+        }
+    }
+
+
+MOCK_ANSWER = "זוהי תשובה לדוגמה משרת הדמה. This is a sample answer from the mock server."
+
+
+def mock_answer_words():
+    # Repeat the canned answer up to the configured length so completion time scales like a real answer
+    words = MOCK_ANSWER.split(" ")
+    count = app.state.answer_tokens or len(words)
+    return [words[i % len(words)] for i in range(count)]
+
+
+def token_delay():
+    return 1 / app.state.token_rate if app.state.token_rate else 0.0
+
+
+@app.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    app.state.request_count += 1
+    body = await request.json()
+
+    await asyncio.sleep(app.state.latency)
+
+    prompt_tokens = sum(len(message["content"]) for message in body["messages"]) // 4
+    words = mock_answer_words()
+    if body.get("stream"):
+        return StreamingResponse(stream_completion(deployment, words), media_type="text/event-stream")
+
+    await asyncio.sleep(len(words) * token_delay())
+    answer = " ".join(words)
+
+    return {
+        "id": f"chatcmpl-mock-{app.state.request_count}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": deployment,
+        "choices": [
+            {
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": answer}
+            }
+        ],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(words),
+            "total_tokens": prompt_tokens + len(words)
+        }
+    }
+
+
+async def stream_completion(deployment, words):
+    # Mirror Azure's SSE format: one chat.completion.chunk per word, then a [DONE] sentinel
+    delay = token_delay()
+    for i, word in enumerate(words):
+        if delay:
+            await asyncio.sleep(delay)
+        delta = {"content": word if i == 0 else " " + word}
+        chunk = {
+            "id": "chatcmpl-mock",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": deployment,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": None}]
+        }
+        yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+def start_mock_server(port=8100, latency=0.0, rate_limit_ratio=0.0, token_rate=0.0, answer_tokens=0):
+    """
+    Starts the mock server on a background thread and waits until it accepts requests.
+
+    Args:
+        port (int): Local port to listen on.
+        latency (float): Seconds of artificial delay added to every request.
+        rate_limit_ratio (float): Fraction of requests answered with HTTP 429.
+        token_rate (float): Completion tokens generated per second; 0 returns the whole answer at once.
+        answer_tokens (int): Length of mock answers in tokens; 0 uses the canned answer as is.
+
+    Returns:
+        uvicorn.Server: The running server; set `should_exit = True` to stop it.
+    """
+    app.state.latency = latency
+    app.state.rate_limit_ratio = rate_limit_ratio
+    app.state.request_count = 0
+    app.state.token_rate = token_rate
+    app.state.answer_tokens = answer_tokens
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local mock of the Azure OpenAI API.")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every request.")
+    parser.add_argument("--rate-limit-ratio", type=float, default=0.0, help="Fraction of requests answered with 429.")
+    parser.add_argument("--token-rate", type=float, default=0.0, help="Completion tokens per second (0: no delay).")
+    parser.add_argument("--answer-tokens", type=int, default=0, help="Mock answer length in tokens.")
+    args = parser.parse_args()
+
+    app.state.latency = args.latency
+    app.state.rate_limit_ratio = args.rate_limit_ratio
+    app.state.token_rate = args.token_rate
+    app.state.answer_tokens = args.answer_tokens
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
@@ -1,6 +1,31 @@
+import os
 import streamlit as st
 import requests
 
+BACKEND_URL = "http://localhost:8000"
+TRACING_ENABLED = os.getenv("CHATBOT_TRACING", "0") == "1"
+
+@st.cache_resource
+def setup_tracing():
+    """
+    Instruments `requests` so every backend call carries a W3C `traceparent` header, letting the backend's spans
+    join the frontend's trace. Streamlit reruns this script on every interaction, so this runs once per process.
+    """
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+    from opentelemetry.instrumentation.requests import RequestsInstrumentor
+
+    provider = TracerProvider(resource=Resource.create({"service.name": "medical-chatbot-frontend"}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+    RequestsInstrumentor().instrument()
+
+if TRACING_ENABLED:
+    setup_tracing()
+
 st.title("Medical Chatbot 🩺")
 
 # Initialize session state
@@ -8,6 +33,22 @@ if 'user_info' not in st.session_state:
     st.session_state.user_info = {}
 if 'history' not in st.session_state:
     st.session_state.history = []
+if 'session_id' not in st.session_state:
+    st.session_state.session_id = None
+
+def create_session():
+    # The backend keeps the user info and history; later requests only carry the session id and the question
+    response = requests.post(f"{BACKEND_URL}/sessions", json={"user_info": st.session_state.user_info})
+    response.raise_for_status()
+    st.session_state.session_id = response.json()["session_id"]
+    st.session_state.history = []
+
+def post_question(question):
+    return requests.post(
+        f"{BACKEND_URL}/sessions/{st.session_state.session_id}/messages/stream",
+        json={"question": question},
+        stream=True
+    )
 
 # Sidebar: User Info collection
 with st.sidebar:
@@ -33,7 +74,11 @@ with st.sidebar:
             "hmo_card_number": hmo_card_number,
             "insurance_tier": insurance_tier
         }
-        st.success("User information saved!")
+        try:
+            create_session()
+            st.success("User information saved!")
+        except requests.RequestException:
+            st.error("Could not start a chat session.")
 
 # Main chat interface
 st.header("💬 Chat")
@@ -44,19 +89,26 @@ if st.button("Ask"):
     if not st.session_state.user_info:
         st.error("⚠️ Please complete your user information first.")
     else:
-        payload = {
-            "user_info": st.session_state.user_info,
-            "history": st.session_state.history,
-            "question": question
-        }
-
-        response = requests.post("http://localhost:8000/chat", json=payload)
+        try:
+            if st.session_state.session_id is None:
+                create_session()
+            response = post_question(question)
+            if response.status_code == 404:
+                # The session expired on the backend; start a new one with the saved user info
+                response.close()
+                st.warning("Your session expired, so a new conversation was started.")
+                create_session()
+                response = post_question(question)
 
-        if response.ok:
-            answer = response.json()["response"]
-            st.session_state.history.append({"question": question, "answer": answer})
-            st.write(f"**Chatbot:** {answer}")
-        else:
+            with response:
+                if response.ok:
+                    # Render the answer incrementally as the backend forwards completion deltas
+                    st.write("**Chatbot:**")
+                    answer = st.write_stream(response.iter_content(chunk_size=None, decode_unicode=True))
+                    st.session_state.history.append({"question": question, "answer": answer})
+                else:
+                    st.error("Error in chatbot response")
+        except requests.RequestException:
             st.error("Error in chatbot response")
 
 # Display chat history clearly
@@ -0,0 +1,73 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from answer_cache import AnswerCache, MemoryAnswerStore, answer_scope, cacheable_user_info
+
+MACCABI_GOLD = {"hmo_name": "מכבי", "insurance_tier": "זהב"}
+CLALIT_GOLD = {"hmo_name": "כללית", "insurance_tier": "זהב"}
+
+@pytest.fixture
+def question():
+    return np.random.default_rng(0).standard_normal(16).astype("float32")
+
+@pytest.mark.asyncio
+async def test_similar_question_hits_within_scope(question):
+    cache = AnswerCache(MemoryAnswerStore(), threshold=0.95, ttl=60)
+    await cache.store_answer(question, MACCABI_GOLD, "תשובה", version="v1")
+
+    paraphrase = question + 0.01 * np.random.default_rng(1).standard_normal(16).astype("float32")
+
+    assert await cache.lookup(paraphrase, MACCABI_GOLD, version="v1") == "תשובה"
+    assert await cache.lookup(paraphrase, CLALIT_GOLD, version="v1") is None, "Answers must not leak across HMOs."
+    assert await cache.lookup(paraphrase, MACCABI_GOLD, version="v2") is None, "Answers must not survive a rebuild."
+    assert await cache.lookup(-question, MACCABI_GOLD, version="v1") is None, "Dissimilar question must miss."
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+
+def test_cached_answers_are_generated_without_personal_details():
+    dana = {**MACCABI_GOLD, "first_name": "דנה", "last_name": "כהן", "id_number": "031220015", "age": 34}
+    yossi = {"first_name": "יוסי", "hmo_name": "מכבי", "insurance_membership": "זהב", "age": 61}
+
+    assert cacheable_user_info(dana) == MACCABI_GOLD, "Personal details must not reach a cacheable prompt."
+    assert answer_scope(dana, "v1") == answer_scope(yossi, "v1"), "Users of the same HMO and tier should share answers."
+    assert answer_scope(dana, "v1") != answer_scope(CLALIT_GOLD, "v1")
+
+@pytest.mark.asyncio
+async def test_memory_store_bounds_entries_across_scopes():
+    store = MemoryAnswerStore(max_entries=3)
+    cache = AnswerCache(store, threshold=0.95, ttl=60)
+    vectors = np.random.default_rng(3).standard_normal((5, 16)).astype("float32")
+
+    for i, vector in enumerate(vectors):
+        await cache.store_answer(vector, {"hmo_name": "מכבי", "insurance_tier": f"tier {i}"}, f"answer {i}")
+
+    assert store.size() == 3 and store.evictions == 2, "The entry limit applies across scopes."
+    assert len(store.scopes) == 3, "Scopes whose entries were all evicted should be dropped."
+
+    expired = MemoryAnswerStore()
+    await AnswerCache(expired, ttl=0).store_answer(vectors[0], MACCABI_GOLD, "stale")
+    await AnswerCache(expired, ttl=60).store_answer(vectors[1], CLALIT_GOLD, "fresh")
+    assert expired.size() == 1 and list(expired.scopes) == [answer_scope(CLALIT_GOLD)], "Expired entries and their scopes should be pruned."
+
+@pytest.mark.asyncio
+async def test_expiry_eviction_and_invalidation(question):
+    store = MemoryAnswerStore(max_entries=2)
+    cache = AnswerCache(store, threshold=0.95, ttl=60)
+    others = np.random.default_rng(2).standard_normal((2, 16)).astype("float32")
+
+    await cache.store_answer(question, MACCABI_GOLD, "first")
+    await cache.store_answer(others[0], MACCABI_GOLD, "second")
+    await cache.store_answer(others[1], MACCABI_GOLD, "third")
+
+    assert await cache.lookup(question, MACCABI_GOLD) is None, "Least recently used entry should be evicted."
+    assert store.evictions == 1
+
+    expired = AnswerCache(MemoryAnswerStore(), ttl=0)
+    await expired.store_answer(question, MACCABI_GOLD, "stale")
+    assert await expired.lookup(question, MACCABI_GOLD) is None, "Expired entry should miss."
+
+    cache.invalidate()
+    assert store.size() == 0
@@ -0,0 +1,34 @@
+import os
+import sys
+import pytest
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from chunker import chunk_html_file, pack_text
+
+DENTAL_FILE = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'phase2_data', 'dentel_services.html'))
+
+def test_table_rows_become_self_contained_chunks():
+    chunks = chunk_html_file(DENTAL_FILE)
+    fillings = [chunk for chunk in chunks if chunk["metadata"]["service"] == "סתימות"]
+
+    assert len(fillings) == 9, "Expected one chunk per HMO and tier for each table row."
+    maccabi_gold = [c for c in fillings if c["metadata"]["hmo"] == "מכבי" and c["metadata"]["tier"] == "זהב"]
+    assert len(maccabi_gold) == 1
+    text = maccabi_gold[0]["text"]
+    assert "מרפאות שיניים" in text and "סתימות" in text and "80% הנחה" in text, "Chunk lost its table context."
+    assert maccabi_gold[0]["metadata"]["source"] == "dentel_services.html"
+
+def test_hmo_list_items_are_tagged():
+    chunks = chunk_html_file(DENTAL_FILE)
+    phones = [c for c in chunks if c["metadata"]["section"].endswith("מספרי טלפון לשירות לקוחות")]
+
+    assert sorted(c["metadata"]["hmo"] for c in phones) == sorted(["מכבי", "מאוחדת", "כללית"])
+
+def test_pack_text_respects_size_and_overlap():
+    parts = [" ".join(f"word{i}" for i in range(100))]
+    chunks = pack_text(parts, max_chars=120, overlap_chars=20)
+
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 120 for chunk in chunks), "Chunk exceeds the size limit."
+    assert chunks[1].split()[0] in chunks[0].split(), "Consecutive chunks should overlap."
@@ -1,22 +1,112 @@
 import os
 import sys
+from types import SimpleNamespace
+import numpy as np
 import pytest
 
 # Ensure backend directory is in path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
 
-from create_embeddings import create_and_save_embeddings, DATA_DIR
+from create_embeddings import create_and_save_embeddings, pack_batches, DATA_DIR
+from embedding_store import open_store
 
-def test_create_embeddings():
+class FakeEmbeddings:
+    """
+    Stands in for the embeddings API of AsyncAzureOpenAI, failing once `fail_after` requests were answered.
+    """
+
+    def __init__(self, fail_after=None):
+        self.fail_after = fail_after
+        self.requests = 0
+        self.inputs = []
+
+    async def create(self, model, input):
+        if self.fail_after is not None and self.requests >= self.fail_after:
+            raise RuntimeError("Interrupted")
+        self.requests += 1
+        self.inputs.extend(input)
+        return SimpleNamespace(data=[SimpleNamespace(index=i, embedding=[float(len(text)), 1.0]) for i, text in enumerate(input)])
+
+def fake_client(fail_after=None):
+    return SimpleNamespace(embeddings=FakeEmbeddings(fail_after))
+
+def test_create_embeddings(tmp_path):
     # Temporarily change working directory to backend
     backend_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
     original_dir = os.getcwd()
     os.chdir(backend_dir)
 
     try:
-        create_and_save_embeddings()
-        embeddings_file_path = os.path.join(os.getcwd(), 'knowledge_base_embeddings.pkl')
+        embeddings_file_path = str(tmp_path / 'knowledge_base_embeddings.kb')
+        create_and_save_embeddings(output_file=embeddings_file_path, client=fake_client(), cache_file=None)
 
         assert os.path.exists(embeddings_file_path), "Embeddings file not created successfully."
+        assert open_store(embeddings_file_path).count > 0
     finally:
-        os.chdir(original_dir)
\ No newline at end of file
+        os.chdir(original_dir)
+
+def test_pack_batches_respects_limits():
+    texts = ["short text"] * 40 + ["x" * 4000]
+    batches = pack_batches(texts, max_batch_size=16, max_batch_tokens=2000)
+
+    assert sorted(i for batch in batches for i in batch) == list(range(len(texts))), "Every text must be batched exactly once."
+    assert all(len(batch) <= 16 for batch in batches), "Batch exceeds the input limit."
+    assert batches[-1] == [40], "Oversized text should be sent in its own batch."
+
+def test_interrupted_build_resumes_from_partial_file(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    sections = "".join(f"<h2>Section {i}</h2><p>Paragraph number {i} about dental care.</p>" for i in range(6))
+    (data_dir / "services.html").write_text(f"<html><body>{sections}</body></html>", encoding="utf-8")
+    output_file = str(tmp_path / "embeddings.kb")
+    options = {"data_dir": str(data_dir), "output_file": output_file, "max_concurrency": 1, "max_batch_size": 2, "cache_file": None}
+
+    interrupted = fake_client(fail_after=2)
+    with pytest.raises(RuntimeError):
+        create_and_save_embeddings(client=interrupted, **options)
+    assert os.path.exists(output_file + ".partial")
+
+    resumed = fake_client()
+    embedded = create_and_save_embeddings(client=resumed, **options)
+
+    assert embedded == 2 and len(resumed.embeddings.inputs) == 2, "Only the sections left by the interruption should be embedded."
+    assert not set(resumed.embeddings.inputs) & set(interrupted.embeddings.inputs)
+    assert open_store(output_file).count == 6
+    assert not os.path.exists(output_file + ".partial")
+
+def write_services(data_dir, sections):
+    body = "".join(f"<h2>{title}</h2><p>{text}</p>" for title, text in sections)
+    (data_dir / "services.html").write_text(f"<html><body>{body}</body></html>", encoding="utf-8")
+
+def test_incremental_build_embeds_only_new_and_changed_sections(tmp_path):
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    sections = [(f"Section {i}", f"Paragraph number {i} about dental care.") for i in range(5)]
+    write_services(data_dir, sections)
+    output_file = str(tmp_path / "embeddings.kb")
+    options = {"data_dir": str(data_dir), "output_file": output_file, "cache_file": None}
+
+    create_and_save_embeddings(client=fake_client(), **options)
+    before = open_store(output_file)
+    before_vectors = {text: np.array(before.embeddings[i]) for i, text in enumerate(before.texts)}
+
+    # Change section 1, delete section 3 and add section 5
+    sections[1] = ("Section 1", "Paragraph number 1 about orthodontics, updated.")
+    del sections[3]
+    sections.append(("Section 5", "Paragraph number 5 about optometry."))
+    write_services(data_dir, sections)
+
+    rebuild = fake_client()
+    embedded = create_and_save_embeddings(client=rebuild, **options)
+    after = open_store(output_file)
+    after_texts = list(after.texts)
+
+    sent = rebuild.embeddings.inputs
+    assert embedded == 2 and len(sent) == 2, "Only the changed and the new section should be embedded."
+    assert any("orthodontics" in text for text in sent) and any("optometry" in text for text in sent)
+    assert not any("number 3" in text for text in after_texts), "The deleted section should be dropped from the store."
+    assert after.count == 5
+    for i, text in enumerate(after_texts):
+        if text in before_vectors:
+            assert np.array(after.embeddings[i]).tobytes() == before_vectors[text].tobytes(), f"Vector of '{text}' was not reused."
+    assert sum(text in before_vectors for text in after_texts) == 3
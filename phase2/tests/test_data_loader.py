@@ -1,19 +1,91 @@
 import os
 import sys
+import numpy as np
 import pytest
 
 # Ensure backend directory is in path for imports
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
-from data_loader import load_embeddings_from_pickle
+from data_loader import load_embeddings, MetadataFilter, user_filters
+from vector_index import INDEX_TYPES, build_index, configure_search, store_fingerprint
+from embedding_store import open_store, write_store, section_key
 
-def test_load_embeddings_from_pickle():
-    test_file_path = os.path.abspath(
-        os.path.join(os.path.dirname(__file__), '..', 'backend', 'knowledge_base_embeddings.pkl')
-    )
-    assert os.path.exists(test_file_path), f"File {test_file_path} does not exist."
+def write_test_store(file_path, count=8, dim=16):
+    texts = [f"section {i}" for i in range(count)]
+    embeddings = np.random.default_rng(0).standard_normal((count, dim)).astype("float32")
+    write_store(file_path, embeddings, texts, [section_key(text, "test") for text in texts], "test")
 
-    index, texts = load_embeddings_from_pickle(test_file_path)
+def test_load_embeddings(tmp_path):
+    test_file_path = str(tmp_path / "knowledge_base_embeddings.kb")
+    write_test_store(test_file_path)
+
+    index, texts = load_embeddings(test_file_path)
 
     assert index is not None, "FAISS index was not created."
     assert texts is not None, "Texts are not loaded."
-    assert len(texts) > 0, "Texts loaded are empty."
\ No newline at end of file
+    assert len(texts) > 0, "Texts loaded are empty."
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_metadata_filter_restricts_search(index_type):
+    hmos = ["מכבי", "מאוחדת", "כללית", None]
+    tiers = ["זהב", "כסף", "ארד", None]
+    metadata = [{"hmo": hmos[i % 4], "tier": tiers[(i // 4) % 4]} for i in range(2000)]
+    embeddings = np.random.default_rng(0).standard_normal((2000, 32)).astype("float32")
+    index = build_index(embeddings, index_type)
+    configure_search(index, nprobe=16, ef_search=64)
+
+    metadata_filter = MetadataFilter(metadata)
+    params = metadata_filter.search_params(index, "מכבי", "זהב")
+    distances, indices = index.search(embeddings[:10], 10, params=params)
+
+    for i in indices.flatten()[indices.flatten() >= 0]:
+        assert metadata[i]["hmo"] in ("מכבי", None), f"Row {i} belongs to another HMO."
+        assert metadata[i]["tier"] in ("זהב", None), f"Row {i} belongs to another tier."
+    assert metadata_filter.search_params(index) is None, "An empty filter should not restrict the search."
+
+def test_user_filters_ignores_unknown_values():
+    assert user_filters({"hmo_name": "מכבי", "insurance_tier": "זהב"}) == ("מכבי", "זהב")
+    assert user_filters({"hmo_name": "Unknown"}) == (None, None)
+
+def test_knowledge_base_opens_the_store_once(monkeypatch, tmp_path):
+    import data_loader
+
+    test_file_path = str(tmp_path / "store.kb")
+    write_test_store(test_file_path)
+    opened = []
+    monkeypatch.setattr(data_loader, "open_store", lambda path: opened.append(path) or open_store(path))
+    data_loader.release_knowledge_base()
+
+    try:
+        data_loader.get_knowledge_base(test_file_path)
+        assert opened == [test_file_path], "The store should be mapped once per load."
+        assert data_loader.knowledge_base_version() == store_fingerprint(data_loader._store)
+    finally:
+        data_loader.release_knowledge_base()
+
+def test_reload_swaps_in_the_new_store_only_when_it_loads(tmp_path):
+    import data_loader
+
+    first_path, second_path = str(tmp_path / "first.kb"), str(tmp_path / "second.kb")
+    write_test_store(first_path, count=8)
+    write_test_store(second_path, count=12)
+    reloads = []
+    data_loader.on_knowledge_base_reload(lambda: reloads.append(True))
+    data_loader.release_knowledge_base()
+
+    try:
+        data_loader.warm_up(first_path)
+        first_version = data_loader.knowledge_base_version()
+
+        status = data_loader.reload_knowledge_base(str(tmp_path / "missing.kb"))
+        assert status["ready"] and status["error"], "A failed reload should be reported."
+        assert data_loader.get_knowledge_base()[0].ntotal == 8, "The current knowledge base should keep serving."
+        assert data_loader.knowledge_base_version() == first_version
+        assert reloads == [], "Caches must not be invalidated by a failed reload."
+
+        status = data_loader.reload_knowledge_base(second_path)
+        assert status["ready"] and status["error"] is None and status["embeddings"] == 12
+        assert data_loader.knowledge_base_version() != first_version
+        assert reloads == [True]
+    finally:
+        data_loader._reload_hooks.pop()
+        data_loader.release_knowledge_base()
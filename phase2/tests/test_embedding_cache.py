@@ -0,0 +1,72 @@
+import os
+import sys
+import asyncio
+import numpy as np
+import pytest
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from embedding_cache import EmbeddingCache
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_are_coalesced():
+    calls = []
+
+    async def compute(text):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        return [1.0, 2.0, 3.0]
+
+    cache = EmbeddingCache("test-model")
+    vectors = await asyncio.gather(*(cache.get_or_compute("מה ההנחות?", compute) for _ in range(10)))
+
+    assert len(calls) == 1, "Identical concurrent requests should trigger one upstream call."
+    assert all(np.array_equal(vector, vectors[0]) for vector in vectors)
+    assert await cache.get_or_compute("  מה   ההנחות? ", compute) is not None and len(calls) == 1
+    assert cache.stats()["coalesced"] == 9
+
+@pytest.mark.asyncio
+async def test_cancelled_caller_does_not_cancel_coalesced_callers():
+    started = asyncio.Event()
+
+    async def compute(text):
+        started.set()
+        await asyncio.sleep(0.05)
+        return [1.0, 2.0, 3.0]
+
+    cache = EmbeddingCache("test-model")
+    leader = asyncio.ensure_future(cache.get_or_compute("מה ההנחות?", compute))
+    await started.wait()
+    follower = asyncio.ensure_future(cache.get_or_compute("מה ההנחות?", compute))
+    await asyncio.sleep(0)
+    leader.cancel()
+
+    assert np.array_equal(await follower, [1.0, 2.0, 3.0]), "A coalesced caller should get the vector after the first caller is cancelled."
+    assert leader.cancelled()
+    assert cache.get("מה ההנחות?") is not None
+
+@pytest.mark.asyncio
+async def test_upstream_errors_reach_every_coalesced_caller():
+    async def compute(text):
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream failed")
+
+    cache = EmbeddingCache("test-model")
+    results = await asyncio.gather(*(cache.get_or_compute("שאלה", compute) for _ in range(3)), return_exceptions=True)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert cache.stats()["entries"] == 0 and not cache._inflight
+
+def test_memory_bound_and_persistence(tmp_path):
+    file_path = str(tmp_path / "cache.kb")
+    cache = EmbeddingCache("test-model", max_bytes=3 * 16, file_path=file_path)
+    for i in range(5):
+        cache.put(f"text {i}", np.full(4, i, dtype=np.float32))
+
+    assert cache.stats()["entries"] == 3, "Cache should evict down to its byte bound."
+    assert cache.get("text 0") is None
+    cache.save()
+
+    reloaded = EmbeddingCache("test-model", file_path=file_path)
+    assert np.array_equal(reloaded.get("text 4"), np.full(4, 4, dtype=np.float32))
+    assert EmbeddingCache("other-model", file_path=file_path).get("text 4") is None, "Vectors must not cross models."
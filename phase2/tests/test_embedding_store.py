@@ -0,0 +1,53 @@
+import os
+import sys
+import pickle
+import numpy as np
+import pytest
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from embedding_store import open_store, write_store, convert_pickle, section_key
+
+def test_store_round_trip(tmp_path):
+    texts = ["מרפאות שיניים", "Optometry services", ""]
+    embeddings = np.random.default_rng(0).standard_normal((3, 8)).astype("float32")
+    keys = [section_key(text, "test-model") for text in texts]
+    store_path = str(tmp_path / "store.kb")
+
+    write_store(store_path, embeddings, texts, keys, "test-model")
+    store = open_store(store_path)
+
+    assert isinstance(store.embeddings, np.memmap), "Embeddings should be memory-mapped."
+    assert np.array_equal(store.embeddings, embeddings), "Embeddings changed in the round trip."
+    assert list(store.texts) == texts, "Texts changed in the round trip."
+    assert store.key_index() == {key: i for i, key in enumerate(keys)}, "Section keys changed in the round trip."
+    assert store.model == "test-model"
+
+def test_convert_pickle(tmp_path):
+    pickle_path = str(tmp_path / "legacy.pkl")
+    with open(pickle_path, "wb") as f:
+        pickle.dump(([[0.1, 0.2], [0.3, 0.4]], ["first", "second"]), f)
+
+    convert_pickle(pickle_path, str(tmp_path / "converted.kb"))
+    store = open_store(str(tmp_path / "converted.kb"))
+
+    assert store.count == 2 and store.dim == 2
+    assert store.texts[1] == "second"
+    assert store.embeddings.dtype == np.float32
+
+def test_concurrent_writers_never_mix_their_stores(tmp_path):
+    from concurrent.futures import ThreadPoolExecutor
+
+    store_path = str(tmp_path / "cache.kb")
+    versions = [np.full((200, 64), version, dtype=np.float32) for version in range(8)]
+
+    def write(embeddings):
+        keys = [section_key(f"{embeddings[0, 0]} {i}", "test-model") for i in range(len(embeddings))]
+        write_store(store_path, embeddings, [""] * len(embeddings), keys, "test-model")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(write, versions))
+
+    store = open_store(store_path)
+    assert len(np.unique(store.embeddings)) == 1, "The store mixes the data of several writers."
+    assert os.listdir(tmp_path) == ["cache.kb"], "Temporary files were left behind."
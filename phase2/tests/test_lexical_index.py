@@ -0,0 +1,45 @@
+import os
+import sys
+import numpy as np
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from lexical_index import BM25Index, normalize_hebrew, reciprocal_rank_fusion, tokenize
+
+TEXTS = [
+    "מרפאות שיניים | שם השירות: סתימות | מכבי | זהב: 80% הנחה",
+    "מרפאות שיניים | שם השירות: טיפולי שורש | מכבי | זהב: 70% הנחה",
+    "אופטומטריה | שם השירות: עדשות מגע | כללית | כסף: 40% הנחה",
+]
+
+def test_normalization_removes_niqqud_and_inner_quotes():
+    assert normalize_hebrew("בְּרֵאשִׁית") == "בראשית"
+    assert normalize_hebrew('קופ"ח') == "קופח"
+    assert normalize_hebrew("שם־השירות") == "שם השירות"
+
+def test_prefixed_tokens_match_their_stems():
+    terms = tokenize("כמה עולות לסתימות במכבי?")
+
+    assert "סתימות" in terms and "מכבי" in terms, f"Prefix-stripped forms missing: {terms}"
+    assert "כמה" not in terms, "Stopwords should not be indexed."
+
+def test_bm25_ranks_exact_service_first():
+    index = BM25Index(TEXTS)
+
+    ids, scores = index.search("מה ההנחה לסתימות?", 3)
+
+    assert ids[0] == 0, f"Expected the fillings row first, got {ids}"
+    assert np.all(np.diff(scores) <= 0), "Scores are not sorted."
+
+def test_bm25_respects_allowed_mask():
+    index = BM25Index(TEXTS)
+
+    ids, _ = index.search("שיניים", 3, allowed=np.array([False, True, True]))
+
+    assert list(ids) == [1]
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, 4]])
+
+    assert fused[0] == 1
+    assert set(fused) == {1, 2, 3, 4}
@@ -1,6 +1,8 @@
 import os
 import sys
+import numpy as np
 import pytest
+from types import SimpleNamespace
 from fastapi.testclient import TestClient
 
 # Ensure backend directory is in path for imports
@@ -9,10 +11,38 @@ sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..',
 # Change the working directory to backend
 os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
 
+import azure_openai
+import data_loader
+import main
 from main import app
+from embedding_store import write_store, section_key
+from answer_cache import AnswerCache, MemoryAnswerStore
+
+SECTIONS = [
+    ("מרפאות שיניים | יישור שיניים | מכבי | זהב: 20% הנחה", {"hmo": "מכבי", "tier": "זהב"}),
+    ("מרפאות שיניים | יישור שיניים | כללית | זהב: 15% הנחה", {"hmo": "כללית", "tier": "זהב"}),
+    ("אופטומטריה | בדיקות ראייה | מכבי | כסף: 10% הנחה", {"hmo": "מכבי", "tier": "כסף"}),
+    ("סדנאות בריאות לכל חברי הקופות", {})
+]
 
 @pytest.fixture
-def client():
+def knowledge_base(tmp_path):
+    """
+    A small embedding store in tmp_path, loaded as the process-wide knowledge base, so the tests do not depend on a
+    store built by create_embeddings.py.
+    """
+    file_path = str(tmp_path / "knowledge_base_embeddings.kb")
+    texts = [text for text, _ in SECTIONS]
+    embeddings = np.random.default_rng(0).standard_normal((len(texts), 1536)).astype("float32")
+    write_store(file_path, embeddings, texts, [section_key(text, "test") for text in texts], "test", [item for _, item in SECTIONS])
+
+    data_loader.release_knowledge_base()
+    data_loader.warm_up(file_path)
+    yield file_path
+    data_loader.release_knowledge_base()
+
+@pytest.fixture
+def client(knowledge_base):
     return TestClient(app)
 
 def test_chat_endpoint(client):
@@ -36,3 +66,113 @@ def test_chat_endpoint(client):
     assert response.status_code == 200
     assert "response" in response.json()
 
+
+def test_ready_endpoint(knowledge_base, monkeypatch):
+    data_loader.release_knowledge_base()
+    monkeypatch.setattr(main, "warm_up", lambda: data_loader.warm_up(knowledge_base))
+
+    # Entering the client runs the app lifespan, which warms up the knowledge base
+    with TestClient(app) as client:
+        response = client.get("/ready")
+
+    assert response.status_code == 200
+    status = response.json()
+    assert status["ready"], f"Knowledge base failed to load: {status['error']}"
+    assert status["embeddings"] == len(SECTIONS)
+    assert status["load_time_seconds"] is not None
+
+STREAMED_PARTS = ["יישור ", "שיניים ", "בהנחה ", "של 20%."]
+
+class FakeCompletionStream:
+    def __init__(self, parts):
+        # Azure also sends chunks without choices (content-filter results) and deltas without content
+        self.chunks = [SimpleNamespace(choices=[])] + [
+            SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=part))]) for part in parts + [None]
+        ]
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self.chunks:
+            raise StopAsyncIteration
+        return self.chunks.pop(0)
+
+class FakeOpenAIClient:
+    def __init__(self):
+        self.embeddings = SimpleNamespace(create=self.create_embedding)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create_completion))
+        self.requests = []
+
+    async def create_embedding(self, model, input, **kwargs):
+        return SimpleNamespace(data=[SimpleNamespace(embedding=[1.0] + [0.0] * 1535)])
+
+    async def create_completion(self, **kwargs):
+        self.requests.append(kwargs)
+        return FakeCompletionStream(STREAMED_PARTS)
+
+def test_chat_stream_endpoint(client, monkeypatch):
+    fake_client = FakeOpenAIClient()
+    monkeypatch.setattr(azure_openai, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(azure_openai, "answer_cache", None)
+    payload = {
+        "user_info": {"hmo_name": "מכבי", "insurance_tier": "זהב"},
+        "history": [],
+        "question": "מה ההנחות שיש לי על יישור שיניים?"
+    }
+
+    with client.stream("POST", "/chat/stream", json=payload) as response:
+        assert response.status_code == 200
+        answer = "".join(response.iter_text())
+
+    assert answer == "".join(STREAMED_PARTS), "Streamed chunks should arrive in order and unchanged."
+    assert fake_client.requests[0]["stream"] is True
+    assert payload["question"] in fake_client.requests[0]["messages"][0]["content"]
+
+def test_cacheable_prompt_leaves_out_personal_details(client, monkeypatch):
+    fake_client = FakeOpenAIClient()
+    monkeypatch.setattr(azure_openai, "get_openai_client", lambda: fake_client)
+    monkeypatch.setattr(azure_openai, "answer_cache", AnswerCache(MemoryAnswerStore()))
+    payload = {
+        "user_info": {"first_name": "דנה", "id_number": "031220015", "hmo_name": "מכבי", "insurance_tier": "זהב"},
+        "history": [],
+        "question": "מה ההנחות שיש לי על יישור שיניים?"
+    }
+
+    with client.stream("POST", "/chat/stream", json=payload) as response:
+        "".join(response.iter_text())
+
+    prompt = fake_client.requests[0]["messages"][0]["content"]
+    assert "מכבי" in prompt and "דנה" not in prompt and "031220015" not in prompt
+
+def test_session_lifecycle(client):
+    response = client.post("/sessions", json={"user_info": {"hmo_name": "מכבי", "insurance_tier": "זהב"}})
+    assert response.status_code == 201
+    session_id = response.json()["session_id"]
+
+    session = client.get(f"/sessions/{session_id}").json()
+    assert session["user_info"]["hmo_name"] == "מכבי"
+    assert session["history"] == []
+
+    client.delete(f"/sessions/{session_id}")
+    assert client.get(f"/sessions/{session_id}").status_code == 404
+    assert client.post(f"/sessions/{session_id}/messages", json={"question": "?"}).status_code == 404
+
+def test_reload_endpoint_requires_the_admin_token(client, knowledge_base, monkeypatch):
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "")
+    assert client.post("/admin/reload-knowledge-base").status_code == 404, "Without a token the endpoint is disabled."
+
+    monkeypatch.setattr(main, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(main, "reload_knowledge_base", lambda: data_loader.reload_knowledge_base(knowledge_base))
+    assert client.post("/admin/reload-knowledge-base", headers={"X-Admin-Token": "wrong"}).status_code == 403
+
+    response = client.post("/admin/reload-knowledge-base", headers={"X-Admin-Token": "secret"})
+    assert response.status_code == 200 and response.json()["embeddings"] == len(SECTIONS)
+
+def test_metrics_endpoint(client):
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "chatbot_stage_seconds" in response.text
+    assert "chatbot_knowledge_base_ready" in response.text
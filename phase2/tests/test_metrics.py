@@ -0,0 +1,36 @@
+import os
+import sys
+from prometheus_client import REGISTRY
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from metrics import track_stage, record_prompt_tokens, CacheStatsCollector
+
+def sample(name, labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+def test_track_stage_observes_latency():
+    before = sample("chatbot_stage_seconds_count", {"stage": "search"})
+
+    with track_stage("search"):
+        pass
+
+    assert sample("chatbot_stage_seconds_count", {"stage": "search"}) == before + 1
+
+def test_prompt_tokens_are_counted_per_part():
+    breakdown = {"template": 10, "question": 5, "user_info": 3, "history": 0, "summary": 0, "knowledge": 100}
+    before = sample("chatbot_prompt_tokens_total", {"part": "knowledge"})
+
+    record_prompt_tokens(breakdown)
+
+    assert sample("chatbot_prompt_tokens_total", {"part": "knowledge"}) == before + 100
+
+def test_cache_stats_are_read_at_collection():
+    class FakeCache:
+        def stats(self):
+            return {"hits": 3, "misses": 1, "hit_rate": 0.75, "entries": 2}
+
+    families = {family.name: family for family in CacheStatsCollector({"answers": FakeCache()}).collect()}
+
+    assert families["chatbot_cache_hit_rate"].samples[0].value == 0.75
+    assert families["chatbot_cache_hits"].samples[0].value == 3
@@ -0,0 +1,53 @@
+import os
+import sys
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from prompt_builder import build_prompt, count_tokens, select_sections, truncate_to_tokens, PROMPT_QUESTION_TOKENS
+
+USER_INFO = {"first_name": "דנה", "hmo_name": "מכבי", "insurance_tier": "זהב", "age": 34}
+
+def test_prompt_stays_within_budget():
+    sections = [f"מרפאות שיניים | שם השירות: סתימות {i} | מכבי | זהב: 80% הנחה " * 5 for i in range(50)]
+    history = [{"question": f"שאלה מספר {i}", "answer": "תשובה ארוכה. " * 100} for i in range(30)]
+
+    prompt, breakdown = build_prompt("מה הכיסוי לסתימות?", USER_INFO, history, sections, budget=3000)
+
+    assert breakdown["total"] <= 3000, f"Prompt exceeds budget: {breakdown}"
+    assert breakdown["total"] == count_tokens(prompt)
+    assert breakdown["sections_used"] > 0, "No knowledge was included."
+    assert breakdown["turns_summarized"] > 0, "Older turns were not summarized."
+    assert "שאלה מספר 29" in prompt, "The latest turn is missing."
+
+def test_long_question_is_truncated_to_its_budget():
+    sections = [f"מרפאות שיניים | שם השירות: סתימות {i} | מכבי | זהב: 80% הנחה " * 5 for i in range(50)]
+    question = "מה הכיסוי לסתימות? " * 2000
+
+    prompt, breakdown = build_prompt(question, USER_INFO, [], sections, budget=3000)
+
+    assert breakdown["question"] <= PROMPT_QUESTION_TOKENS, f"Question exceeds its budget: {breakdown}"
+    assert breakdown["total"] <= 3000, f"Prompt exceeds budget: {breakdown}"
+    assert breakdown["sections_used"] > 0, "The question left no room for knowledge."
+    assert breakdown["knowledge"] >= 0
+
+def test_recent_turns_are_kept_verbatim():
+    history = [{"question": "האם יש הנחה?", "answer": "כן, 80% הנחה."}]
+
+    prompt, breakdown = build_prompt("ולכסף?", USER_INFO, history, ["section"])
+
+    assert "User: האם יש הנחה?\nAssistant: כן, 80% הנחה." in prompt
+    assert breakdown["turns_verbatim"] == 1 and breakdown["turns_summarized"] == 0
+
+def test_select_sections_drops_duplicates():
+    sections = ["א | ב: ג", "א  |  ב: ג", "ד | ה: ו"]
+
+    selected, used, dropped = select_sections(sections, 1000)
+
+    assert selected == ["א | ב: ג", "ד | ה: ו"]
+    assert dropped == 1
+
+def test_truncate_to_tokens():
+    text = "מילה " * 500
+
+    assert count_tokens(truncate_to_tokens(text, 50)) <= 50
+    assert truncate_to_tokens("short", 50) == "short"
@@ -0,0 +1,54 @@
+import os
+import sys
+import time
+import pytest
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from sessions import MemorySessionStore
+
+USER_INFO = {"hmo_name": "מכבי", "insurance_tier": "זהב"}
+
+@pytest.mark.asyncio
+async def test_session_records_turns():
+    store = MemorySessionStore()
+    session_id = await store.create(USER_INFO)
+
+    assert await store.append_turn(session_id, "שאלה", "תשובה")
+    session = await store.get(session_id)
+
+    assert session["user_info"] == USER_INFO
+    assert session["history"] == [{"question": "שאלה", "answer": "תשובה"}]
+
+@pytest.mark.asyncio
+async def test_history_is_bounded():
+    store = MemorySessionStore(max_turns=3)
+    session_id = await store.create(USER_INFO)
+
+    for i in range(5):
+        await store.append_turn(session_id, f"q{i}", f"a{i}")
+    history = (await store.get(session_id))["history"]
+
+    assert [turn["question"] for turn in history] == ["q2", "q3", "q4"], "Oldest turns should be dropped first."
+
+@pytest.mark.asyncio
+async def test_sessions_expire_after_ttl():
+    store = MemorySessionStore(ttl=0.05)
+    session_id = await store.create(USER_INFO)
+
+    time.sleep(0.1)
+
+    assert await store.get(session_id) is None, "Expired session is still returned."
+    assert not await store.append_turn(session_id, "q", "a")
+
+@pytest.mark.asyncio
+async def test_least_recently_used_session_is_evicted():
+    store = MemorySessionStore(max_sessions=2)
+    first = await store.create(USER_INFO)
+    second = await store.create(USER_INFO)
+    await store.get(first)
+    await store.create(USER_INFO)
+
+    assert await store.get(first) is not None
+    assert await store.get(second) is None, "The least recently used session was not evicted."
+    assert store.evictions == 1
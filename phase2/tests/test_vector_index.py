@@ -0,0 +1,52 @@
+import os
+import sys
+import numpy as np
+import pytest
+
+# Ensure backend directory is in path for imports
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend')))
+from embedding_store import open_store, write_store, section_key
+from vector_index import INDEX_TYPES, build_index, configure_search, load_or_build_index
+
+@pytest.fixture
+def embeddings():
+    return np.random.default_rng(0).standard_normal((2000, 32)).astype("float32")
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_index_finds_exact_match(embeddings, index_type):
+    index = build_index(embeddings, index_type)
+    configure_search(index, nprobe=64, ef_search=128)
+
+    distances, indices = index.search(embeddings[:20], 1)
+
+    hits = np.mean(indices[:, 0] == np.arange(20))
+    assert hits >= (0.5 if index_type == "ivf_pq" else 0.95), f"{index_type} recall@1 too low: {hits}"
+
+def test_index_is_persisted_next_to_store(tmp_path, embeddings):
+    texts = [f"section {i}" for i in range(len(embeddings))]
+    store_path = str(tmp_path / "store.kb")
+    write_store(store_path, embeddings, texts, [section_key(text, "m") for text in texts], "m")
+
+    built = load_or_build_index(open_store(store_path), store_path, "ivf_flat")
+    persisted = [name for name in os.listdir(tmp_path) if name.endswith(".faiss")]
+    loaded = load_or_build_index(open_store(store_path), store_path, "ivf_flat")
+
+    assert len(persisted) == 1, "Trained index was not written next to the store."
+    assert loaded.ntotal == built.ntotal
+
+def test_only_indexes_older_than_the_store_are_removed(tmp_path, embeddings):
+    texts = [f"section {i}" for i in range(len(embeddings))]
+    store_path = str(tmp_path / "store.kb")
+    write_store(store_path, embeddings, texts, [section_key(text, "m") for text in texts], "m")
+    store_mtime = os.path.getmtime(store_path)
+    older, newer = tmp_path / "store.kb.ivf_flat-old.faiss", tmp_path / "store.kb.ivf_flat-new.faiss"
+    older.write_bytes(b"")
+    newer.write_bytes(b"")
+    os.utime(older, (store_mtime - 60, store_mtime - 60))
+    os.utime(newer, (store_mtime + 60, store_mtime + 60))
+
+    load_or_build_index(open_store(store_path), store_path, "ivf_flat")
+
+    assert not older.exists(), "An index of an earlier build should be removed."
+    assert newer.exists(), "An index newer than the store may be in use by another worker."
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")], "Temporary index file left behind."